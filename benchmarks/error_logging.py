@@ -0,0 +1,49 @@
+"""
+Measures how many failed requests per second locust's stats can log.
+
+Logs failures with a small set of distinct errors to a single stats entry, which is what 
+happens when the system that is tested has an outage, and reports the throughput.
+
+Usage::
+
+    python benchmarks/error_logging.py [--failures 500000] [--distinct-errors 10]
+"""
+import os
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from requests.exceptions import ConnectionError, HTTPError
+
+from locust.stats import RequestStats
+
+
+def main():
+    parser = OptionParser(usage="python benchmarks/error_logging.py [options]")
+    parser.add_option("--failures", type="int", dest="failures", default=500000, help="Number of failures to log")
+    parser.add_option("--distinct-errors", type="int", dest="distinct_errors", default=10, help="Number of distinct errors")
+    opts, args = parser.parse_args()
+    
+    errors = []
+    for i in xrange(opts.distinct_errors):
+        if i % 2:
+            errors.append(HTTPError("500 Server Error: INTERNAL SERVER ERROR for url: http://127.0.0.1/item/%i" % i))
+        else:
+            errors.append(ConnectionError("('Connection aborted.', error(111, 'Connection refused')) %i" % i))
+    
+    stats = RequestStats()
+    entry = stats.get("/item", "GET")
+    num_errors = len(errors)
+    start = time.time()
+    for i in xrange(opts.failures):
+        entry.log_error(errors[i % num_errors])
+    elapsed = time.time() - start
+    
+    print "%i failures with %i distinct errors in %.2f seconds" % (opts.failures, num_errors, elapsed)
+    print "%.0f failures/s" % (opts.failures / elapsed)
+
+
+if __name__ == "__main__":
+    main()
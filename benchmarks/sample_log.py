@@ -0,0 +1,49 @@
+"""
+Measures how many requests per second can be logged to a sample log, compared to writing
+one line of text per request to a file.
+
+Usage::
+
+    python benchmarks/sample_log.py [--requests 1000000]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from locust.samplelog import SampleLog
+
+
+def main():
+    parser = OptionParser(usage="python benchmarks/sample_log.py [options]")
+    parser.add_option("--requests", type="int", dest="requests", default=1000000, help="Number of requests to log")
+    opts, args = parser.parse_args()
+
+    names = ["/item/%i" % i for i in xrange(20)]
+    directory = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(directory, "samples.txt"), "w") as f:
+            start = time.time()
+            for i in xrange(opts.requests):
+                f.write("%f,%s,%s,%i,%i,%i\n" % (time.time(), "GET", names[i % 20], i % 1000, 1024, 0))
+            text_elapsed = time.time() - start
+
+        sample_log = SampleLog(os.path.join(directory, "samples.bin"))
+        start = time.time()
+        for i in xrange(opts.requests):
+            sample_log.on_request_success("GET", names[i % 20], i % 1000, 1024)
+        sample_log.close()
+        binary_elapsed = time.time() - start
+    finally:
+        shutil.rmtree(directory)
+
+    print "text lines:  %.0f requests/s" % (opts.requests / text_elapsed)
+    print "sample log:  %.0f requests/s" % (opts.requests / binary_elapsed)
+
+
+if __name__ == "__main__":
+    main()
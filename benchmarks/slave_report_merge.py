@@ -0,0 +1,66 @@
+"""
+Measures the size of slave reports, and how long it takes the master to merge them, with the
+response times kept in histograms and in DDSketches (--response-time-sketch), for both full 
+(StatsEntry.serialize) and compact (StatsEntry.compact_report) reports.
+
+Usage::
+
+    python benchmarks/slave_report_merge.py [--entries 1000] [--slaves 20]
+"""
+import os
+import sys
+import time
+import random
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from locust.rpc.protocol import Message
+from locust.histogram import layout
+from locust.stats import RequestStats, StatsEntry
+
+
+def run(opts, sketch):
+    slave_stats = RequestStats()
+    slave_stats.set_response_times_sketch(sketch)
+    random.seed(0)
+    for i in xrange(opts.entries):
+        entry = slave_stats.get("/item/%i" % i, "GET")
+        for j in xrange(opts.requests):
+            entry.log(random.lognormvariate(4, 1), 0)
+    entries = sorted(slave_stats.entries.itervalues(), key=lambda e: e.name)
+    names = dict((i, (e.name, e.method)) for i, e in enumerate(entries))
+    response_times_layout = layout(slave_stats.total.response_times)
+    full_report = Message("stats", {"stats": [entry.serialize() for entry in entries]}, "slave").serialize()
+    compact_report = Message("stats", {"entries": [entry.compact_report(i) for i, entry in enumerate(entries)]}, "slave").serialize()
+
+    def merge(report, unserialize):
+        master_stats = RequestStats()
+        master_stats.set_response_times_sketch(sketch)
+        start = time.time()
+        for i in xrange(opts.slaves):
+            for data in unserialize(Message.unserialize(report).data):
+                master_stats.get(data.name, data.method).extend(data, full_request_history=True)
+                master_stats.total.extend(data, full_request_history=True)
+        return (time.time() - start) * 1000 / opts.slaves
+
+    full_time = merge(full_report, lambda data: [StatsEntry.unserialize(d) for d in data["stats"]])
+    compact_time = merge(compact_report, lambda data: [StatsEntry.from_compact_report(d, names[d[0]][0], names[d[0]][1], response_times_layout) for d in data["entries"]])
+    kind = "sketch" if sketch else "histogram"
+    print "%-10s full report:    %8i bytes   merge: %.1f ms per report" % (kind, len(full_report), full_time)
+    print "%-10s compact report: %8i bytes   merge: %.1f ms per report" % (kind, len(compact_report), compact_time)
+
+
+def main():
+    parser = OptionParser(usage="python benchmarks/slave_report_merge.py [options]")
+    parser.add_option("--entries", type="int", dest="entries", default=1000, help="Number of stats entries")
+    parser.add_option("--requests", type="int", dest="requests", default=100, help="Number of requests per entry and report")
+    parser.add_option("--slaves", type="int", dest="slaves", default=20, help="Number of reports to merge")
+    opts, args = parser.parse_args()
+
+    run(opts, False)
+    run(opts, True)
+
+
+if __name__ == "__main__":
+    main()
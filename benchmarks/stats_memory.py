@@ -0,0 +1,56 @@
+"""
+Measures how much memory locust uses per stats entry.
+
+Creates a number of StatsEntry instances (as happens when requests are made to many different 
+URLs without using the name argument), logs a few requests to each of them, and reports the 
+growth of the process' resident memory divided by the number of entries.
+
+Usage::
+
+    python benchmarks/stats_memory.py [--entries 50000] [--requests 10]
+"""
+import gc
+import os
+import random
+import resource
+import sys
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from locust.stats import RequestStats
+
+
+def max_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux, and in bytes on OS X
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss
+    return rss * 1024
+
+
+def main():
+    parser = OptionParser(usage="python benchmarks/stats_memory.py [options]")
+    parser.add_option("--entries", type="int", dest="entries", default=50000, help="Number of stats entries to create")
+    parser.add_option("--requests", type="int", dest="requests", default=10, help="Number of requests to log per entry")
+    opts, args = parser.parse_args()
+    
+    rand = random.Random(0)
+    response_times = [int(rand.lognormvariate(4.5, 0.8)) for i in xrange(opts.requests * 100)]
+    
+    stats = RequestStats()
+    gc.collect()
+    before = max_rss_bytes()
+    for i in xrange(opts.entries):
+        entry = stats.get("/item/%i" % i, "GET")
+        for j in xrange(opts.requests):
+            entry.log(rand.choice(response_times), 1024)
+    gc.collect()
+    after = max_rss_bytes()
+    
+    print "%i entries with %i requests each" % (opts.entries, opts.requests)
+    print "%.0f bytes per entry" % (float(after - before) / opts.entries)
+
+
+if __name__ == "__main__":
+    main()
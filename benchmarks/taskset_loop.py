@@ -0,0 +1,60 @@
+"""
+Measures how many task iterations per second one simulated user's TaskSet.run loop can do,
+when the tasks don't do anything and there's no wait time, i.e. the overhead of locust 
+itself for each executed task.
+
+Usage::
+
+    python benchmarks/taskset_loop.py [--iterations 1000000] [--tasks 10] [--scheduled 0]
+"""
+import os
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from locust.core import Locust, TaskSet
+from locust.exception import StopLocust
+
+
+def main():
+    parser = OptionParser(usage="python benchmarks/taskset_loop.py [options]")
+    parser.add_option("--iterations", type="int", dest="iterations", default=1000000, help="Number of tasks to execute")
+    parser.add_option("--tasks", type="int", dest="tasks", default=10, help="Number of distinct tasks in the TaskSet")
+    parser.add_option("--scheduled", type="int", dest="scheduled", default=0, help="Number of tasks to schedule with schedule_task before the loop starts")
+    opts, args = parser.parse_args()
+    
+    state = {"remaining": opts.iterations}
+    def make_task():
+        def noop(l):
+            state["remaining"] -= 1
+            if not state["remaining"]:
+                raise StopLocust()
+        return noop
+    noop = make_task()
+    
+    class Tasks(TaskSet):
+        tasks = [(make_task(), i + 1) for i in xrange(opts.tasks)]
+        
+        def on_start(self):
+            for i in xrange(opts.scheduled):
+                self.schedule_task(noop)
+        
+        def wait(self):
+            pass
+    
+    class User(Locust):
+        task_set = Tasks
+    
+    start = time.time()
+    try:
+        User().run()
+    except StopLocust:
+        pass
+    elapsed = time.time() - start
+    print "%i iterations in %.2f s: %.0f iterations/s per user" % (opts.iterations, elapsed, opts.iterations / elapsed)
+
+
+if __name__ == "__main__":
+    main()
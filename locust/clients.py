@@ -1,19 +1,213 @@
 import re
 import time
+import socket
 from datetime import timedelta
 from urlparse import urlparse, urlunparse
 
 import requests
 from requests import Response, Request
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from requests.exceptions import (RequestException, MissingSchema,
     InvalidSchema, InvalidURL)
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from requests.packages.urllib3.exceptions import ConnectTimeoutError
+try:
+    from requests.packages.urllib3.exceptions import NewConnectionError
+    from requests.packages.urllib3.util.connection import allowed_gai_family
+except ImportError:
+    # older urllib3 versions raise socket.error when a connection fails, and resolve any family
+    NewConnectionError = socket.error
+    allowed_gai_family = lambda: socket.AF_UNSPEC
 
 import events
+from clock import monotonic
 from exception import CatchResponseError, ResponseError
 
 absolute_http_url_regexp = re.compile(r"^https?://", re.I)
 
+NAME_CACHE_SIZE = 10000
+""" Maximum number of paths for which UrlNameNormalizer caches the normalized name """
+
+
+class UrlNameNormalizer(object):
+    """
+    Turns URL paths into names for Locust's statistics, by applying a list of 
+    *(regex, replacement)* rules in order, using re.sub(). For example::
+    
+        UrlNameNormalizer([
+            (r"/item/\d+", "/item/[id]"),
+            (r"\?.*$", ""),
+        ])
+    
+    turns */item/123?x=1* into */item/[id]*.
+    
+    The regular expressions are compiled once, and the normalized name of each path is 
+    cached, so that a path that has been seen before costs a single dict lookup. The cache 
+    holds at most NAME_CACHE_SIZE paths, and is cleared when it's full.
+    """
+    
+    _instances = {}
+    
+    def __init__(self, rules, cache_size=NAME_CACHE_SIZE):
+        self.rules = [(re.compile(pattern) if isinstance(pattern, basestring) else pattern, replacement) for pattern, replacement in rules]
+        self.cache_size = cache_size
+        self._cache = {}
+    
+    @classmethod
+    def for_rules(cls, rules):
+        """
+        Return a UrlNameNormalizer for *rules*, which is shared with everyone else that uses 
+        the same rules (e.g. all instances of a Locust class), so that they share the cache.
+        """
+        key = tuple((pattern, replacement) for pattern, replacement in rules)
+        normalizer = cls._instances.get(key)
+        if normalizer is None:
+            normalizer = cls._instances[key] = cls(rules)
+        return normalizer
+    
+    def normalize(self, path):
+        name = self._cache.get(path)
+        if name is None:
+            name = path
+            for regex, replacement in self.rules:
+                name = regex.sub(replacement, name)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[path] = name
+        return name
+
+
+class TimedConnectionMixin(object):
+    """
+    Mixin for urllib3's connection classes, that measures how long the phases of each request 
+    take, in milliseconds:
+    
+    * *dns*: resolving the host name
+    * *connect*: establishing the TCP connection
+    * *tls*: the TLS handshake (HTTPS only)
+    * *ttfb*: waiting for the response headers, after the request has been sent
+    
+    The timings are attached to the httplib response as *locust_timings*. When a request is 
+    sent over a kept-alive connection, its dns, connect and tls times are 0.
+    """
+    
+    connection_phases = ("dns", "connect")
+    locust_timings = None
+    
+    def connect(self):
+        self.locust_timings = timings = {}
+        start = monotonic()
+        super(TimedConnectionMixin, self).connect()
+        if "tls" in self.connection_phases:
+            elapsed = (monotonic() - start) * 1000
+            timings["tls"] = max(elapsed - timings.get("dns", 0) - timings.get("connect", 0), 0)
+    
+    def _new_conn(self):
+        dns_host = getattr(self, "_dns_host", None)
+        start = monotonic()
+        addresses = []
+        if dns_host is not None:
+            try:
+                for info in socket.getaddrinfo(dns_host, self.port, allowed_gai_family(), socket.SOCK_STREAM):
+                    if info[4][0] not in addresses:
+                        addresses.append(info[4][0])
+            except socket.error:
+                # let urllib3 resolve the name, and fail the way it usually does
+                pass
+        resolved = monotonic()
+        
+        if not addresses:
+            conn = super(TimedConnectionMixin, self)._new_conn()
+        else:
+            # connect to the addresses that we've already resolved, in order, and raise the 
+            # last error if none of them works, like socket.create_connection does
+            error = None
+            try:
+                for address in addresses:
+                    self._dns_host = address
+                    try:
+                        conn = super(TimedConnectionMixin, self)._new_conn()
+                        break
+                    except (ConnectTimeoutError, NewConnectionError, socket.error) as e:
+                        error = e
+                else:
+                    raise error
+            finally:
+                self._dns_host = dns_host
+        
+        if self.locust_timings is not None:
+            self.locust_timings["dns"] = (resolved - start) * 1000
+            self.locust_timings["connect"] = (monotonic() - resolved) * 1000
+        return conn
+    
+    def getresponse(self, *args, **kwargs):
+        start = monotonic()
+        response = super(TimedConnectionMixin, self).getresponse(*args, **kwargs)
+        end = monotonic()
+        timings = self.locust_timings or dict.fromkeys(self.connection_phases, 0.0)
+        self.locust_timings = None
+        timings["ttfb"] = (end - start) * 1000
+        response.locust_timings = timings
+        response.locust_headers_received = end
+        return response
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnectionPool.ConnectionCls):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnectionPool.ConnectionCls):
+    connection_phases = ("dns", "connect", "tls")
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimingHTTPAdapter(HTTPAdapter):
+    """
+    Transport adapter that makes its requests with connections that measure the 
+    DNS, connect, TLS and time to first byte phases of each request 
+    (see :py:class:`TimedConnectionMixin <locust.clients.TimedConnectionMixin>`).
+    
+    Requests that are sent through a proxy aren't timed.
+    """
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimingHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def get_response_timings(response, end, stream=False):
+    """
+    Return a dict with the time, in milliseconds, that each phase of the request for 
+    *response* took, or None if the request wasn't timed.
+    
+    The phases of all the requests in a redirect chain are summed, and the *body* phase 
+    (from the response headers until *end*) is only included if the body of the response 
+    has been read, i.e. *stream* is False.
+    """
+    timings = {}
+    for r in response.history + [response]:
+        phases = getattr(getattr(r.raw, "_original_response", None), "locust_timings", None)
+        if phases is None:
+            return None
+        for phase, value in phases.iteritems():
+            timings[phase] = timings.get(phase, 0) + value
+    if not stream:
+        timings["body"] = max((end - response.raw._original_response.locust_headers_received) * 1000, 0)
+    for phase, value in timings.iteritems():
+        timings[phase] = round(value, 3)
+    return timings
+
 
 class LocustResponse(Response):
 
@@ -46,11 +240,21 @@ class HttpSession(requests.Session):
                            response, even if the response code is ok (2xx). The opposite also works, one can use catch_response to catch a request
                            and then mark it as successful even if the response code was not (i.e 500 or 404).
     """
+    name_normalizer = None
+    """
+    Optional :py:class:`UrlNameNormalizer <locust.clients.UrlNameNormalizer>` that is used to 
+    get the name of requests that are made without the *name* argument, from the URL path.
+    """
+    
     def __init__(self, base_url, *args, **kwargs):
         requests.Session.__init__(self, *args, **kwargs)
 
         self.base_url = base_url
         
+        # measure the phases of each request, see TimingHTTPAdapter
+        self.mount("https://", TimingHTTPAdapter())
+        self.mount("http://", TimingHTTPAdapter())
+        
         # Check for basic authentication
         parsed_url = urlparse(self.base_url)
         if parsed_url.username and parsed_url.password:
@@ -109,14 +313,21 @@ class HttpSession(requests.Session):
         # set up pre_request hook for attaching meta data to the request object
         request_meta["method"] = method
         request_meta["start_time"] = time.time()
+        start = monotonic()
         
         response = self._send_request_safe_mode(method, url, **kwargs)
         
-        # record the consumed time
-        request_meta["response_time"] = int((time.time() - request_meta["start_time"]) * 1000)
+        # record the consumed time, in milliseconds with microsecond resolution
+        end = monotonic()
+        request_meta["response_time"] = round((end - start) * 1000, 3)
         
     
-        request_meta["name"] = name or (response.history and response.history[0] or response).request.path_url
+        if name:
+            request_meta["name"] = name
+        else:
+            request_meta["name"] = (response.history and response.history[0] or response).request.path_url
+            if self.name_normalizer is not None:
+                request_meta["name"] = self.name_normalizer.normalize(request_meta["name"])
         
         # get the length of the content, but if the argument stream is set to True, we take
         # the size from the content-length header, in order to not trigger fetching of the body
@@ -125,6 +336,14 @@ class HttpSession(requests.Session):
         else:
             request_meta["content_size"] = len(response.content or "")
         
+        timings = get_response_timings(response, end, kwargs.get("stream", False)) if events.request_timings else None
+        if timings is not None:
+            events.request_timings.fire(
+                request_type=request_meta["method"],
+                name=request_meta["name"],
+                timings=timings,
+            )
+        
         if catch_response:
             response.locust_request_meta = request_meta
             return ResponseContextManager(response)
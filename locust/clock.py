@@ -0,0 +1,53 @@
+"""
+Monotonic, high resolution clock for measuring response times.
+
+Unlike time.time(), the clock isn't affected by changes to the system clock (e.g. by NTP), so
+it can be used to measure how long something takes, but its value has no meaning on its own.
+"""
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+
+
+def _clock_gettime_monotonic():
+    """
+    Return a function that calls clock_gettime(CLOCK_MONOTONIC) through ctypes, or None if
+    it isn't available on this platform
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    CLOCK_MONOTONIC = 1
+
+    class timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+    for name in ("c", "rt"):
+        path = ctypes.util.find_library(name)
+        if not path:
+            continue
+        try:
+            clock_gettime = ctypes.CDLL(path, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        ts = timespec()
+        ts_pointer = ctypes.pointer(ts)
+        if clock_gettime(CLOCK_MONOTONIC, ts_pointer) != 0:
+            continue
+
+        def monotonic():
+            if clock_gettime(CLOCK_MONOTONIC, ts_pointer) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+        return monotonic
+    return None
+
+
+# monotonic() returns the value of the clock in seconds, as a float
+if hasattr(time, "perf_counter"):
+    monotonic = time.perf_counter
+else:
+    monotonic = _clock_gettime_monotonic() or time.time
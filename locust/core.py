@@ -9,8 +9,13 @@ import random
 import warnings
 import traceback
 import logging
+from bisect import bisect_right
+from collections import deque
+from types import MethodType
 
-from clients import HttpSession
+from clients import HttpSession, UrlNameNormalizer
+from clock import monotonic
+from stats import global_stats, request_context
 import events
 
 from exception import LocustError, InterruptTaskSet, RescheduleTask, RescheduleTaskImmediately, StopLocust
@@ -90,6 +95,34 @@ class Locust(object):
 
     weight = 10
     """Probability of locust being chosen. The higher the weight, the greater is the chance of it being chosen."""
+    
+    random = random
+    """
+    Random number generator that the locust uses to pick tasks and wait times, and that tasks 
+    should use for their own random choices. When locust runs with --seed, each locust gets its 
+    own random.Random, seeded from the seed, the index of the slave and the index of the locust, 
+    so that the run can be repeated with the same sequence of tasks. Otherwise it's the 
+    random module.
+    """
+    
+    pacing = None
+    """
+    Time, in milliseconds, from the start of one task to the start of the next. If set, it's 
+    used instead of min_wait and max_wait: after a task has finished, the locust only waits 
+    for what is left of the interval, so that it starts tasks at a steady rate no matter how 
+    long they take. A task that takes longer than the interval is followed by the next one 
+    right away, and counted as a missed pace in :py:attr:`RequestStats.pacing_misses 
+    <locust.stats.RequestStats.pacing_misses>`.
+    """
+    
+    expected_interval = None
+    """
+    Expected time, in milliseconds, between the requests that this locust makes. If set, the 
+    response time percentiles are also reported corrected for coordinated omission: a request 
+    that takes longer than the expected interval hides the requests that the locust would 
+    otherwise have made in the meantime, so those are added to the corrected response time 
+    distribution, as requests with response times decreasing by the expected interval.
+    """
         
     client = NoClientWarningRaiser()
     _catch_exceptions = True
@@ -98,12 +131,29 @@ class Locust(object):
         super(Locust, self).__init__()
     
     def run(self):
+        request_context.expected_interval = self.expected_interval
         try:
             self.task_set(self).run()
         except StopLocust:
             pass
         except (RescheduleTask, RescheduleTaskImmediately) as e:
             raise LocustError, LocustError("A task inside a Locust class' main TaskSet (`%s.task_set` of type `%s`) seems to have called interrupt() or raised an InterruptTaskSet exception. The interrupt() function is used to hand over execution to a parent TaskSet, and should never be called in the main TaskSet which a Locust class' task_set attribute points to." % (type(self).__name__, self.task_set.__name__)), sys.exc_info()[2]
+        finally:
+            request_context.expected_interval = None
+    
+    def run_session(self):
+        """
+        Run a single task of the locust's task_set (see :py:meth:`TaskSet.run_once 
+        <locust.core.TaskSet.run_once>`) instead of looping over tasks until the locust is 
+        killed. This is what the locusts that are started in arrival-rate mode do.
+        """
+        request_context.expected_interval = self.expected_interval
+        try:
+            self.task_set(self).run_once()
+        except (StopLocust, InterruptTaskSet, RescheduleTask, RescheduleTaskImmediately):
+            pass
+        finally:
+            request_context.expected_interval = None
 
 
 class HttpLocust(Locust):
@@ -123,12 +173,113 @@ class HttpLocust(Locust):
     The client support cookies, and therefore keeps the session between HTTP requests.
     """
     
+    url_name_rules = None
+    """
+    List of *(regex, replacement)* rules that are applied to the URL path of requests that 
+    are made without the *name* argument, to get the name that they are grouped by in the 
+    statistics. For example::
+    
+        class WebsiteUser(HttpLocust):
+            url_name_rules = [
+                (r"/item/\d+", "/item/[id]"),
+                (r"\?.*$", ""),
+            ]
+    
+    See :py:class:`UrlNameNormalizer <locust.clients.UrlNameNormalizer>`.
+    """
+    
     def __init__(self):
         super(HttpLocust, self).__init__()
         if self.host is None:
             raise LocustError("You must specify the base host. Either in the host attribute in the Locust class, or on the command line using the --host option.")
         
         self.client = HttpSession(base_url=self.host)
+        if self.url_name_rules:
+            self.client.name_normalizer = UrlNameNormalizer.for_rules(self.url_name_rules)
+
+
+_NO_ARGS = ()
+_NO_KWARGS = {}
+""" Shared by the ScheduledTasks without arguments. They're only unpacked, never changed. """
+
+
+class ScheduledTask(object):
+    """
+    A task in a TaskSet's task queue, along with the arguments that it will be called with
+    """
+    
+    __slots__ = ("callable", "args", "kwargs")
+    
+    def __init__(self, callable, args=None, kwargs=None):
+        self.callable = callable
+        self.args = args or _NO_ARGS
+        self.kwargs = kwargs or _NO_KWARGS
+
+
+class TaskList(list):
+    """
+    The *tasks* list of a TaskSet. It holds each task once, and keeps the weight of each task 
+    in *weights*, along with what's needed to pick a weighted task by a binary search, and a 
+    ScheduledTask without arguments for each task in *scheduled_tasks*. These are calculated 
+    again whenever the list is changed.
+    
+    Items that are (task, weight) tuples are replaced by the task, and given that weight. 
+    Other items get the weight that the task had before, or 1. The weights of items that 
+    occur more than once are added together.
+    """
+    
+    def __init__(self, tasks=(), known_weights=None):
+        if isinstance(tasks, dict):
+            tasks = tasks.items()
+        list.__init__(self, tasks)
+        self.weights = []
+        self.known_weights = known_weights or {}
+        self._reweigh()
+    
+    def _reweigh(self):
+        tasks = []
+        weights = {}
+        for item in list.__iter__(self):
+            if isinstance(item, tuple):
+                task, weight = item
+            else:
+                task, weight = item, self.known_weights.get(item, 1)
+            if weight <= 0:
+                continue
+            if task not in weights:
+                tasks.append(task)
+                weights[task] = 0
+            weights[task] += weight
+        
+        list.__setitem__(self, slice(None), tasks)
+        # changed in place, since TaskSet.task_weights refers to the same list
+        self.weights[:] = [weights[task] for task in tasks]
+        self.known_weights = weights
+        # the cumulative weights up to each task but the last, the total weight, and the tasks 
+        # in a tuple, which is faster to index than a list subclass
+        bounds = []
+        total = 0
+        for task in tasks:
+            total += weights[task]
+            bounds.append(total)
+        del bounds[-1:]
+        self.selection = (bounds, total, tuple(tasks))
+        self.scheduled_tasks = dict((task, ScheduledTask(task)) for task in tasks)
+
+
+def _reweigh_after(name):
+    method = getattr(list, name)
+    def mutator(self, *args):
+        result = method(self, *args)
+        self._reweigh()
+        return result
+    mutator.__name__ = name
+    return mutator
+
+for name in ("__setitem__", "__delitem__", "__setslice__", "__delslice__", "__iadd__", "__imul__", 
+             "append", "extend", "insert", "pop", "remove", "reverse", "sort"):
+    setattr(TaskList, name, _reweigh_after(name))
+del name
 
 
 class TaskSetMeta(type):
@@ -138,32 +289,33 @@ class TaskSetMeta(type):
     """
     
     def __new__(mcs, classname, bases, classDict):
-        new_tasks = []
+        # (task, weight) tuples, in the order that they were added
+        tasks = []
         for base in bases:
             if hasattr(base, "tasks") and base.tasks:
-                new_tasks += base.tasks
+                base_tasks = base.tasks
+                if not isinstance(base_tasks, TaskList):
+                    base_tasks = TaskList(base_tasks)
+                tasks.extend(zip(base_tasks, base_tasks.weights))
         
         if "tasks" in classDict and classDict["tasks"] is not None:
-            tasks = classDict["tasks"]
-            if isinstance(tasks, dict):
-                tasks = list(tasks.iteritems())
-            
-            for task in tasks:
-                if isinstance(task, tuple):
-                    task, count = task
-                    for i in xrange(0, count):
-                        new_tasks.append(task)
-                else:
-                    new_tasks.append(task)
+            class_tasks = TaskList(classDict["tasks"])
+            tasks.extend(zip(class_tasks, class_tasks.weights))
         
         for item in classDict.itervalues():
             if hasattr(item, "locust_task_weight"):
-                for i in xrange(0, item.locust_task_weight):
-                    new_tasks.append(item)
+                tasks.append((item, item.locust_task_weight))
         
-        classDict["tasks"] = new_tasks
+        classDict["tasks"] = TaskList(tasks)
+        classDict["task_weights"] = classDict["tasks"].weights
         
         return type.__new__(mcs, classname, bases, classDict)
+    
+    def __setattr__(cls, name, value):
+        if name == "tasks" and not isinstance(value, TaskList):
+            value = TaskList(value, cls.tasks.known_weights)
+            type.__setattr__(cls, "task_weights", value.weights)
+        type.__setattr__(cls, name, value)
 
 class TaskSet(object):
     """
@@ -196,6 +348,19 @@ class TaskSet(object):
 
         class ForumPage(TaskSet):
             tasks = {ThreadPage:15, write_post:1}
+    
+    When the class is created, this is turned into a list of the distinct tasks, and their 
+    weights are stored in *task_weights*.
+    """
+    
+    task_weights = []
+    """
+    The weight of each task in *tasks*. A task is picked by a binary search over the cumulative 
+    weights, so large weights don't cost any memory or time.
+    
+    If *tasks* is replaced, or tasks are added to or removed from it, the weights are calculated 
+    again (see :py:class:`TaskList <locust.core.TaskList>`). Tasks that were there before keep 
+    their weights, and new tasks get the weight 1, unless they are added as (task, weight) tuples.
     """
     
     min_wait = None
@@ -212,6 +377,13 @@ class TaskSet(object):
     TaskSet.
     """
     
+    pacing = None
+    """
+    Time, in milliseconds, from the start of one task to the start of the next. Can be used 
+    to override the pacing defined in the root Locust class, which will be used if not set 
+    on the TaskSet.
+    """
+    
     locust = None
     """Will refer to the root Locust class instance when the TaskSet has been instantiated"""
 
@@ -224,7 +396,7 @@ class TaskSet(object):
     __metaclass__ = TaskSetMeta    
     
     def __init__(self, parent):
-        self._task_queue = []
+        self._task_queue = deque()
         self._time_start = time()
         
         if isinstance(parent, TaskSet):
@@ -241,6 +413,11 @@ class TaskSet(object):
             self.min_wait = self.locust.min_wait
         if not self.max_wait:
             self.max_wait = self.locust.max_wait
+        if self.pacing is None:
+            self.pacing = self.locust.pacing
+        self._iteration_start = None
+        # whether the TaskSet is run by run_once() instead of run()
+        self._once = False
 
     def run(self, *args, **kwargs):
         self.args = args
@@ -259,6 +436,9 @@ class TaskSet(object):
             try:
                 if self.locust.stop_timeout is not None and time() - self._time_start > self.locust.stop_timeout:
                     return
+                
+                if self.pacing is not None:
+                    self._iteration_start = monotonic()
         
                 if not self._task_queue:
                     self.schedule_task(self.get_next_task())
@@ -288,18 +468,62 @@ class TaskSet(object):
                 else:
                     raise
     
+    def run_once(self, *args, **kwargs):
+        """
+        Run on_start (if defined) and a single task, along with the tasks that it schedules, 
+        without waiting in between. If the task is a nested TaskSet, it also runs a single 
+        task instead of looping until it's interrupted.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        self._once = True
+        
+        try:
+            if hasattr(self, "on_start"):
+                self.on_start()
+        except InterruptTaskSet as e:
+            if e.reschedule:
+                raise RescheduleTaskImmediately, e, sys.exc_info()[2]
+            else:
+                raise RescheduleTask, e, sys.exc_info()[2]
+        
+        if not self._task_queue:
+            self.schedule_task(self.get_next_task())
+        while self._task_queue:
+            try:
+                self.execute_next_task()
+            except (RescheduleTask, RescheduleTaskImmediately):
+                pass
+            except InterruptTaskSet as e:
+                if e.reschedule:
+                    raise RescheduleTaskImmediately, e, sys.exc_info()[2]
+                else:
+                    raise RescheduleTask, e, sys.exc_info()[2]
+            except (StopLocust, GreenletExit):
+                raise
+            except Exception as e:
+                events.locust_error.fire(locust_instance=self, exception=e, tb=sys.exc_info()[2])
+                if self.locust._catch_exceptions:
+                    sys.stderr.write("\n" + traceback.format_exc())
+                    return
+                raise
+    
     def execute_next_task(self):
-        task = self._task_queue.pop(0)
-        self.execute_task(task["callable"], *task["args"], **task["kwargs"])
+        task = self._task_queue.popleft()
+        self.execute_task(task.callable, *task.args, **task.kwargs)
     
     def execute_task(self, task, *args, **kwargs):
         # check if the function is a method bound to the current locust, and if so, don't pass self as first argument
-        if hasattr(task, "im_self") and task.__self__ == self:
+        # (type checks, since a failing hasattr() costs an exception for every plain function)
+        if isinstance(task, MethodType) and task.__self__ == self:
             # task is a bound method on self
             task(*args, **kwargs)
-        elif hasattr(task, "tasks") and issubclass(task, TaskSet):
+        elif isinstance(task, TaskSetMeta):
             # task is another (nested) TaskSet class
-            task(self).run(*args, **kwargs)
+            if self._once:
+                task(self).run_once(*args, **kwargs)
+            else:
+                task(self).run(*args, **kwargs)
         else:
             # task is a function
             task(self, *args, **kwargs)
@@ -315,19 +539,51 @@ class TaskSet(object):
         * kwargs: Dict of keyword arguments that will be passed to the task callable.
         * first: Optional keyword argument. If True, the task will be put first in the queue.
         """
-        task = {"callable":task_callable, "args":args or [], "kwargs":kwargs or {}}
+        if args or kwargs:
+            task = ScheduledTask(task_callable, args, kwargs)
+        else:
+            # reuse the record of the task, if it's one of this TaskSet's tasks
+            try:
+                task = self.tasks.scheduled_tasks.get(task_callable)
+            except (AttributeError, TypeError):
+                task = None
+            if task is None:
+                task = ScheduledTask(task_callable)
         if first:
-            self._task_queue.insert(0, task)
+            self._task_queue.appendleft(task)
         else:
             self._task_queue.append(task)
     
     def get_next_task(self):
-        return random.choice(self.tasks)
+        try:
+            bounds, total, tasks = self.tasks.selection
+        except AttributeError:
+            # tasks has been replaced on this instance by a plain list or dict
+            self.tasks = TaskList(self.tasks, type(self).tasks.known_weights)
+            self.task_weights = self.tasks.weights
+            bounds, total, tasks = self.tasks.selection
+        return tasks[bisect_right(bounds, self.locust.random.random() * total)]
     
     def wait(self):
-        millis = random.randint(self.min_wait, self.max_wait)
+        if self.pacing is not None:
+            self._wait_for_pace()
+            return
+        millis = self.locust.random.randint(self.min_wait, self.max_wait)
         seconds = millis / 1000.0
         self._sleep(seconds)
+    
+    def _wait_for_pace(self):
+        interval = self.pacing / 1000.0
+        if self._iteration_start is None:
+            # wait() was called outside of the run loop
+            self._sleep(interval)
+            return
+        elapsed = monotonic() - self._iteration_start
+        self._iteration_start = None
+        missed = elapsed > interval
+        global_stats.log_pacing(missed)
+        if not missed:
+            self._sleep(interval - elapsed)
 
     def _sleep(self, seconds):
         gevent.sleep(seconds)
@@ -352,4 +608,12 @@ class TaskSet(object):
         Locust instance.
         """
         return self.locust.client
+    
+    @property
+    def random(self):
+        """
+        Reference to the :py:attr:`random <locust.core.Locust.random>` attribute of the root 
+        Locust instance.
+        """
+        return self.locust.random
 
@@ -1,3 +1,21 @@
+import logging
+from itertools import izip
+from weakref import WeakKeyDictionary
+
+import gevent
+from gevent.queue import Queue, Full, Empty
+
+from clock import monotonic
+
+logger = logging.getLogger(__name__)
+
+DEFERRED_QUEUE_SIZE = 10000
+""" Default maximum number of events that a DeferredListener holds before it drops events """
+
+DEFERRED_BATCH_SIZE = 100
+""" Default maximum number of events that a DeferredListener delivers before it yields to other greenlets """
+
+
 class EventHook(object):
     """
     Simple event class used to provide hooks for different types of events in Locust.
@@ -9,24 +27,266 @@ class EventHook(object):
             print "Event was fired with arguments: %s, %s" % (a, b)
         my_event += on_my_event
         my_event.fire(a="foo", b="bar")
+    
+    Since some events are fired for every request, the fire method is replaced with a 
+    function that is specialized for the current listeners whenever they change: it does 
+    nothing if there are no listeners, and *is* the listener if there's only one. An 
+    EventHook is false if it has no listeners, so that the arguments of an event don't 
+    have to be computed when nobody listens::
+    
+        if my_event:
+            my_event.fire(a=expensive(), b="bar")
+    
+    If *batch_fields* (the names of the arguments of the event) is given, the event can also 
+    be fired for many sets of arguments at once with :py:meth:`fire_batch`.
+    """
+    
+    profiling = False
     """
+    If True, the number of calls and the time spent in each listener is recorded. Use 
+    :py:func:`set_listener_profiling` to turn it on or off for all EventHooks.
+    """
+    
+    # all the EventHooks, as keys (WeakSet needs Python 2.7)
+    _instances = WeakKeyDictionary()
 
-    def __init__(self):
+    def __init__(self, batch_fields=None):
+        self.batch_fields = batch_fields
+        self._profile = {}
         self._handlers = []
+        EventHook._instances[self] = True
+
+    @property
+    def _handlers(self):
+        return self._handler_list
+
+    @_handlers.setter
+    def _handlers(self, handlers):
+        self._handler_list = list(handlers)
+        self._compile()
 
     def __iadd__(self, handler):
-        self._handlers.append(handler)
+        self._handler_list.append(handler)
+        self._compile()
         return self
 
     def __isub__(self, handler):
-        self._handlers.remove(handler)
+        self._handler_list.remove(handler)
+        self._compile()
         return self
 
+    def __nonzero__(self):
+        return bool(self._handler_list)
+
     def fire(self, **kwargs):
-        for handler in self._handlers:
+        """
+        Call all listeners with the given keyword arguments
+        """
+        for handler in self._handler_list:
+            handler(**kwargs)
+
+    def fire_batch(self, rows):
+        """
+        Fire the event once for each row in *rows*, a sequence of tuples with the arguments 
+        in the order of *batch_fields*. 
+        
+        Listeners that have a *batch_handler* attribute are called once, with *rows* as the 
+        only argument, which is much faster than firing the event for each row. The event is 
+        replayed row by row to the other listeners.
+        
+        Raises TypeError if the EventHook has no *batch_fields*.
+        """
+        if self.batch_fields is None:
+            raise TypeError("fire_batch() needs an EventHook with batch_fields")
+        for handler in self._batch_handlers:
+            handler(rows)
+
+    def _compile(self):
+        handlers = self._handler_list
+        batch_handlers = []
+        if self.batch_fields is not None:
+            batch_handlers = [getattr(handler, "batch_handler", None) or _replay(handler, self.batch_fields) for handler in handlers]
+        if self.profiling:
+            batch_handlers = [self._profiled(handler, batch_handler) for handler, batch_handler in zip(handlers, batch_handlers)]
+            handlers = [self._profiled(handler) for handler in handlers]
+        self._batch_handlers = tuple(batch_handlers)
+        if not handlers:
+            self.fire = _fire_nothing
+        elif len(handlers) == 1:
+            self.fire = handlers[0]
+        else:
+            self.fire = _fire_all(tuple(handlers))
+
+    def _profiled(self, handler, function=None):
+        """
+        Wrap *function* (the handler itself by default), so that its calls and time are 
+        recorded for *handler*
+        """
+        function = function or handler
+        stats = self._profile.get(handler)
+        if stats is None:
+            stats = self._profile[handler] = [0, 0.0]
+        def profiled_handler(*args, **kwargs):
+            start = monotonic()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats[0] += 1
+                stats[1] += monotonic() - start
+        return profiled_handler
+
+
+class DeferredListener(object):
+    """
+    Wraps an event listener, so that it's called in a background greenlet instead of in the 
+    greenlet that fires the event (e.g. the locust that made a request). This keeps listeners 
+    that do I/O, like writing to a file or sending metrics somewhere, from delaying the locusts 
+    and thereby skewing the response times::
+    
+        events.request_success += DeferredListener(on_request_success)
+    
+    The events are put in a queue that holds at most *queue_size* events. When it's full, 
+    further events are dropped, and counted in *dropped*. The queued events are delivered 
+    *batch_size* at a time, and the remaining events are delivered when locust is quitting.
+    
+    A DeferredListener compares equal to the listener it wraps, so the listener can be removed 
+    with ``events.request_success -= on_request_success``. The background greenlet is started 
+    when the DeferredListener is created, and stop() stops it.
+    """
+    
+    def __init__(self, handler, queue_size=DEFERRED_QUEUE_SIZE, batch_size=DEFERRED_BATCH_SIZE):
+        self.handler = handler
+        self.batch_size = batch_size
+        self.queue = Queue(queue_size)
+        self.dropped = 0
+        self.__module__ = getattr(handler, "__module__", None)
+        self.__name__ = getattr(handler, "__name__", repr(handler))
+        self._worker = None
+        self.start()
+    
+    def __call__(self, **kwargs):
+        try:
+            self.queue.put_nowait(kwargs)
+        except Full:
+            if not self.dropped:
+                logger.warning("The event queue of the deferred listener %s.%s is full, events are dropped" % (self.__module__, self.__name__))
+            self.dropped += 1
+    
+    def start(self):
+        """
+        Start the greenlet that delivers the events, and deliver the remaining events when 
+        locust is quitting
+        """
+        if self._worker is not None:
+            return
+        self._worker = gevent.spawn(self._deliver)
+        hook = quitting
+        hook += self.flush
+    
+    def stop(self):
+        """
+        Deliver the queued events, and stop the greenlet that delivers the events
+        """
+        if self._worker is None:
+            return
+        hook = quitting
+        hook -= self.flush
+        self._worker.kill(block=True)
+        self._worker = None
+        self.flush()
+    
+    def __eq__(self, other):
+        if isinstance(other, DeferredListener):
+            return self.handler == other.handler
+        return self.handler == other
+    
+    def __ne__(self, other):
+        return not self == other
+    
+    def __hash__(self):
+        return hash(self.handler)
+    
+    def _deliver(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            for kwargs in batch:
+                self._call(kwargs)
+            gevent.sleep(0)
+    
+    def _call(self, kwargs):
+        try:
+            self.handler(**kwargs)
+        except Exception:
+            logger.exception("Deferred event listener %s.%s raised an exception" % (self.__module__, self.__name__))
+    
+    def flush(self):
+        """
+        Deliver the queued events in the current greenlet
+        """
+        while True:
+            try:
+                kwargs = self.queue.get_nowait()
+            except Empty:
+                return
+            self._call(kwargs)
+
+
+def _fire_nothing(**kwargs):
+    pass
+
+def _replay(handler, fields):
+    def replay(rows):
+        for row in rows:
+            handler(**dict(izip(fields, row)))
+    return replay
+
+def _fire_all(handlers):
+    def fire(**kwargs):
+        for handler in handlers:
             handler(**kwargs)
+    return fire
 
-request_success = EventHook()
+def set_listener_profiling(enabled):
+    """
+    Turn recording of the number of calls and the time spent in each event listener on or off. 
+    Profiling adds some overhead to each call, so it's off by default.
+    """
+    EventHook.profiling = enabled
+    for hook in EventHook._instances.keys():
+        hook._compile()
+
+def get_listener_profile():
+    """
+    Return a list of dicts with the *event*, *listener*, number of *calls* and *total_time* 
+    (in seconds) spent in each listener since profiling was turned on, the slowest first. 
+    
+    The time is wall clock time, which includes the time that a listener waits for I/O, 
+    during which other greenlets run.
+    """
+    names = dict((hook, name) for name, hook in globals().iteritems() if isinstance(hook, EventHook))
+    rows = []
+    for hook in EventHook._instances.keys():
+        for handler, (calls, total_time) in hook._profile.items():
+            rows.append({
+                "event": names.get(hook, "unknown"),
+                "listener": "%s.%s" % (getattr(handler, "__module__", None), getattr(handler, "__name__", repr(handler))),
+                "calls": calls,
+                "total_time": total_time,
+            })
+    rows.sort(key=lambda row: row["total_time"], reverse=True)
+    return rows
+
+def reset_listener_profile():
+    for hook in EventHook._instances.keys():
+        for stats in hook._profile.itervalues():
+            stats[:] = [0, 0.0]
+
+request_success = EventHook(batch_fields=("request_type", "name", "response_time", "response_length"))
 """
 *request_success* is fired when a request is completed successfully.
 
@@ -34,11 +294,15 @@ Listeners should take the following arguments:
 
 * *request_type*: Request type method used
 * *name*: Path to the URL that was called (or override name if it was used in the call to the client)
-* *response_time*: Response time in milliseconds
+* *response_time*: Response time in milliseconds (a float, with microsecond resolution for requests made by HttpSession)
 * *response_length*: Content-length of the response
+
+Clients that complete many requests at once can report them with 
+``request_success.fire_batch(rows)``, where each row is a *(request_type, name, response_time, 
+response_length)* tuple (see :py:meth:`EventHook.fire_batch`).
 """
 
-request_failure = EventHook()
+request_failure = EventHook(batch_fields=("request_type", "name", "response_time", "exception"))
 """
 *request_failure* is fired when a request fails
 
@@ -48,6 +312,22 @@ Event is fired with the following arguments:
 * *name*: Path to the URL that was called (or override name if it was used in the call to the client)
 * *response_time*: Time in milliseconds until exception was thrown
 * *exception*: Exception instance that was thrown
+
+Many failures can be reported at once with ``request_failure.fire_batch(rows)``, where each 
+row is a *(request_type, name, response_time, exception)* tuple.
+"""
+
+request_timings = EventHook()
+"""
+*request_timings* is fired by HttpSession for each request (successful or not) that got a 
+response, with a breakdown of the response time.
+
+Event is fired with the following arguments:
+
+* *request_type*: Request type method used
+* *name*: Path to the URL that was called (or override name if it was used in the call to the client)
+* *timings*: Dict with the time in milliseconds of each phase of the request: *dns*, *connect*, 
+  *tls* (HTTPS only), *ttfb* (time to first byte) and *body* (not for streamed responses)
 """
 
 locust_error = EventHook()
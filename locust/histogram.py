@@ -0,0 +1,475 @@
+import sys
+import math
+import struct
+import operator
+import zlib
+from array import array
+from itertools import repeat, izip
+
+DEFAULT_SIGNIFICANT_DIGITS = 2
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# array typecodes that the counts are stored in, from the smallest to the largest
+COUNT_TYPECODES = ("B", "H", "I", "L")
+
+# kind, item size of the counts, precision, offset, zero count, total count
+BINARY_HEADER = struct.Struct("<cBdqQQ")
+
+
+class Histogram(object):
+    """
+    Histogram of non-negative integer values with a fixed relative precision.
+
+    Values are counted in log-linear buckets (the same bucket layout as HdrHistogram uses).
+    Every value below *sub_bucket_count* gets a bucket of its own, and above that each power
+    of two range is split into *sub_bucket_count / 2* equally wide buckets. This means that
+    any recorded value can be read back with a relative error smaller than
+    10^-significant_digits, while recording is a constant time array update, and percentiles
+    can be calculated by a single pass over the buckets.
+
+    Two histograms with the same number of significant digits can be merged without losing
+    any precision.
+
+    The counts array only spans the buckets between the lowest and the highest recorded value
+    (the index of the first bucket is stored in *offset*), so that a histogram with values in a
+    narrow range stays small. For the same reason, the counts start out as bytes, and the array
+    is converted to a larger integer type the first time a count doesn't fit.
+    """
+
+    __slots__ = ("significant_digits", "_sub_bucket_bits", "_sub_bucket_half", "total_count", "offset", "counts")
+
+    KIND = "H"
+
+    def __init__(self, significant_digits=DEFAULT_SIGNIFICANT_DIGITS):
+        if significant_digits < 1 or significant_digits > 5:
+            raise ValueError("significant_digits must be between 1 and 5")
+        self.significant_digits = significant_digits
+        self._sub_bucket_bits = int(math.ceil(math.log(2 * 10**significant_digits, 2)))
+        self._sub_bucket_half = 1 << (self._sub_bucket_bits - 1)
+        self.reset()
+
+    def reset(self):
+        self.total_count = 0
+        self.offset = 0
+        self.counts = array(COUNT_TYPECODES[0])
+
+    def record(self, value, count=1):
+        """
+        Record *value* (which is rounded to the nearest integer) *count* times
+        """
+        if value < 0:
+            value = 0
+        index = self._index(int(round(value)))
+        position = index - self.offset
+        if position < 0 or position >= len(self.counts):
+            self._ensure_range(index, index)
+            position = index - self.offset
+        self._add(position, count)
+        self.total_count += count
+
+    def record_sequence(self, value, step, low):
+        """
+        Record *value*, *value* - *step*, *value* - 2 * *step*, and so on, for as long as the 
+        value is at least *low*. The values that fall into the same bucket are recorded at once, 
+        so this takes time proportional to the number of buckets rather than the number of values.
+        """
+        if step <= 0:
+            raise ValueError("step must be positive")
+        while value >= low:
+            count = max(int((value - max(self._bucket_floor(value), low)) // step) + 1, 1)
+            self.record(value, count)
+            value -= count * step
+
+    def _bucket_floor(self, value):
+        """
+        Return the lowest value that is counted in the same bucket as *value*
+        """
+        index = self._index(int(round(max(value, 0))))
+        if index >= 2 * self._sub_bucket_half:
+            shift = index // self._sub_bucket_half - 1
+            index = (index - shift * self._sub_bucket_half) << shift
+        # values are rounded to the nearest integer when they are recorded
+        return index - 0.5
+
+    def _add(self, position, count):
+        while True:
+            try:
+                self.counts[position] += count
+                return
+            except OverflowError:
+                self._widen()
+
+    def _set_counts(self, start, end, counts):
+        while True:
+            try:
+                self.counts[start:end] = array(self.counts.typecode, counts)
+                return
+            except OverflowError:
+                self._widen()
+
+    def _widen(self):
+        """
+        Convert the counts to the next larger integer type
+        """
+        self.counts = array(COUNT_TYPECODES[COUNT_TYPECODES.index(self.counts.typecode) + 1], self.counts)
+
+    def _ensure_range(self, low, high):
+        """
+        Make sure that the counts array covers the bucket indexes *low* to *high*
+        """
+        counts = self.counts
+        if not counts:
+            self.offset = low
+            counts.extend(repeat(0, high - low + 1))
+            return
+        if low < self.offset:
+            counts[0:0] = array(counts.typecode, repeat(0, self.offset - low))
+            self.offset = low
+        end = self.offset + len(counts)
+        if high >= end:
+            counts.extend(repeat(0, high - end + 1))
+
+    def merge(self, other):
+        """
+        Add all values recorded in the *other* histogram to this one
+        """
+        if not self._same_layout(other):
+            for value, count in other:
+                self.record(value, count)
+            return
+        if not other.total_count:
+            return
+        self._ensure_range(other.offset, other.offset + len(other.counts) - 1)
+        start = other.offset - self.offset
+        end = start + len(other.counts)
+        self._set_counts(start, end, map(operator.add, self.counts[start:end], other.counts))
+        self.total_count += other.total_count
+
+    def _same_layout(self, other):
+        """
+        Return True if *other* counts values in the same buckets as this histogram
+        """
+        return type(other) is type(self) and other.significant_digits == self.significant_digits
+
+    def _empty(self):
+        return Histogram(self.significant_digits)
+
+    def copy(self):
+        histogram = self._empty()
+        histogram.total_count = self.total_count
+        histogram.offset = self.offset
+        histogram.counts = array(self.counts.typecode, self.counts)
+        return histogram
+
+    def difference(self, earlier):
+        """
+        Return a new histogram with the values that has been recorded in this histogram since
+        *earlier*, which should be a copy of this histogram that was made earlier.
+        
+        Raises ValueError if *earlier* has values that this histogram doesn't have.
+        """
+        if not self._same_layout(earlier):
+            raise ValueError("Can't subtract histograms with different precision")
+        histogram = self.copy()
+        if not earlier.total_count:
+            return histogram
+        start = earlier.offset - histogram.offset
+        end = start + len(earlier.counts)
+        if earlier.total_count > histogram.total_count or start < 0 or end > len(histogram.counts):
+            raise ValueError("Can't subtract a histogram that isn't an earlier copy of this one")
+        counts = map(operator.sub, histogram.counts[start:end], earlier.counts)
+        if min(counts) < 0:
+            raise ValueError("Can't subtract a histogram that isn't an earlier copy of this one")
+        histogram.counts[start:end] = array(histogram.counts.typecode, counts)
+        histogram.total_count -= earlier.total_count
+        return histogram
+
+    def percentile(self, percent):
+        """
+        Get the value that a certain number of percent of the recorded values are lower or
+        equal to.
+
+        Percent specified in range: 0.0 - 1.0
+        """
+        return self._value_at_count(int(self.total_count * percent))
+
+    def median(self):
+        return self._value_at_count((self.total_count - 1) // 2)
+
+    def _value_at_count(self, count):
+        """
+        Return the value of the first bucket where more than *count* values have been
+        recorded up to and including the bucket.
+        """
+        if not self.total_count:
+            return None
+        processed = 0
+        last_index = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count:
+                processed += bucket_count
+                last_index = index
+                if processed > count:
+                    break
+        return self._value_from_index(last_index + self.offset)
+
+    def _index(self, value):
+        # the bit length of value (int.bit_length() needs Python 2.7). Above 53 bits, float(value) 
+        # can be rounded up to the next power of two
+        bits = math.frexp(value)[1]
+        if bits > 53 and not value >> (bits - 1):
+            bits -= 1
+        shift = bits - self._sub_bucket_bits
+        if shift <= 0:
+            return value
+        return shift * self._sub_bucket_half + (value >> shift)
+
+    def _value_from_index(self, index):
+        """
+        Return the value that represents all values that are counted in the bucket at *index*.
+
+        Since any value within the bucket is equally correct, we pick the "roundest" one (the
+        one with most trailing zeros), so that e.g. 700 is reported as 700 even when the
+        bucket stretches from 698 to 701.
+        """
+        half = self._sub_bucket_half
+        if index < 2 * half:
+            return index
+        shift = index // half - 1
+        low = (index - shift * half) << shift
+        high = low + (1 << shift) - 1
+        step = 1
+        while True:
+            next_step = step * 10
+            if -(-low // next_step) * next_step > high:
+                break
+            step = next_step
+        return -(-low // step) * step
+
+    def __iter__(self):
+        """
+        Iterate over (value, count) tuples for all non empty buckets, in ascending order
+        """
+        offset = self.offset
+        for index, count in enumerate(self.counts):
+            if count:
+                yield self._value_from_index(index + offset), count
+
+    def __nonzero__(self):
+        return self.total_count > 0
+
+    def to_dict(self):
+        """
+        Return a {value: count} dict with the contents of the histogram, that can be
+        turned back into an identical histogram with from_dict().
+        """
+        return dict(self)
+
+    @classmethod
+    def from_dict(cls, data, significant_digits=DEFAULT_SIGNIFICANT_DIGITS):
+        histogram = cls(significant_digits)
+        for value, count in data.iteritems():
+            histogram.record(value, count)
+        return histogram
+
+    def to_bytes(self):
+        """
+        Return a compact binary representation of the histogram, that can be turned back 
+        into an identical histogram with from_bytes(). The counts are zlib compressed, since 
+        they are mostly zeros and small numbers.
+        """
+        counts = self.counts
+        if sys.byteorder != "little":
+            counts = array(counts.typecode, counts)
+            counts.byteswap()
+        return BINARY_HEADER.pack(self.KIND, counts.itemsize, self._precision(), self.offset, self._zero_count(), self.total_count) + zlib.compress(counts.tostring(), 1)
+
+    def buckets(self):
+        """
+        Return an (indexes, counts) tuple of lists with the bucket index and count of every 
+        non empty bucket, in ascending order. Values counted separately from the buckets 
+        (see DDSketch.zero_count) aren't included.
+        """
+        indexes = []
+        counts = []
+        offset = self.offset
+        for index, count in enumerate(self.counts):
+            if count:
+                indexes.append(index + offset)
+                counts.append(count)
+        return indexes, counts
+
+    def add_buckets(self, indexes, counts, zero_count=0):
+        """
+        Add the counts returned by buckets() on a histogram with the same layout
+        """
+        if indexes:
+            self._ensure_range(indexes[0], indexes[-1])
+            offset = self.offset
+            for index, count in izip(indexes, counts):
+                self._add(index - offset, count)
+            self.total_count += sum(counts)
+
+    def _precision(self):
+        return self.significant_digits
+
+    def _zero_count(self):
+        return 0
+
+
+class DDSketch(Histogram):
+    """
+    Quantile sketch (DDSketch) of non-negative values with a bounded relative error.
+
+    Positive values are counted in buckets whose boundaries are the powers of 
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy), so that the number of buckets 
+    only grows logarithmically with the range of the values, and any percentile can be read 
+    back with a relative error of at most *relative_accuracy*. Zero (and negative) values are 
+    counted separately.
+
+    Unlike Histogram, values aren't rounded to integers, and a bucket is represented by the 
+    value in the bucket that has the smallest relative error, rather than a round number.
+    """
+
+    __slots__ = ("relative_accuracy", "_multiplier", "_gamma", "zero_count")
+
+    KIND = "D"
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.significant_digits = None
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self._gamma)
+        self.reset()
+
+    def reset(self):
+        super(DDSketch, self).reset()
+        self.zero_count = 0
+
+    def record(self, value, count=1):
+        if value <= 0:
+            self.zero_count += count
+            self.total_count += count
+            return
+        index = self._index(value)
+        position = index - self.offset
+        if position < 0 or position >= len(self.counts):
+            self._ensure_range(index, index)
+            position = index - self.offset
+        self._add(position, count)
+        self.total_count += count
+
+    def merge(self, other):
+        if self._same_layout(other):
+            self.zero_count += other.zero_count
+        super(DDSketch, self).merge(other)
+
+    def _same_layout(self, other):
+        return type(other) is type(self) and other.relative_accuracy == self.relative_accuracy
+
+    def _empty(self):
+        return DDSketch(self.relative_accuracy)
+
+    def _bucket_floor(self, value):
+        if value <= 0:
+            return value
+        return self._gamma ** (self._index(value) - 1)
+
+    def copy(self):
+        sketch = super(DDSketch, self).copy()
+        sketch.zero_count = self.zero_count
+        return sketch
+
+    def difference(self, earlier):
+        if earlier.zero_count > self.zero_count:
+            raise ValueError("Can't subtract a sketch that isn't an earlier copy of this one")
+        sketch = super(DDSketch, self).difference(earlier)
+        sketch.zero_count -= earlier.zero_count
+        return sketch
+
+    def _value_at_count(self, count):
+        if not self.total_count:
+            return None
+        if count < self.zero_count:
+            return 0
+        processed = self.zero_count
+        last_index = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count:
+                processed += bucket_count
+                last_index = index
+                if processed > count:
+                    break
+        return self._value_from_index(last_index + self.offset)
+
+    def _index(self, value):
+        return int(math.ceil(math.log(value) * self._multiplier))
+
+    def _value_from_index(self, index):
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def __iter__(self):
+        if self.zero_count:
+            yield 0, self.zero_count
+        for item in super(DDSketch, self).__iter__():
+            yield item
+
+    @classmethod
+    def from_dict(cls, data, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        sketch = cls(relative_accuracy)
+        for value, count in data.iteritems():
+            sketch.record(value, count)
+        return sketch
+
+    def add_buckets(self, indexes, counts, zero_count=0):
+        super(DDSketch, self).add_buckets(indexes, counts)
+        self.zero_count += zero_count
+        self.total_count += zero_count
+
+    def _precision(self):
+        return self.relative_accuracy
+
+    def _zero_count(self):
+        return self.zero_count
+
+
+def layout(histogram):
+    """
+    Return a (kind, precision) tuple that new_histogram() can create an empty histogram 
+    with the same layout as *histogram* from
+    """
+    return histogram.KIND, histogram._precision()
+
+
+def new_histogram(kind, precision):
+    if kind == Histogram.KIND:
+        return Histogram(int(precision))
+    elif kind == DDSketch.KIND:
+        return DDSketch(precision)
+    raise ValueError("Unknown histogram kind: %r" % kind)
+
+
+def from_bytes(data):
+    """
+    Return the Histogram or DDSketch that *data*, which was returned by to_bytes(), represents
+    """
+    kind, itemsize, precision, offset, zero_count, total_count = BINARY_HEADER.unpack_from(data)
+    histogram = new_histogram(kind, precision)
+    if zero_count:
+        histogram.zero_count = zero_count
+    for typecode in COUNT_TYPECODES:
+        if array(typecode).itemsize == itemsize:
+            break
+    else:
+        raise ValueError("Unsupported count size: %i" % itemsize)
+    counts = array(typecode)
+    counts.fromstring(zlib.decompress(data[BINARY_HEADER.size:]))
+    if sys.byteorder != "little":
+        counts.byteswap()
+    histogram.counts = counts
+    histogram.offset = offset
+    histogram.total_count = total_count
+    return histogram
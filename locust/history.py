@@ -0,0 +1,174 @@
+import time
+from array import array
+
+HISTORY_CAPACITY = 1000
+""" Number of points that a TimeSeries holds before it's compacted to half its resolution """
+
+HISTORY_MAX_ENTRIES = 500
+""" Maximum number of stats entries (not counting the total) that history is kept for """
+
+
+class IntervalStats(object):
+    """
+    Keeps a copy of the cumulative counters of a StatsEntry, in order to calculate the stats
+    for the interval between two calls to update().
+    """
+
+    __slots__ = ("entry", "resets", "time", "num_requests", "num_failures", "response_times")
+
+    def __init__(self):
+        self.entry = None
+
+    def update(self, entry, now):
+        """
+        Return a (num_requests, num_failures, response_times, elapsed) tuple for the interval
+        since the last call, where response_times is a Histogram of the response times of
+        the requests that were made within the interval.
+        """
+        if entry is not self.entry or entry.resets != self.resets:
+            # first update for this entry, or the stats has been reset since the last update
+            self.entry = entry
+            self.resets = entry.resets
+            self.time = entry.start_time
+            self.num_requests = 0
+            self.num_failures = 0
+            self.response_times = None
+
+        if self.response_times is None:
+            response_times = entry.response_times
+        else:
+            response_times = entry.response_times.difference(self.response_times)
+        interval = (
+            entry.num_requests - self.num_requests,
+            entry.num_failures - self.num_failures,
+            response_times,
+            max(now - self.time, 0.001),
+        )
+        self.time = now
+        self.num_requests = entry.num_requests
+        self.num_failures = entry.num_failures
+        self.response_times = entry.response_times.copy()
+        return interval
+
+
+class TimeSeries(object):
+    """
+    Stats for a single stats entry (or the total) over time, stored column wise in arrays.
+
+    Each point holds the stats for the interval since the previous point.
+    """
+
+    COLUMNS = (
+        ("time", "d"),
+        ("rps", "f"),
+        ("failures_per_sec", "f"),
+        ("response_time_percentile_50", "f"),
+        ("response_time_percentile_95", "f"),
+        ("response_time_percentile_99", "f"),
+        ("user_count", "L"),
+    )
+
+    __slots__ = tuple(column for column, typecode in COLUMNS) + ("interval",)
+
+    def __init__(self):
+        for column, typecode in self.COLUMNS:
+            setattr(self, column, array(typecode))
+        self.interval = IntervalStats()
+
+    def __len__(self):
+        return len(self.time)
+
+    def record(self, entry, user_count, now):
+        num_requests, num_failures, response_times, elapsed = self.interval.update(entry, now)
+        self.time.append(now)
+        self.rps.append(num_requests / elapsed)
+        self.failures_per_sec.append(num_failures / elapsed)
+        # the histogram holds microseconds, while the history is in milliseconds
+        self.response_time_percentile_50.append((response_times.median() or 0) / 1000.0)
+        self.response_time_percentile_95.append((response_times.percentile(0.95) or 0) / 1000.0)
+        self.response_time_percentile_99.append((response_times.percentile(0.99) or 0) / 1000.0)
+        self.user_count.append(user_count)
+
+    def compact(self):
+        """
+        Halve the number of points, by merging every two points into one
+        """
+        for column, typecode in self.COLUMNS:
+            setattr(self, column, array(typecode, _downsample(column, getattr(self, column), 2)))
+
+    def to_dict(self, since=None, max_points=None):
+        """
+        Return the time series as a dict of lists. If *since* is set, only points after that
+        time are included, and if there are more than *max_points* points, adjacent points
+        are merged so that at most *max_points* are returned.
+        """
+        start = 0
+        if since is not None:
+            while start < len(self.time) and self.time[start] <= since:
+                start += 1
+        num_points = len(self.time) - start
+        size = 1
+        if max_points and num_points > max_points:
+            size = -(-num_points // max_points)
+        return dict((column, _downsample(column, getattr(self, column)[start:], size)) for column, typecode in self.COLUMNS)
+
+
+def _downsample(column, values, size):
+    """
+    Merge every *size* values of a TimeSeries column into one. Rates are averaged,
+    percentiles are merged by taking the highest value, and for the time and user count,
+    the last value is used.
+    """
+    if size == 1:
+        return list(values)
+    result = []
+    for i in xrange(0, len(values), size):
+        chunk = values[i:i+size]
+        if column in ("rps", "failures_per_sec"):
+            result.append(sum(chunk) / len(chunk))
+        elif column.startswith("response_time_percentile"):
+            result.append(max(chunk))
+        else:
+            result.append(chunk[-1])
+    return result
+
+
+class StatsHistory(object):
+    """
+    History of the stats of a :py:class:`RequestStats <locust.stats.RequestStats>` instance.
+
+    Every call to record() adds a point to the time series of the total, and of each entry.
+    The memory usage is bounded: history is kept for at most *max_entries* entries, and when
+    the time series are full, they are compacted to half the resolution, and only every
+    other (and later every fourth, etc.) call to record() adds a point.
+    """
+
+    def __init__(self, capacity=HISTORY_CAPACITY, max_entries=HISTORY_MAX_ENTRIES):
+        self.capacity = capacity
+        self.max_entries = max_entries
+        self.total = TimeSeries()
+        self.entries = {}
+        self.stride = 1
+        self._calls = 0
+
+    def record(self, stats, user_count, now=None):
+        self._calls += 1
+        if self._calls % self.stride:
+            return
+        if now is None:
+            now = time.time()
+
+        for key, entry in stats.entries.iteritems():
+            series = self.entries.get(key)
+            if series is None:
+                if len(self.entries) >= self.max_entries:
+                    continue
+                series = self.entries[key] = TimeSeries()
+            series.record(entry, user_count, now)
+        self.total.record(stats.total, user_count, now)
+
+        if len(self.total) >= self.capacity:
+            self.total.compact()
+            for series in self.entries.itervalues():
+                series.compact()
+            self.stride *= 2
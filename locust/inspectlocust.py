@@ -16,18 +16,23 @@ def _print_task_ratio(x, level=0):
             _print_task_ratio(v['tasks'], level + 1)
 
 
-def get_task_ratio_dict(tasks, total=False, parent_ratio=1.0):
+def get_task_ratio_dict(tasks, total=False, parent_ratio=1.0, weights=None):
     """
     Return a dict containing task execution ratio info
+    
+    *tasks* is a list of Locust classes, or of the tasks of a TaskSet, in which case *weights* 
+    should be the TaskSet's task_weights (every task has the weight 1 if it isn't given).
     """
+    if weights is None:
+        weights = [t.weight if hasattr(t, 'weight') else 1 for t in tasks]
     if hasattr(tasks[0], 'weight'):
-        divisor = sum(t.weight for t in tasks)
+        divisor = sum(weights)
     else:
-        divisor = len(tasks) / parent_ratio
+        divisor = sum(weights) / parent_ratio
     ratio = {}
-    for task in tasks:
+    for task, weight in zip(tasks, weights):
         ratio.setdefault(task, 0)
-        ratio[task] += task.weight if hasattr(task, 'weight') else 1
+        ratio[task] += weight
 
     # get percentage
     ratio_percent = dict((k, float(v) / divisor) for k, v in ratio.iteritems())
@@ -37,13 +42,13 @@ def get_task_ratio_dict(tasks, total=False, parent_ratio=1.0):
         d = {"ratio":ratio}
         if inspect.isclass(locust):
             if issubclass(locust, Locust):
-                T = locust.task_set.tasks
+                task_set = locust.task_set
             elif issubclass(locust, TaskSet):
-                T = locust.tasks
+                task_set = locust
             if total:
-                d["tasks"] = get_task_ratio_dict(T, total, ratio)
+                d["tasks"] = get_task_ratio_dict(task_set.tasks, total, ratio, task_set.task_weights)
             else:
-                d["tasks"] = get_task_ratio_dict(T, total)
+                d["tasks"] = get_task_ratio_dict(task_set.tasks, total, weights=task_set.task_weights)
         
         task_dict[locust.__name__] = d
 
@@ -12,7 +12,9 @@ from optparse import OptionParser
 
 import web
 from log import setup_logging, console_logger
-from stats import stats_printer, print_percentile_stats, print_error_report, print_stats
+from stats import MAX_ENTRIES, stats_printer, history_recorder, print_percentile_stats, print_error_report, print_stats, print_listener_profile
+from statswriter import StatsWriter, stats_writer
+from samplelog import start_sample_log
 from inspectlocust import print_task_ratio, get_task_ratio_dict
 from core import Locust, HttpLocust
 from runners import MasterLocustRunner, SlaveLocustRunner, LocalLocustRunner
@@ -144,6 +146,37 @@ def parse_options():
         help="The rate per second in which clients are spawned. Only used together with --no-web"
     )
     
+    # Arrival rate
+    parser.add_option(
+        '--arrival-rate',
+        action='store',
+        type='float',
+        dest='arrival_rate',
+        default=None,
+        help="Start this many locusts per second, that each run a single task, instead of a fixed number of looping locusts. The number of concurrently running locusts is limited to the number of clients (-c)."
+    )
+    
+    # Arrival process
+    parser.add_option(
+        '--arrival-process',
+        action='store',
+        type='choice',
+        choices=['constant', 'poisson'],
+        dest='arrival_process',
+        default='poisson',
+        help="Distribution of the time between the arrivals when --arrival-rate is used: poisson (exponentially distributed, like independent users) or constant. Default is poisson."
+    )
+    
+    # Random seed
+    parser.add_option(
+        '--seed',
+        action='store',
+        type='int',
+        dest='seed',
+        default=None,
+        help="Seed for the random choices of the locusts (tasks, wait times and hatch order), so that a run can be repeated. Each locust gets its own random number generator, derived from the seed, the index of the slave and the index of the locust."
+    )
+    
     # Number of requests
     parser.add_option(
         '-n', '--num-request',
@@ -192,6 +225,82 @@ def parse_options():
        help='Only print the summary stats'
     )
     
+    # write stats of each interval to a file
+    parser.add_option(
+        '--stats-file',
+        action='store',
+        type='str',
+        dest='stats_file',
+        default=None,
+        help="Path to a file that the stats of each interval (per request and total) are appended to. Not used when running with --slave."
+    )
+    
+    parser.add_option(
+        '--stats-file-format',
+        action='store',
+        type='choice',
+        choices=["csv", "jsonl"],
+        dest='stats_file_format',
+        default="csv",
+        help="Format of the stats file, csv or jsonl (one JSON object per line). Defaults to csv."
+    )
+    
+    parser.add_option(
+        '--stats-file-interval',
+        action='store',
+        type='float',
+        dest='stats_file_interval',
+        default=5,
+        help="Number of seconds between each write to the stats file. Defaults to 5."
+    )
+    
+    parser.add_option(
+        '--stats-file-max-bytes',
+        action='store',
+        type='int',
+        dest='stats_file_max_bytes',
+        default=50 * 1024 * 1024,
+        help="Size in bytes at which the stats file is rotated, keeping 5 old files. Set to 0 to disable rotation. Defaults to 50 MB."
+    )
+    
+    # keep response times in a DDSketch
+    parser.add_option(
+        '--response-time-sketch',
+        action='store_true',
+        dest='response_times_sketch',
+        default=False,
+        help="Keep the response time distributions in a DDSketch, with a relative error of at most 1%, instead of a histogram. The sketch is smaller, and faster for the master to merge when running distributed. When running with --master, the setting is sent to the slaves."
+    )
+    
+    # maximum number of stats entries
+    parser.add_option(
+        '--max-stats-entries',
+        action='store',
+        type='int',
+        dest='max_stats_entries',
+        default=MAX_ENTRIES,
+        help="Maximum number of entries (distinct request names and methods) in the statistics. Requests to new names above the limit are logged as \"[other]\". Defaults to %i, and 0 means no limit." % MAX_ENTRIES
+    )
+    
+    # record the time spent in each event listener
+    parser.add_option(
+        '--profile-listeners',
+        action='store_true',
+        dest='profile_listeners',
+        default=False,
+        help="Record the number of calls and the time spent in each event listener. The listeners are shown in the web UI, and printed when locust exits."
+    )
+    
+    # log every request to a binary file
+    parser.add_option(
+        '--sample-log',
+        action='store',
+        type='str',
+        dest='sample_log',
+        default=None,
+        help="Log every request to a binary, memory mapped file. The hostname, process id and .bin are appended to the given path, so that every locust process writes its own file. Not used when running with --master."
+    )
+    
     # List locust commands found in loaded locust files/source files
     parser.add_option(
         '-l', '--list',
@@ -387,6 +496,9 @@ def main():
         console_logger.info(dumps(task_data))
         sys.exit(0)
     
+    if options.profile_listeners:
+        events.set_listener_profiling(True)
+    
     # if --master is set, make sure --no-web isn't set
     if options.master and options.no_web:
         logger.error("Locust can not run distributed with the web interface disabled (do not use --no-web and --master together)")
@@ -417,6 +529,24 @@ def main():
         # spawn stats printing greenlet
         gevent.spawn(stats_printer)
     
+    if not options.slave:
+        # spawn greenlet that records the stats history
+        gevent.spawn(history_recorder)
+    
+    if options.stats_file and not options.slave:
+        # spawn greenlet that appends the stats of each interval to the stats file
+        writer = StatsWriter(runners.locust_runner.stats, options.stats_file, options.stats_file_format, options.stats_file_max_bytes)
+        gevent.spawn(stats_writer, writer, options.stats_file_interval)
+        
+        def on_quitting():
+            writer.write(runners.locust_runner.user_count)
+            writer.close()
+        events.quitting += on_quitting
+    
+    if options.sample_log and not options.master:
+        sample_log = start_sample_log(options.sample_log)
+        logger.info("Logging all requests to %s" % sample_log.path)
+    
     def shutdown(code=0):
         """
         Shut down locust by firing quitting event, printing stats and exiting
@@ -428,6 +558,8 @@ def main():
         print_percentile_stats(runners.locust_runner.request_stats)
 
         print_error_report()
+        if options.profile_listeners:
+            print_listener_profile()
         sys.exit(code)
     
     # install SIGTERM handler
@@ -13,3 +13,29 @@ class Message(object):
     def unserialize(cls, data):
         msg = cls(*msgpack.loads(data))
         return msg
+
+
+def delta_encode(values):
+    """
+    Return a list of the differences between each value in the sorted list *values* and the 
+    value before it (the first value is kept as is). Since msgpack stores small integers in a 
+    single byte, a delta encoded list of e.g. histogram bucket indexes or timestamps is a lot 
+    smaller than the original list.
+    """
+    deltas = []
+    previous = 0
+    for value in values:
+        deltas.append(value - previous)
+        previous = value
+    return deltas
+
+def delta_decode(deltas):
+    """
+    Reverse delta_encode()
+    """
+    values = []
+    value = 0
+    for delta in deltas:
+        value += delta
+        values.append(value)
+    return values
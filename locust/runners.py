@@ -5,14 +5,17 @@ import warnings
 import random
 import logging
 from time import time
+from bisect import bisect_right
 from hashlib import md5
+from itertools import count
 
 import gevent
 from gevent import GreenletExit
 from gevent.pool import Group
 
 import events
-from stats import global_stats
+from clock import monotonic
+from stats import global_stats, MAX_ENTRIES
 
 from rpc import rpc, Message
 
@@ -24,6 +27,23 @@ locust_runner = None
 STATE_INIT, STATE_HATCHING, STATE_RUNNING, STATE_STOPPED = ["ready", "hatching", "running", "stopped"]
 SLAVE_REPORT_INTERVAL = 3.0
 
+MAX_EXCEPTIONS = 1000
+"""
+Maximum number of distinct exceptions (tracebacks) that a runner keeps. When it's reached, 
+the least recently occurred exception is dropped. It's also the maximum number of distinct 
+exceptions that a slave sends in a single report, and the exceptions above it are counted 
+together.
+"""
+
+OTHER_EXCEPTIONS_MSG = "Other exceptions, that a slave couldn't report separately since it had more than MAX_EXCEPTIONS distinct tracebacks in one report"
+""" Message of the exception that a slave counts the exceptions above MAX_EXCEPTIONS in, with an empty traceback """
+
+LATE_ARRIVAL_THRESHOLD = 0.01
+"""
+Number of seconds after its scheduled time that a locust can be started in arrival-rate 
+mode before the arrival is counted as late.
+"""
+
 
 class LocustRunner(object):
     def __init__(self, locust_classes, options):
@@ -32,11 +52,23 @@ class LocustRunner(object):
         self.num_clients = options.num_clients
         self.num_requests = options.num_requests
         self.host = options.host
+        self.arrival_rate = getattr(options, "arrival_rate", None)
+        self.arrival_process = getattr(options, "arrival_process", "poisson")
+        self.seed = getattr(options, "seed", None)
+        self.slave_index = 0
+        self.random = self.new_random("runner")
+        self.user_index = 0
         self.locusts = Group()
         self.state = STATE_INIT
         self.hatching_greenlet = None
+        self.arrival_greenlet = None
         self.exceptions = {}
+        # tells in which order the exceptions last occurred
+        self._exception_order = count()
         self.stats = global_stats
+        self.stats.set_response_times_sketch(getattr(options, "response_times_sketch", False))
+        # 0 turns the limit off
+        self.stats.max_entries = getattr(options, "max_stats_entries", MAX_ENTRIES) or None
         
         # register listener that resets stats when hatching is complete
         def on_hatch_complete(user_count):
@@ -57,6 +89,31 @@ class LocustRunner(object):
     def user_count(self):
         return len(self.locusts)
 
+    def new_random(self, *key):
+        """
+        Return a random.Random that is seeded from the seed of the run, the index of the slave 
+        and *key*, so that it produces the same numbers every time the run is repeated. If no 
+        seed is set, the random module is returned.
+        """
+        if self.seed is None:
+            return random
+        return random.Random(int(md5(repr((self.seed, self.slave_index) + key)).hexdigest(), 16))
+    
+    def start_locust(self, locust, user_index, session=False):
+        """
+        Create and run an instance of the *locust* class, with a random number generator 
+        derived from its *user_index*
+        """
+        try:
+            instance = locust()
+            instance.random = self.new_random("locust", user_index)
+            if session:
+                instance.run_session()
+            else:
+                instance.run()
+        except GreenletExit:
+            pass
+    
     def weight_locusts(self, amount, stop_timeout = None):
         """
         Distributes the amount of locusts for each WebLocust-class according to it's weight
@@ -106,14 +163,10 @@ class LocustRunner(object):
                     events.hatch_complete.fire(user_count=self.num_clients)
                     return
 
-                locust = bucket.pop(random.randint(0, len(bucket)-1))
+                locust = bucket.pop(self.random.randint(0, len(bucket)-1))
                 occurence_count[locust.__name__] += 1
-                def start_locust(_):
-                    try:
-                        locust().run()
-                    except GreenletExit:
-                        pass
-                new_locust = self.locusts.spawn(start_locust, locust)
+                new_locust = self.locusts.spawn(self.start_locust, locust, self.user_index)
+                self.user_index += 1
                 if len(self.locusts) % 10 == 0:
                     logger.debug("%i locusts hatched" % len(self.locusts))
                 gevent.sleep(sleep_time)
@@ -147,7 +200,13 @@ class LocustRunner(object):
             self.stats.clear_all()
             self.stats.start_time = time()
             self.exceptions = {}
+            self.random = self.new_random("runner")
+            self.user_index = 0
             events.locust_start_hatching.fire()
+        
+        if self.arrival_rate:
+            self.start_arrivals(locust_count, wait=wait)
+            return
 
         # Dynamically changing the locust count
         if self.state != STATE_INIT and self.state != STATE_STOPPED:
@@ -172,7 +231,69 @@ class LocustRunner(object):
             else:
                 self.spawn_locusts(wait=wait)
 
+    def start_arrivals(self, max_locusts=None, wait=False):
+        """
+        Start locusts at the rate arrival_rate per second, that each run a single task (see 
+        :py:meth:`Locust.run_session <locust.core.Locust.run_session>`), so that the load 
+        doesn't depend on how fast the system that is tested responds. At most *max_locusts* 
+        (num_clients by default) locusts run at the same time, and arrivals when that many are 
+        running are dropped.
+        
+        If the arrivals have already been started, only the maximum number of locusts is changed.
+        """
+        if max_locusts is not None:
+            self.num_clients = max_locusts
+        if self.num_requests is not None:
+            self.stats.max_requests = self.num_requests
+        
+        if self.arrival_greenlet is None or self.arrival_greenlet.ready():
+            logger.info("Starting locusts at the rate %g/s (%s arrivals), with at most %i running at the same time" % (self.arrival_rate, self.arrival_process, self.num_clients))
+            self.arrival_greenlet = gevent.spawn(self.arrive)
+        # report the maximum number of locusts as the user count, since the locusts haven't 
+        # been started yet
+        events.hatch_complete.fire(user_count=self.num_clients)
+        if wait:
+            self.arrival_greenlet.join()
+            self.locusts.join()
+            logger.info("All locusts dead\n")
+    
+    def arrive(self):
+        locust_classes = [locust for locust in self.locust_classes if locust.task_set]
+        if not locust_classes:
+            logger.warning("None of the Locust classes has a task_set. No locusts will be started.")
+            return
+        cumulative_weights = []
+        total = 0
+        for locust in locust_classes:
+            if self.host is not None:
+                locust.host = self.host
+            total += locust.weight
+            cumulative_weights.append(total)
+        
+        next_arrival = monotonic()
+        while True:
+            if self.stats.max_requests is not None and self.stats.num_requests + self.stats.num_failures >= self.stats.max_requests:
+                return
+            
+            if self.arrival_process == "poisson":
+                next_arrival += self.random.expovariate(self.arrival_rate)
+            else:
+                next_arrival += 1.0 / self.arrival_rate
+            delay = next_arrival - monotonic()
+            if delay > 0:
+                gevent.sleep(delay)
+            
+            if len(self.locusts) >= self.num_clients:
+                self.stats.log_arrival(dropped=True)
+                continue
+            self.stats.log_arrival(late=monotonic() - next_arrival > LATE_ARRIVAL_THRESHOLD)
+            index = bisect_right(cumulative_weights, self.random.random() * total)
+            self.locusts.spawn(self.start_locust, locust_classes[min(index, len(locust_classes) - 1)], self.user_index, session=True)
+            self.user_index += 1
+    
     def stop(self):
+        if self.arrival_greenlet and not self.arrival_greenlet.ready():
+            self.arrival_greenlet.kill(block=True)
         # if we are currently hatching locusts we need to kill the hatching greenlet first
         if self.hatching_greenlet and not self.hatching_greenlet.ready():
             self.hatching_greenlet.kill(block=True)
@@ -180,12 +301,24 @@ class LocustRunner(object):
         self.state = STATE_STOPPED
         events.locust_stop_hatching.fire()
 
-    def log_exception(self, node_id, msg, formatted_tb):
+    def log_exception(self, node_id, msg, formatted_tb, count=1):
+        """
+        Log that an exception with the traceback *formatted_tb* occurred *count* times. 
+        
+        Exceptions are grouped by traceback, and only the message of the first occurrence 
+        is kept. At most MAX_EXCEPTIONS tracebacks are kept, in least recently occurred order, 
+        so that a task that keeps failing in new ways can't use up the memory.
+        """
         key = hash(formatted_tb)
-        row = self.exceptions.setdefault(key, {"count": 0, "msg": msg, "traceback": formatted_tb, "nodes": set()})
-        row["count"] += 1
+        row = self.exceptions.get(key)
+        if row is None:
+            if len(self.exceptions) >= MAX_EXCEPTIONS:
+                # a linear search, but only for a new traceback when there are already too many
+                del self.exceptions[min(self.exceptions, key=lambda k: self.exceptions[k]["order"])]
+            row = self.exceptions[key] = {"count": 0, "msg": msg, "traceback": formatted_tb, "nodes": set()}
+        row["count"] += count
         row["nodes"].add(node_id)
-        self.exceptions[key] = row
+        row["order"] = next(self._exception_order)
 
 class LocalLocustRunner(LocustRunner):
     def __init__(self, locust_classes, options):
@@ -251,6 +384,8 @@ class MasterLocustRunner(DistributedLocustRunner):
                 return
 
             self.clients[client_id].user_count = data["user_count"]
+            for exception in data.get("exceptions", []):
+                self.log_exception(client_id, exception["msg"], exception["traceback"], exception["count"])
         events.slave_report += on_slave_report
         
         # register listener that sends quit message to slave nodes
@@ -281,13 +416,18 @@ class MasterLocustRunner(DistributedLocustRunner):
             self.exceptions = {}
             events.master_start_hatching.fire()
         
-        for client in self.clients.itervalues():
+        for slave_index, client in enumerate(self.clients.itervalues()):
             data = {
                 "hatch_rate":slave_hatch_rate,
                 "num_clients":slave_num_clients,
                 "num_requests": self.num_requests,
                 "host":self.host,
-                "stop_timeout":None
+                "stop_timeout":None,
+                "response_times_sketch":self.stats.response_times_sketch,
+                "arrival_rate":self.arrival_rate and float(self.arrival_rate) / num_slaves,
+                "arrival_process":self.arrival_process,
+                "seed":self.seed,
+                "slave_index":slave_index,
             }
 
             if remaining > 0:
@@ -335,10 +475,13 @@ class MasterLocustRunner(DistributedLocustRunner):
                     count = sum(c.user_count for c in self.clients.itervalues())
                     events.hatch_complete.fire(user_count=count)
             elif msg.type == "quit":
+                self.stats.remove_slave(msg.node_id)
                 if msg.node_id in self.clients:
                     del self.clients[msg.node_id]
                     logger.info("Client %r quit. Currently %i clients connected." % (msg.node_id, len(self.clients.ready)))
             elif msg.type == "exception":
+                # sent by slaves running an older version of locust, newer slaves send 
+                # exceptions in their stats reports
                 self.log_exception(msg.node_id, msg.data["msg"], msg.data["traceback"])
 
     @property
@@ -352,6 +495,8 @@ class SlaveLocustRunner(DistributedLocustRunner):
         
         self.client = rpc.Client(self.master_host, self.master_port)
         self.greenlet = Group()
+        # exceptions that have occurred since the last report, by traceback
+        self.report_exceptions = {}
 
         self.greenlet.spawn(self.worker).link_exception(callback=self.noop)
         self.client.send(Message("client_ready", None, self.client_id))
@@ -362,9 +507,12 @@ class SlaveLocustRunner(DistributedLocustRunner):
             self.client.send(Message("hatch_complete", {"count":user_count}, self.client_id))
         events.hatch_complete += on_hatch_complete
         
-        # register listener that adds the current number of spawned locusts to the report that is sent to the master node 
+        # register listener that adds the current number of spawned locusts, and the exceptions 
+        # since the last report, to the report that is sent to the master node 
         def on_report_to_master(client_id, data):
             data["user_count"] = self.user_count
+            data["exceptions"] = self.report_exceptions.values()
+            self.report_exceptions = {}
         events.report_to_master += on_report_to_master
         
         # register listener that sends quit message to master
@@ -372,10 +520,18 @@ class SlaveLocustRunner(DistributedLocustRunner):
             self.client.send(Message("quit", None, self.client_id))
         events.quitting += on_quitting
 
-        # register listener thats sends locust exceptions to master
+        # register listener that counts locust exceptions, which are sent to the master in the next report
         def on_locust_error(locust_instance, exception, tb):
             formatted_tb = "".join(traceback.format_tb(tb))
-            self.client.send(Message("exception", {"msg" : str(exception), "traceback" : formatted_tb}, self.client_id))
+            row = self.report_exceptions.get(formatted_tb)
+            if row is None and len(self.report_exceptions) >= MAX_EXCEPTIONS:
+                # too many distinct exceptions in this report interval, so it's counted as one of the others
+                row = self.report_exceptions.get("")
+                if row is None:
+                    row = self.report_exceptions[""] = {"msg": OTHER_EXCEPTIONS_MSG, "traceback": "", "count": 0}
+            elif row is None:
+                row = self.report_exceptions[formatted_tb] = {"msg": str(exception), "traceback": formatted_tb, "count": 0}
+            row["count"] += 1
         events.locust_error += on_locust_error
 
     def worker(self):
@@ -388,6 +544,14 @@ class SlaveLocustRunner(DistributedLocustRunner):
                 #self.num_clients = job["num_clients"]
                 self.num_requests = job["num_requests"]
                 self.host = job["host"]
+                self.arrival_rate = job.get("arrival_rate")
+                self.arrival_process = job.get("arrival_process", "poisson")
+                if job.get("seed") is not None:
+                    self.seed = job["seed"]
+                self.slave_index = job.get("slave_index", 0)
+                self.stats.set_response_times_sketch(job.get("response_times_sketch", False))
+                # the master may have cleared its stats, so send the name of each entry again
+                self.stats.report_entry_ids = {}
                 self.hatching_greenlet = gevent.spawn(lambda: self.start_hatching(locust_count=job["num_clients"], hatch_rate=job["hatch_rate"]))
             elif msg.type == "stop":
                 self.stop()
@@ -0,0 +1,204 @@
+import os
+import json
+import mmap
+import time
+import socket
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import events
+
+MAGIC = "LCSTSMPL"
+VERSION = 1
+
+HEADER = struct.Struct("<8sHHQ12x")
+""" magic, version, record size, number of records """
+
+RECORD = struct.Struct("<dIIQBB6x")
+""" timestamp, name id, response time in microseconds, content length, method id, status """
+
+COUNT_OFFSET = 12
+""" Offset of the number of records in the header """
+
+COUNT_UPDATE_INTERVAL = 1024
+"""
+Number of records between each update of the number of records in the header. A reader
+finds the records after that by their non-zero timestamps.
+"""
+
+RECORDS_PER_CHUNK = 65536
+""" Number of records that the file is grown by when it's full """
+
+_pack_record = RECORD.pack_into
+_pack_count = struct.Struct("<Q").pack_into
+
+STATUS_SUCCESS = 0
+STATUS_FAILURE = 1
+
+MAX_RESPONSE_TIME_US = 2**32 - 1
+
+
+class SampleLog(object):
+    """
+    Append-only log of every request, written to a memory mapped file.
+
+    Each request is stored as a fixed width (32 byte) binary record after a 32 byte header, so
+    logging a request is a struct.pack_into() into the mmap. The file is grown in chunks of
+    RECORDS_PER_CHUNK records, and truncated to the number of written records when it's closed.
+    The number of written records is stored in the header (every COUNT_UPDATE_INTERVAL records,
+    and records after that have a non-zero timestamp), so the file can be read while locust is
+    still running, or after it has crashed.
+
+    Request names and methods are stored as ids. The mapping is written to a *<path>.names*
+    file with one JSON object per line, every time a new name or method is seen.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.names = {}
+        self.methods = {}
+        self.count = 0
+        self._names_file = open(path + ".names", "w")
+        self._file = open(path, "w+b")
+        self._capacity = 0
+        self._mmap = None
+        self._grow()
+        HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, RECORD.size, 0)
+
+    def log(self, method, name, response_time, content_length, status):
+        name_id = self.names.get(name)
+        if name_id is None:
+            name_id = self._intern(self.names, "name", name)
+        method_id = self.methods.get(method)
+        if method_id is None:
+            method_id = self._intern(self.methods, "method", method)
+        count = self.count
+        if count == self._capacity:
+            self._grow()
+        response_time_us = int(response_time * 1000)
+        if response_time_us > MAX_RESPONSE_TIME_US:
+            response_time_us = MAX_RESPONSE_TIME_US
+        _pack_record(self._mmap, HEADER.size + count * RECORD.size, time.time(), name_id, response_time_us, content_length or 0, method_id, status)
+        self.count = count + 1
+        if not self.count % COUNT_UPDATE_INTERVAL:
+            _pack_count(self._mmap, COUNT_OFFSET, self.count)
+
+    def on_request_success(self, request_type, name, response_time, response_length):
+        self.log(request_type, name, response_time, response_length, STATUS_SUCCESS)
+
+    def on_request_failure(self, request_type, name, response_time, exception):
+        self.log(request_type, name, response_time, 0, STATUS_FAILURE)
+
+    def _intern(self, ids, kind, value):
+        if kind == "method" and len(ids) > 255:
+            raise ValueError("Too many distinct request methods in sample log")
+        new_id = ids[value] = len(ids)
+        self._names_file.write(json.dumps({"kind": kind, "id": new_id, "value": value}) + "\n")
+        self._names_file.flush()
+        return new_id
+
+    def _grow(self):
+        if self._mmap is not None:
+            _pack_count(self._mmap, COUNT_OFFSET, self.count)
+            self._mmap.close()
+        self._capacity += RECORDS_PER_CHUNK
+        self._file.truncate(HEADER.size + self._capacity * RECORD.size)
+        self._mmap = mmap.mmap(self._file.fileno(), HEADER.size + self._capacity * RECORD.size)
+
+    def close(self):
+        if self._mmap is None:
+            return
+        _pack_count(self._mmap, COUNT_OFFSET, self.count)
+        self._mmap.flush()
+        self._mmap.close()
+        self._mmap = None
+        self._file.truncate(HEADER.size + self.count * RECORD.size)
+        self._file.close()
+        self._names_file.close()
+
+
+def sample_log_path(prefix):
+    """
+    Return the path of the sample log of this process, which is made unique by adding the
+    hostname and process id to *prefix*
+    """
+    return "%s.%s.%i.bin" % (prefix, socket.gethostname(), os.getpid())
+
+
+def start_sample_log(prefix):
+    """
+    Start logging all requests of this process to a sample log, and return the SampleLog
+    """
+    sample_log = SampleLog(sample_log_path(prefix))
+    events.request_success += sample_log.on_request_success
+    events.request_failure += sample_log.on_request_failure
+    events.quitting += sample_log.close
+    return sample_log
+
+
+def read_sample_log(path):
+    """
+    Read a sample log written by SampleLog, and return a dict with the columns
+    *timestamp*, *name*, *method*, *response_time* (in milliseconds), *content_length* and
+    *status*.
+
+    If numpy is installed, the columns are numpy arrays (with name and method as arrays of
+    ids), and "names" and "methods" in the returned dict are lists that the ids index into.
+    Without numpy, the columns are lists with the actual names and methods.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, record_size, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("%s is not a locust sample log" % path)
+    if version != VERSION or record_size != RECORD.size:
+        raise ValueError("Unsupported sample log version %i" % version)
+    # the count in the header is only updated now and then, so look for records after it
+    max_count = (len(data) - HEADER.size) // RECORD.size
+    while count < max_count and struct.unpack_from("<d", data, HEADER.size + count * RECORD.size)[0]:
+        count += 1
+    count = min(count, max_count)
+
+    names, methods = [], []
+    with open(path + ".names") as f:
+        for line in f:
+            item = json.loads(line)
+            ids = names if item["kind"] == "name" else methods
+            ids.extend([None] * (item["id"] + 1 - len(ids)))
+            ids[item["id"]] = item["value"]
+
+    if numpy is not None:
+        records = numpy.frombuffer(data, dtype=numpy.dtype([
+            ("timestamp", "<f8"),
+            ("name", "<u4"),
+            ("response_time", "<u4"),
+            ("content_length", "<u8"),
+            ("method", "u1"),
+            ("status", "u1"),
+            ("padding", "V6"),
+        ]), count=count, offset=HEADER.size)
+        return {
+            "timestamp": records["timestamp"],
+            "name": records["name"],
+            "method": records["method"],
+            "response_time": records["response_time"] / 1000.0,
+            "content_length": records["content_length"],
+            "status": records["status"],
+            "names": names,
+            "methods": methods,
+        }
+
+    columns = dict((column, []) for column in ("timestamp", "name", "method", "response_time", "content_length", "status"))
+    for i in xrange(count):
+        timestamp, name_id, response_time_us, content_length, method_id, status = RECORD.unpack_from(data, HEADER.size + i * RECORD.size)
+        columns["timestamp"].append(timestamp)
+        columns["name"].append(names[name_id])
+        columns["method"].append(methods[method_id])
+        columns["response_time"].append(response_time_us / 1000.0)
+        columns["content_length"].append(content_length)
+        columns["status"].append(status)
+    return columns
@@ -41,7 +41,10 @@ var alternate = false;
 $("ul.tabs").tabs("div.panes > div");
 
 var stats_tpl = $('#stats-template');
+var timings_tpl = $('#timings-template');
 var errors_tpl = $('#errors-template');
+var slaves_tpl = $('#slaves-template');
+var listeners_tpl = $('#listeners-template');
 var exceptions_tpl = $('#exceptions-template');
 
 $('#swarm_form').submit(function(event) {
@@ -105,9 +108,17 @@ $(".stats_label").click(function(event) {
     sortedStats.push(totalRow)
     $('#stats tbody').jqoteapp(stats_tpl, sortedStats);
     alternate = false;
+    $('#timings tbody').empty();
+    $('#timings tbody').jqoteapp(timings_tpl, sortedStats);
+    alternate = false;
     $('#errors tbody').jqoteapp(errors_tpl, (report.errors).sort(sortBy(sortAttribute, desc)));
 });
 
+// response times are in milliseconds, and sub millisecond differences only matter for fast requests
+function formatResponseTime(ms) {
+    return ms < 10 ? Math.round(ms*100)/100 : Math.round(ms);
+}
+
 function updateStats() {
     $.get('/stats/requests', function (data) {
         report = JSON.parse(data);
@@ -116,6 +127,15 @@ function updateStats() {
         $("#fail_ratio").html(Math.round(report.fail_ratio*100));
         $("#status_text").html(report.state);
         $("#userCount").html(report.user_count);
+        if (report.pacing_iterations) {
+            $("#pacing_miss_ratio").html(Math.round(report.pacing_misses/report.pacing_iterations*100));
+            $("#box_pacing").show();
+        }
+        if (report.arrivals) {
+            $("#late_arrivals").html(report.late_arrivals);
+            $("#dropped_arrivals").html(report.dropped_arrivals);
+            $("#box_arrivals").show();
+        }
 
         if (report.slave_count)
             $("#slaveCount").html(report.slave_count)
@@ -130,6 +150,9 @@ function updateStats() {
         sortedStats.push(totalRow)
         $('#stats tbody').jqoteapp(stats_tpl, sortedStats);
         alternate = false;
+        $('#timings tbody').empty();
+        $('#timings tbody').jqoteapp(timings_tpl, sortedStats);
+        alternate = false;
         $('#errors tbody').jqoteapp(errors_tpl, (report.errors).sort(sortBy(sortAttribute, desc)));
         setTimeout(updateStats, 2000);
     });
@@ -143,4 +166,28 @@ function updateExceptions() {
         setTimeout(updateExceptions, 5000);
     });
 }
-updateExceptions();
\ No newline at end of file
+updateExceptions();
+
+function updateSlaves() {
+    $.get('/stats/slaves', function (data) {
+        $('#slaves tbody').empty();
+        alternate = false;
+        $('#slaves tbody').jqoteapp(slaves_tpl, data.slaves);
+        setTimeout(updateSlaves, 2000);
+    });
+}
+if ($("#slaves").length > 0) {
+    updateSlaves();
+}
+
+function updateListeners() {
+    $.get('/events/profile', function (data) {
+        $('#listeners tbody').empty();
+        alternate = false;
+        $('#listeners tbody').jqoteapp(listeners_tpl, data.listeners);
+        setTimeout(updateListeners, 5000);
+    });
+}
+if ($("#listeners").length > 0) {
+    updateListeners();
+}
@@ -1,26 +1,91 @@
 import time
 import gevent
 import hashlib
+import logging
+from array import array
+from itertools import izip
+
+from gevent.local import local
 
 import events
 from exception import StopLocust
+from histogram import Histogram, DDSketch, from_bytes as histogram_from_bytes, layout, new_histogram
+from rpc.protocol import delta_encode, delta_decode
+from history import StatsHistory
 from log import console_logger
 
+logger = logging.getLogger(__name__)
+
 STATS_NAME_WIDTH = 60
 
+RESPONSE_TIMES_SIGNIFICANT_DIGITS = 2
+"""
+Precision of the response time distribution that is used to calculate median and percentile 
+response times. With 2 significant digits, every percentile is correct within 1%.
+"""
+
+RESPONSE_TIMES_RELATIVE_ACCURACY = 0.01
+"""
+Relative accuracy of the response time distribution when it's kept in a DDSketch 
+(see RequestStats.response_times_sketch).
+"""
+
+RPS_WINDOW = 20
+""" Number of seconds for which each StatsEntry keeps its number of requests per second """
+
+MAX_ENTRIES = 10000
+"""
+Default maximum number of entries (distinct request names and methods) in the statistics, 
+so that a locustfile that requests many unique URLs can't use up the memory of the master
+"""
+
+OTHER_ENTRY_NAME = "[other]"
+""" Name of the entry that requests are logged to when RequestStats.max_entries is reached """
+
+ERROR_KEY_CACHE_SIZE = 1000
+""" Maximum number of distinct errors for which StatsError.create_key caches the key """
+
+HISTORY_INTERVAL = 2
+""" Number of seconds between each point that is added to the stats history """
+
+TIMING_PHASES = ("dns", "connect", "tls", "ttfb", "body")
+""" Phases of a request that StatsEntry.timings can contain (see events.request_timings) """
+
 class RequestStatsAdditionError(Exception):
     pass
 
 
 class RequestStats(object):
+    response_times_sketch = False
+    """
+    If True, the response time distributions are kept in a :py:class:`DDSketch <locust.histogram.DDSketch>` 
+    instead of a Histogram. The sketch has fewer buckets, and slaves send it to the master 
+    in a compact binary format that can be merged without being decoded value by value.
+    """
+    
     def __init__(self):
         self.entries = {}
         self.errors = {}
         self.num_requests = 0
         self.num_failures = 0
         self.max_requests = None
+        self.max_entries = MAX_ENTRIES
+        self.entries_overflowed = False
         self.last_request_timestamp = None
         self.start_time = None
+        self.total = StatsEntry(self, "Total", None)
+        self.history = StatsHistory()
+        # ids of the entries in the reports that a slave sends to the master
+        self.report_entry_ids = {}
+        # the (name, method) of each entry id, for each slave, on the master
+        self.slave_entry_names = {}
+        # the total of the stats reported by each slave, on the master
+        self.slave_totals = {}
+        self.pacing_iterations = 0
+        self.pacing_misses = 0
+        self.arrivals = 0
+        self.late_arrivals = 0
+        self.dropped_arrivals = 0
     
     def get(self, name, method):
         """
@@ -28,19 +93,44 @@ class RequestStats(object):
         """
         entry = self.entries.get((name, method))
         if not entry:
+            if self.max_entries is not None and len(self.entries) >= self.max_entries and name != OTHER_ENTRY_NAME:
+                # too many entries, which usually means that requests to URLs with e.g. ids in 
+                # them are made without the name argument, so we log them to a single entry
+                if not self.entries_overflowed:
+                    logger.warning("Number of stats entries reached the limit of %i. Requests to new names are logged as \"%s\". Use the name argument (or HttpLocust.url_name_rules) to group requests." % (self.max_entries, OTHER_ENTRY_NAME))
+                    self.entries_overflowed = True
+                return self.get(OTHER_ENTRY_NAME, method)
             entry = StatsEntry(self, name, method)
             self.entries[(name, method)] = entry
         return entry
     
+    def set_response_times_sketch(self, enabled):
+        """
+        Switch between keeping the response time distributions in Histograms and DDSketches. 
+        All stats are cleared if the setting is changed.
+        """
+        if enabled != self.response_times_sketch:
+            self.response_times_sketch = enabled
+            self.clear_all()
+    
+    def new_response_times(self):
+        """
+        Return an empty response time distribution
+        """
+        if self.response_times_sketch:
+            return DDSketch(RESPONSE_TIMES_RELATIVE_ACCURACY)
+        return Histogram(RESPONSE_TIMES_SIGNIFICANT_DIGITS)
+    
     def aggregated_stats(self, name="Total", full_request_history=False):
         """
         Returns a StatsEntry which is an aggregate of all stats entries 
         within entries.
+        
+        This is the *total* entry, which is updated whenever a request is logged 
+        to any of the entries, so it doesn't need to be computed. The arguments are 
+        only kept for backwards compatibility.
         """
-        total = StatsEntry(self, name, method=None)
-        for r in self.entries.itervalues():
-            total.extend(r, full_request_history=full_request_history)
-        return total
+        return self.total
     
     def reset_all(self):
         """
@@ -51,6 +141,14 @@ class RequestStats(object):
         self.num_failures = 0
         for r in self.entries.itervalues():
             r.reset()
+        self.total.reset()
+        for r in self.slave_totals.itervalues():
+            r.reset()
+        self.pacing_iterations = 0
+        self.pacing_misses = 0
+        self.arrivals = 0
+        self.late_arrivals = 0
+        self.dropped_arrivals = 0
     
     def clear_all(self):
         """
@@ -61,94 +159,167 @@ class RequestStats(object):
         self.entries = {}
         self.errors = {}
         self.max_requests = None
+        self.entries_overflowed = False
         self.last_request_timestamp = None
         self.start_time = None
-        
-
-class StatsEntry(object):
-    """
-    Represents a single stats entry (name and method)
-    """
-    
-    name = None
-    """ Name (URL) of this stats entry """
-    
-    method = None
-    """ Method (GET, POST, PUT, etc.) """
+        self.total = StatsEntry(self, "Total", None)
+        self.history = StatsHistory()
+        self.report_entry_ids = {}
+        self.slave_entry_names = {}
+        self.slave_totals = {}
+        self.pacing_iterations = 0
+        self.pacing_misses = 0
+        self.arrivals = 0
+        self.late_arrivals = 0
+        self.dropped_arrivals = 0
     
-    num_requests = None
-    """ The number of requests made """
-    
-    num_failures = None
-    """ Number of failed request """
-    
-    total_response_time = None
-    """ Total sum of the response times """
+    def log_pacing(self, missed):
+        """
+        Count a task executed by a locust with :py:attr:`pacing <locust.core.Locust.pacing>`, 
+        and whether it took longer than the pacing interval, so that the next task was late
+        """
+        self.pacing_iterations += 1
+        if missed:
+            self.pacing_misses += 1
     
-    min_response_time = None
-    """ Minimum response time """
+    def log_arrival(self, late=False, dropped=False):
+        """
+        Count an arrival in arrival-rate mode, and whether its locust was started late, or 
+        not started at all because the maximum number of concurrent locusts was reached
+        """
+        self.arrivals += 1
+        if late:
+            self.late_arrivals += 1
+        if dropped:
+            self.dropped_arrivals += 1
     
-    max_response_time = None
-    """ Maximum response time """
+    @property
+    def pacing_miss_ratio(self):
+        if not self.pacing_iterations:
+            return 0.0
+        return self.pacing_misses / float(self.pacing_iterations)
     
-    num_reqs_per_sec = None
-    """ A {second => request_count} dict that holds the number of requests made per second """
+    def get_slave_total(self, client_id):
+        """
+        Retrieve the StatsEntry that holds the total of the stats reported by a slave. 
+        
+        Only the total is kept for each slave (and not an entry per name and method), so 
+        that the memory used on the master grows with the number of slaves, but not with 
+        the number of slaves times the number of entries.
+        """
+        entry = self.slave_totals.get(client_id)
+        if entry is None:
+            entry = self.slave_totals[client_id] = StatsEntry(self, client_id, None)
+        return entry
     
-    response_times = None
+    def remove_slave(self, client_id):
+        """
+        Forget the entry names and stats total of a slave that has quit
+        """
+        self.slave_entry_names.pop(client_id, None)
+        self.slave_totals.pop(client_id, None)
+        
+
+class StatsEntry(object):
     """
-    A {response_time => count} dict that holds the response time distribution of all
-    the requests.
+    Represents a single stats entry (name and method)
     
-    The keys (the response time in ms) are rounded to store 1, 2, ... 9, 10, 20. .. 90, 
-    100, 200 .. 900, 1000, 2000 ... 9000, in order to save memory.
+    Since a master node may hold a very large number of entries (one for every URL if the 
+    name argument isn't used), this class uses __slots__, and keeps its distributions in 
+    arrays. It has the following attributes:
     
-    This dict is used to calculate the median and percentile response times.
+    * *name*: Name (URL) of this stats entry
+    * *method*: Method (GET, POST, PUT, etc.)
+    * *num_requests*: The number of requests made
+    * *num_failures*: Number of failed request
+    * *total_response_time*: Total sum of the response times
+    * *min_response_time*: Minimum response time
+    * *max_response_time*: Maximum response time
+    * *num_reqs_per_sec*: A :py:class:`PerSecondCounter <locust.stats.PerSecondCounter>` that 
+      holds the number of requests made per second, for the last RPS_WINDOW seconds
+    * *response_times*: A :py:class:`Histogram <locust.histogram.Histogram>` that holds the 
+      response time distribution of all the requests, and is used to calculate the median 
+      and percentile response times. Unlike the other response times, which are in 
+      milliseconds, it holds microseconds. To save memory, the values are counted with a 
+      fixed relative precision (see RESPONSE_TIMES_SIGNIFICANT_DIGITS). If 
+      RequestStats.response_times_sketch is set, it's a 
+      :py:class:`DDSketch <locust.histogram.DDSketch>` instead.
+    * *total_content_length*: The sum of the content length of all the requests for this entry
+    * *start_time*: Time of the first request for this entry
+    * *last_request_timestamp*: Time of the last request for this entry
+    * *resets*: Number of times the entry has been reset, so that it can be told whether 
+      the stats are still the same ones as at some earlier point
     """
     
-    total_content_length = None
-    """ The sum of the content length of all the requests for this entry """
-    
-    start_time = None
-    """ Time of the first request for this entry """
-    
-    last_request_timestamp = None
-    """ Time of the last request for this entry """
+    __slots__ = (
+        "stats",
+        "name",
+        "method",
+        "num_requests",
+        "num_failures",
+        "total_response_time",
+        "min_response_time",
+        "max_response_time",
+        "num_reqs_per_sec",
+        "response_times",
+        "corrected_response_times",
+        "timings",
+        "total_content_length",
+        "start_time",
+        "last_request_timestamp",
+        "resets",
+    )
     
     def __init__(self, stats, name, method):
         self.stats = stats
         self.name = name
         self.method = method
+        self.resets = -1
         self.reset()
     
     def reset(self):
+        self.resets += 1
         self.start_time = time.time()
         self.num_requests = 0
         self.num_failures = 0
         self.total_response_time = 0
-        self.response_times = {}
+        if self.stats is not None:
+            self.response_times = self.stats.new_response_times()
+        else:
+            self.response_times = Histogram(RESPONSE_TIMES_SIGNIFICANT_DIGITS)
+        self.corrected_response_times = None
+        self.timings = None
         self.min_response_time = None
         self.max_response_time = 0
         self.last_request_timestamp = int(time.time())
-        self.num_reqs_per_sec = {}
+        self.num_reqs_per_sec = PerSecondCounter(RPS_WINDOW)
         self.total_content_length = 0
     
     def log(self, response_time, content_length):
         self.stats.num_requests += 1
+        t = int(time.time())
+        self.stats.last_request_timestamp = t
+        expected_interval = request_context.expected_interval
+        
+        # log the request both to this entry and to the total entry, so that the 
+        # total stats never have to be aggregated from all the entries
+        self._log_request(t, response_time, content_length, expected_interval)
+        self.stats.total._log_request(t, response_time, content_length, expected_interval)
+
+    def _log_request(self, t, response_time, content_length, expected_interval=None):
         self.num_requests += 1
 
-        self._log_time_of_request()
-        self._log_response_time(response_time)
+        self._log_time_of_request(t)
+        self._log_response_time(response_time, expected_interval)
 
         # increase total content-length
         self.total_content_length += content_length
 
-    def _log_time_of_request(self):
-        t = int(time.time())
-        self.num_reqs_per_sec[t] = self.num_reqs_per_sec.setdefault(t, 0) + 1
+    def _log_time_of_request(self, t):
+        self.num_reqs_per_sec.add(t)
         self.last_request_timestamp = t
-        self.stats.last_request_timestamp = t
 
-    def _log_response_time(self, response_time):
+    def _log_response_time(self, response_time, expected_interval=None):
         self.total_response_time += response_time
 
         if self.min_response_time is None:
@@ -157,25 +328,43 @@ class StatsEntry(object):
         self.min_response_time = min(self.min_response_time, response_time)
         self.max_response_time = max(self.max_response_time, response_time)
 
-        # to avoid to much data that has to be transfered to the master node when
-        # running in distributed mode, we save the response time rounded in a dict
-        # so that 147 becomes 150, 3432 becomes 3400 and 58760 becomes 59000
-        if response_time < 100:
-            rounded_response_time = response_time
-        elif response_time < 1000:
-            rounded_response_time = int(round(response_time, -1))
-        elif response_time < 10000:
-            rounded_response_time = int(round(response_time, -2))
-        else:
-            rounded_response_time = int(round(response_time, -3))
+        # the response time distribution is kept in microseconds
+        self.response_times.record(response_time * 1000)
+
+        corrected = self.corrected_response_times
+        if expected_interval and corrected is None:
+            # the corrected distribution starts out with the requests that were logged before 
+            # the first request from a locust with an expected interval
+            corrected = self.corrected_response_times = self.response_times.copy()
+        elif corrected is not None:
+            corrected.record(response_time * 1000)
+        if expected_interval:
+            # back-fill the requests that the locust would have made while it was waiting for 
+            # this response, had it not been stalled, the same way HdrHistogram's 
+            # recordValueWithExpectedInterval does
+            interval = expected_interval * 1000
+            corrected.record_sequence(response_time * 1000 - interval, interval, interval)
+
+    def log_timings(self, timings):
+        """
+        Log the *timings* of the phases of a request, a dict of phase -> milliseconds 
+        """
+        self._log_timings(timings)
+        self.stats.total._log_timings(timings)
 
-        # increase request count for the rounded key in response time dict
-        self.response_times.setdefault(rounded_response_time, 0)
-        self.response_times[rounded_response_time] += 1
+    def _log_timings(self, timings):
+        if self.timings is None:
+            self.timings = {}
+        for phase, value in timings.iteritems():
+            histogram = self.timings.get(phase)
+            if histogram is None:
+                histogram = self.timings[phase] = self.stats.new_response_times()
+            histogram.record(value * 1000)
 
     def log_error(self, error):
         self.num_failures += 1
         self.stats.num_failures += 1
+        self.stats.total.num_failures += 1
         key = StatsError.create_key(self.method, self.name, error)
         entry = self.stats.errors.get(key)
         if not entry:
@@ -206,7 +395,11 @@ class StatsEntry(object):
         if not self.response_times:
             return 0
 
-        return median_from_dict(self.num_requests, self.response_times)
+        return self.response_times.median() / 1000.0
+
+    @property
+    def has_corrected_response_times(self):
+        return self.corrected_response_times is not None
 
     @property
     def current_rps(self):
@@ -214,7 +407,8 @@ class StatsEntry(object):
             return 0
         slice_start_time = max(self.stats.last_request_timestamp - 12, int(self.stats.start_time or 0))
 
-        reqs = [self.num_reqs_per_sec.get(t, 0) for t in range(slice_start_time, self.stats.last_request_timestamp-2)]
+        num_reqs_per_sec = self.num_reqs_per_sec
+        reqs = [num_reqs_per_sec.get(t) for t in xrange(slice_start_time, self.stats.last_request_timestamp-2)]
         return avg(reqs)
 
     @property
@@ -236,11 +430,12 @@ class StatsEntry(object):
         Extend the data fro the current StatsEntry with the stats from another
         StatsEntry instance. 
         
-        If full_request_history is False, we'll only care to add the data from 
-        the last 20 seconds of other's stats. The reason for this argument is that 
+        If full_request_history is False, we'll skip adding the response time 
+        distribution of other's stats. The reason for this argument is that 
         extend can be used to generate an aggregate of multiple different StatsEntry 
         instances on the fly, in order to get the *total* current RPS, average 
-        response time, etc.
+        response time, etc. The number of requests per second is always added, but 
+        only the last RPS_WINDOW seconds are kept.
         """
         self.last_request_timestamp = max(self.last_request_timestamp, other.last_request_timestamp)
         self.start_time = min(self.start_time, other.start_time)
@@ -253,18 +448,26 @@ class StatsEntry(object):
         self.total_content_length = self.total_content_length + other.total_content_length
 
         if full_request_history:
-            for key in other.response_times:
-                self.response_times[key] = self.response_times.get(key, 0) + other.response_times[key]
-            for key in other.num_reqs_per_sec:
-                self.num_reqs_per_sec[key] = self.num_reqs_per_sec.get(key, 0) +  other.num_reqs_per_sec[key]
-        else:
-            # still add the number of reqs per seconds the last 20 seconds
-            for i in xrange(other.last_request_timestamp-20, other.last_request_timestamp+1):
-                if i in other.num_reqs_per_sec:
-                    self.num_reqs_per_sec[i] = self.num_reqs_per_sec.get(i, 0) + other.num_reqs_per_sec[i]
+            if other.corrected_response_times is not None or self.corrected_response_times is not None:
+                if self.corrected_response_times is None:
+                    self.corrected_response_times = self.response_times.copy()
+                if other.corrected_response_times is not None:
+                    self.corrected_response_times.merge(other.corrected_response_times)
+                else:
+                    self.corrected_response_times.merge(other.response_times)
+            self.response_times.merge(other.response_times)
+            if other.timings:
+                if self.timings is None:
+                    self.timings = {}
+                for phase, histogram in other.timings.iteritems():
+                    if phase in self.timings:
+                        self.timings[phase].merge(histogram)
+                    else:
+                        self.timings[phase] = histogram.copy()
+        self.num_reqs_per_sec.merge(other.num_reqs_per_sec)
     
     def serialize(self):
-        return {
+        data = {
             "name": self.name,
             "method": self.method,
             "last_request_timestamp": self.last_request_timestamp,
@@ -275,9 +478,15 @@ class StatsEntry(object):
             "max_response_time": self.max_response_time,
             "min_response_time": self.min_response_time,
             "total_content_length": self.total_content_length,
-            "response_times": self.response_times,
-            "num_reqs_per_sec": self.num_reqs_per_sec,
+            "response_times": self.response_times.to_bytes() if isinstance(self.response_times, DDSketch) else self.response_times.to_dict(),
+            "response_times_unit": "us",
+            "num_reqs_per_sec": self.num_reqs_per_sec.to_dict(),
         }
+        if self.corrected_response_times is not None:
+            data["corrected_response_times"] = self.corrected_response_times.to_bytes()
+        if self.timings:
+            data["timings"] = dict((phase, histogram.to_bytes()) for phase, histogram in self.timings.iteritems())
+        return data
     
     @classmethod
     def unserialize(cls, data):
@@ -291,10 +500,92 @@ class StatsEntry(object):
             "max_response_time",
             "min_response_time",
             "total_content_length",
-            "response_times",
-            "num_reqs_per_sec",
         ]:
             setattr(obj, key, data[key])
+        if isinstance(data["response_times"], dict):
+            response_times = data["response_times"]
+            if data.get("response_times_unit") != "us":
+                # sent by an older version of locust, which counts response times in milliseconds
+                response_times = dict((value * 1000, count) for value, count in response_times.iteritems())
+            obj.response_times = Histogram.from_dict(response_times, RESPONSE_TIMES_SIGNIFICANT_DIGITS)
+        else:
+            obj.response_times = histogram_from_bytes(data["response_times"])
+        if data.get("corrected_response_times") is not None:
+            obj.corrected_response_times = histogram_from_bytes(data["corrected_response_times"])
+        if data.get("timings"):
+            obj.timings = dict((phase, histogram_from_bytes(value)) for phase, value in data["timings"].iteritems())
+        obj.num_reqs_per_sec = PerSecondCounter.from_dict(data["num_reqs_per_sec"], RPS_WINDOW)
+        return obj
+    
+    def compact_report(self, entry_id):
+        """
+        Return the stats of this entry as a list, which is what slaves send to the master. 
+        
+        Instead of the name and method, the entry is identified by *entry_id*, and the 
+        response times and requests per second are sent as lists of the non empty buckets 
+        and seconds, where the bucket indexes and seconds are delta encoded. The response 
+        times corrected for coordinated omission and the timings of the request phases are 
+        only appended when there are any.
+        """
+        indexes, counts = self.response_times.buckets()
+        seconds, reqs_per_sec = [], []
+        for second, count in self.num_reqs_per_sec:
+            seconds.append(second)
+            reqs_per_sec.append(count)
+        report = [
+            entry_id,
+            self.num_requests,
+            self.num_failures,
+            self.total_response_time,
+            self.min_response_time,
+            self.max_response_time,
+            self.total_content_length,
+            self.start_time,
+            self.last_request_timestamp,
+            delta_encode(seconds),
+            reqs_per_sec,
+            delta_encode(indexes),
+            counts,
+            getattr(self.response_times, "zero_count", 0),
+        ]
+        if self.corrected_response_times is not None or self.timings:
+            report.append(_compact_histogram(self.corrected_response_times) if self.corrected_response_times is not None else None)
+            report.append(dict((phase, _compact_histogram(histogram)) for phase, histogram in self.timings.iteritems()) if self.timings else None)
+        return report
+    
+    @classmethod
+    def from_compact_report(cls, data, name, method, response_times_layout):
+        """
+        Create a StatsEntry from a list returned by compact_report(). *response_times_layout* 
+        is the :py:func:`layout <locust.histogram.layout>` of the response times histogram.
+        """
+        obj = cls(None, name, method)
+        (
+            entry_id,
+            obj.num_requests,
+            obj.num_failures,
+            obj.total_response_time,
+            obj.min_response_time,
+            obj.max_response_time,
+            obj.total_content_length,
+            obj.start_time,
+            obj.last_request_timestamp,
+            seconds,
+            reqs_per_sec,
+            indexes,
+            counts,
+            zero_count,
+        ) = data[:14]
+        obj.response_times = new_histogram(*response_times_layout)
+        obj.response_times.add_buckets(delta_decode(indexes), counts, zero_count)
+        if len(data) > 14:
+            corrected, timings = data[14:16]
+            if corrected is not None:
+                obj.corrected_response_times = _histogram_from_compact(corrected, response_times_layout)
+            if timings:
+                obj.timings = dict((phase, _histogram_from_compact(value, response_times_layout)) for phase, value in timings.iteritems())
+        for second, count in izip(delta_decode(seconds), reqs_per_sec):
+            obj.num_reqs_per_sec.add(second, count)
         return obj
     
     def get_stripped_report(self):
@@ -322,40 +613,125 @@ class StatsEntry(object):
             self.current_rps or 0
         )
     
-    def get_response_time_percentile(self, percent):
+    def get_response_time_percentile(self, percent, corrected=False):
         """
         Get the response time that a certain number of percent of the requests
         finished within.
         
         Percent specified in range: 0.0 - 1.0
+        
+        If *corrected* is True, the percentile is calculated from the response times that 
+        are corrected for coordinated omission (see :py:attr:`Locust.expected_interval 
+        <locust.core.Locust.expected_interval>`), or from the raw response times if no 
+        request was corrected.
         """
-        num_of_request = int((self.num_requests * percent))
+        response_times = self.response_times
+        if corrected and self.corrected_response_times is not None:
+            response_times = self.corrected_response_times
+        value = response_times.percentile(percent)
+        if value is None:
+            return None
+        return value / 1000.0
 
-        processed_count = 0
-        for response_time in sorted(self.response_times.iterkeys(), reverse=True):
-            processed_count += self.response_times[response_time]
-            if((self.num_requests - processed_count) <= num_of_request):
-                return response_time
+    def get_timing_percentile(self, phase, percent):
+        """
+        Get the time, in milliseconds, that a certain number of percent of the requests 
+        finished the *phase* (see TIMING_PHASES) within, or None if no request was timed.
+        """
+        if not self.timings or phase not in self.timings:
+            return None
+        value = self.timings[phase].percentile(percent)
+        if value is None:
+            return None
+        return value / 1000.0
 
-    def percentile(self, tpl=" %-" + str(STATS_NAME_WIDTH) + "s %8d %6d %6d %6d %6d %6d %6d %6d %6d %6d"):
+    def percentile(self, tpl=" %-" + str(STATS_NAME_WIDTH) + "s %8d %6d %6d %6d %6d %6d %6d %6d %6d %6d", corrected=False):
         if not self.num_requests:
             raise ValueError("Can't calculate percentile on url with no successful requests")
         
         return tpl % (
             str(self.method) + " " + self.name,
             self.num_requests,
-            self.get_response_time_percentile(0.5),
-            self.get_response_time_percentile(0.66),
-            self.get_response_time_percentile(0.75),
-            self.get_response_time_percentile(0.80),
-            self.get_response_time_percentile(0.90),
-            self.get_response_time_percentile(0.95),
-            self.get_response_time_percentile(0.98),
-            self.get_response_time_percentile(0.99),
+            self.get_response_time_percentile(0.5, corrected),
+            self.get_response_time_percentile(0.66, corrected),
+            self.get_response_time_percentile(0.75, corrected),
+            self.get_response_time_percentile(0.80, corrected),
+            self.get_response_time_percentile(0.90, corrected),
+            self.get_response_time_percentile(0.95, corrected),
+            self.get_response_time_percentile(0.98, corrected),
+            self.get_response_time_percentile(0.99, corrected),
             self.max_response_time
         )
 
+class PerSecondCounter(object):
+    """
+    Counter that keeps track of the number of events for each of the last *size* seconds.
+    
+    The counts are stored in a circular buffer indexed by the second (unix timestamp) modulo 
+    *size*, which means that the memory usage is constant. When a later second than *last* 
+    is added, the slots for the seconds in between are cleared, so counts that are older 
+    than *size* seconds get overwritten as time goes on.
+    """
+    
+    __slots__ = ("size", "last", "counts")
+    
+    def __init__(self, size=RPS_WINDOW):
+        self.size = size
+        self.last = 0
+        self.counts = array("I", [0]) * size
+    
+    def add(self, second, count=1):
+        if second > self.last:
+            self._advance(second)
+        elif second <= self.last - self.size:
+            # the second is older than the window, so we drop it
+            return
+        self.counts[second % self.size] += count
+    
+    def _advance(self, second):
+        counts = self.counts
+        size = self.size
+        if second - self.last >= size:
+            counts[:] = array("I", [0]) * size
+        else:
+            for t in xrange(self.last + 1, second + 1):
+                counts[t % size] = 0
+        self.last = second
+    
+    def get(self, second):
+        if self.last - self.size < second <= self.last:
+            return self.counts[second % self.size]
+        return 0
+    
+    def merge(self, other):
+        for second, count in other:
+            self.add(second, count)
+    
+    def __iter__(self):
+        """
+        Iterate over (second, count) tuples for all seconds that has a count
+        """
+        for second in xrange(self.last - self.size + 1, self.last + 1):
+            count = self.counts[second % self.size]
+            if count:
+                yield second, count
+    
+    def to_dict(self):
+        return dict(self)
+    
+    @classmethod
+    def from_dict(cls, data, size=RPS_WINDOW):
+        counter = cls(size)
+        for second, count in data.iteritems():
+            counter.add(second, count)
+        return counter
+
+
 class StatsError(object):
+    __slots__ = ("method", "name", "error", "occurences")
+    
+    _key_cache = {}
+    
     def __init__(self, method, name, error, occurences=0):
         self.method = method
         self.name = name
@@ -364,8 +740,23 @@ class StatsError(object):
 
     @classmethod
     def create_key(cls, method, name, error):
-        key = "%s.%s.%r" % (method, name, error)
-        return hashlib.md5(key).hexdigest()
+        """
+        Return the key (an md5 hex digest) that identifies an error. It's also used as key 
+        for the errors in the reports that are sent to the master node.
+        
+        Since this is called for every failed request, the keys are cached on the method, 
+        name and repr of the error (which is what the md5 is calculated from), so that the 
+        md5 only has to be calculated once for each distinct error.
+        """
+        error_repr = repr(error)
+        cache_key = (method, name, error_repr)
+        key = cls._key_cache.get(cache_key)
+        if key is None:
+            if len(cls._key_cache) >= ERROR_KEY_CACHE_SIZE:
+                cls._key_cache.clear()
+            key = hashlib.md5("%s.%s.%s" % (method, name, error_repr)).hexdigest()
+            cls._key_cache[cache_key] = key
+        return key
 
     def occured(self):
         self.occurences += 1
@@ -392,6 +783,16 @@ class StatsError(object):
         )
 
 
+def _compact_histogram(histogram):
+    indexes, counts = histogram.buckets()
+    return [delta_encode(indexes), counts, getattr(histogram, "zero_count", 0)]
+
+def _histogram_from_compact(data, histogram_layout):
+    indexes, counts, zero_count = data
+    histogram = new_histogram(*histogram_layout)
+    histogram.add_buckets(delta_decode(indexes), counts, zero_count)
+    return histogram
+
 def avg(values):
     return sum(values, 0.0) / max(len(values), 1)
 
@@ -412,38 +813,131 @@ global_stats = RequestStats()
 A global instance for holding the statistics. Should be removed eventually.
 """
 
+class RequestContext(local):
+    """
+    Greenlet local state of the locust that is making requests
+    """
+    
+    expected_interval = None
+    """
+    Expected interval, in milliseconds, between the requests of the current locust, which is 
+    used to correct the response times for coordinated omission. See 
+    :py:attr:`Locust.expected_interval <locust.core.Locust.expected_interval>`.
+    """
+
+request_context = RequestContext()
+
 def on_request_success(request_type, name, response_time, response_length):
     if global_stats.max_requests is not None and (global_stats.num_requests + global_stats.num_failures) >= global_stats.max_requests:
         raise StopLocust("Maximum number of requests reached")
     global_stats.get(name, request_type).log(response_time, response_length)
 
+def on_request_success_batch(requests):
+    """
+    Log a batch of successful requests (see :py:meth:`EventHook.fire_batch 
+    <locust.events.EventHook.fire_batch>`) in a single pass
+    """
+    if global_stats.max_requests is not None and (global_stats.num_requests + global_stats.num_failures) >= global_stats.max_requests:
+        raise StopLocust("Maximum number of requests reached")
+    t = int(time.time())
+    expected_interval = request_context.expected_interval
+    total = global_stats.total
+    get = global_stats.get
+    count = 0
+    for request_type, name, response_time, response_length in requests:
+        get(name, request_type)._log_request(t, response_time, response_length, expected_interval)
+        total._log_request(t, response_time, response_length, expected_interval)
+        count += 1
+    global_stats.num_requests += count
+    global_stats.last_request_timestamp = t
+
+on_request_success.batch_handler = on_request_success_batch
+
+def on_request_timings(request_type, name, timings):
+    global_stats.get(name, request_type).log_timings(timings)
+
 def on_request_failure(request_type, name, response_time, exception):
     if global_stats.max_requests is not None and (global_stats.num_requests + global_stats.num_failures) >= global_stats.max_requests:
         raise StopLocust("Maximum number of requests reached")
     global_stats.get(name, request_type).log_error(exception)
 
+def on_request_failure_batch(requests):
+    if global_stats.max_requests is not None and (global_stats.num_requests + global_stats.num_failures) >= global_stats.max_requests:
+        raise StopLocust("Maximum number of requests reached")
+    get = global_stats.get
+    for request_type, name, response_time, exception in requests:
+        get(name, request_type).log_error(exception)
+
+on_request_failure.batch_handler = on_request_failure_batch
+
 def on_report_to_master(client_id, data):
-    data["stats"] = [global_stats.entries[key].get_stripped_report() for key in global_stats.entries.iterkeys() if not (global_stats.entries[key].num_requests == 0 and global_stats.entries[key].num_failures == 0)]
+    entry_ids = global_stats.report_entry_ids
+    entries = []
+    entry_names = {}
+    for key, entry in global_stats.entries.iteritems():
+        if entry.num_requests == 0 and entry.num_failures == 0:
+            continue
+        entry_id = entry_ids.get(key)
+        if entry_id is None:
+            # the name and method of an entry is only sent in the first report it's in
+            entry_id = entry_ids[key] = len(entry_ids)
+            entry_names[entry_id] = key
+        entries.append(entry.compact_report(entry_id))
+        entry.reset()
+    data["entries"] = entries
+    data["entry_names"] = entry_names
+    data["response_times_layout"] = layout(global_stats.total.response_times)
     data["errors"] =  dict([(k, e.to_dict()) for k, e in global_stats.errors.iteritems()])
+    data["pacing"] = [global_stats.pacing_iterations, global_stats.pacing_misses]
+    data["arrivals"] = [global_stats.arrivals, global_stats.late_arrivals, global_stats.dropped_arrivals]
     global_stats.errors = {}
+    global_stats.total.reset()
+    global_stats.pacing_iterations = 0
+    global_stats.pacing_misses = 0
+    global_stats.arrivals = 0
+    global_stats.late_arrivals = 0
+    global_stats.dropped_arrivals = 0
 
 def on_slave_report(client_id, data):
-    for stats_data in data["stats"]:
-        entry = StatsEntry.unserialize(stats_data)
-        request_key = (entry.name, entry.method)
-        if not request_key in global_stats.entries:
-            global_stats.entries[request_key] = StatsEntry(global_stats, entry.name, entry.method)
-        global_stats.entries[request_key].extend(entry, full_request_history=True)
-        global_stats.last_request_timestamp = max(global_stats.last_request_timestamp, entry.last_request_timestamp)
+    if "entries" in data:
+        entry_names = global_stats.slave_entry_names.setdefault(client_id, {})
+        for entry_id, key in data["entry_names"].iteritems():
+            entry_names[entry_id] = tuple(key)
+        for entry_data in data["entries"]:
+            key = entry_names.get(entry_data[0])
+            if key is None:
+                # the stats were cleared since the slave sent the name of the entry
+                logger.debug("Discarded stats for unknown entry id %s from slave %s", entry_data[0], client_id)
+                continue
+            _add_slave_entry(client_id, StatsEntry.from_compact_report(entry_data, key[0], key[1], data["response_times_layout"]))
+    else:
+        # full reports, sent by slaves running an older version of locust
+        for stats_data in data["stats"]:
+            _add_slave_entry(client_id, StatsEntry.unserialize(stats_data))
 
     for error_key, error in data["errors"].iteritems():
         if error_key not in global_stats.errors:
             global_stats.errors[error_key] = StatsError.from_dict(error)
         else:
             global_stats.errors[error_key].occurences += error["occurences"]
+    
+    if "pacing" in data:
+        global_stats.pacing_iterations += data["pacing"][0]
+        global_stats.pacing_misses += data["pacing"][1]
+    if "arrivals" in data:
+        global_stats.arrivals += data["arrivals"][0]
+        global_stats.late_arrivals += data["arrivals"][1]
+        global_stats.dropped_arrivals += data["arrivals"][2]
+
+def _add_slave_entry(client_id, entry):
+    global_stats.get(entry.name, entry.method).extend(entry, full_request_history=True)
+    global_stats.total.extend(entry, full_request_history=True)
+    global_stats.get_slave_total(client_id).extend(entry, full_request_history=True)
+    global_stats.last_request_timestamp = max(global_stats.last_request_timestamp, entry.last_request_timestamp)
 
 events.request_success += on_request_success
 events.request_failure += on_request_failure
+events.request_timings += on_request_timings
 events.report_to_master += on_report_to_master
 events.slave_report += on_slave_report
 
@@ -468,21 +962,31 @@ def print_stats(stats):
         fail_percent = 0
 
     console_logger.info((" %-" + str(STATS_NAME_WIDTH) + "s %7d %12s %42.2f") % ('Total', total_reqs, "%d(%.2f%%)" % (total_failures, fail_percent), total_rps))
+    if global_stats.pacing_iterations:
+        console_logger.info(" Missed pacing: %d of %d tasks (%.2f%%)" % (global_stats.pacing_misses, global_stats.pacing_iterations, global_stats.pacing_miss_ratio * 100))
+    if global_stats.arrivals:
+        console_logger.info(" Arrivals: %d, late: %d, dropped: %d" % (global_stats.arrivals, global_stats.late_arrivals, global_stats.dropped_arrivals))
     console_logger.info("")
 
 def print_percentile_stats(stats):
-    console_logger.info("Percentage of the requests completed within given times")
+    _print_percentile_table("Percentage of the requests completed within given times", stats, False)
+    if global_stats.total.has_corrected_response_times:
+        # the same percentiles, including the requests that would have been made during stalls
+        _print_percentile_table("Percentage of the requests completed within given times (corrected for coordinated omission)", stats, True)
+
+def _print_percentile_table(title, stats, corrected):
+    console_logger.info(title)
     console_logger.info((" %-" + str(STATS_NAME_WIDTH) + "s %8s %6s %6s %6s %6s %6s %6s %6s %6s %6s") % ('Name', '# reqs', '50%', '66%', '75%', '80%', '90%', '95%', '98%', '99%', '100%'))
     console_logger.info("-" * (80 + STATS_NAME_WIDTH))
     for key in sorted(stats.iterkeys()):
         r = stats[key]
         if r.response_times:
-            console_logger.info(r.percentile())
+            console_logger.info(r.percentile(corrected=corrected))
     console_logger.info("-" * (80 + STATS_NAME_WIDTH))
     
-    total_stats = global_stats.aggregated_stats()
+    total_stats = global_stats.total
     if total_stats.response_times:
-        console_logger.info(total_stats.percentile())
+        console_logger.info(total_stats.percentile(corrected=corrected))
     console_logger.info("")
 
 def print_error_report():
@@ -496,8 +1000,32 @@ def print_error_report():
     console_logger.info("-" * (80 + STATS_NAME_WIDTH))
     console_logger.info("")
 
+def print_listener_profile():
+    console_logger.info("Event listener profile")
+    console_logger.info((" %-" + str(STATS_NAME_WIDTH) + "s %-20s %10s %12s %10s") % ("Listener", "Event", "# calls", "Total (ms)", "Avg (ms)"))
+    console_logger.info("-" * (80 + STATS_NAME_WIDTH))
+    for row in events.get_listener_profile():
+        console_logger.info((" %-" + str(STATS_NAME_WIDTH) + "s %-20s %10d %12.1f %10.3f") % (
+            row["listener"],
+            row["event"],
+            row["calls"],
+            row["total_time"] * 1000,
+            row["total_time"] * 1000 / max(row["calls"], 1),
+        ))
+    console_logger.info("-" * (80 + STATS_NAME_WIDTH))
+    console_logger.info("")
+
 def stats_printer():
     from runners import locust_runner
     while True:
         print_stats(locust_runner.request_stats)
         gevent.sleep(2)
+
+def history_recorder():
+    """
+    Add a point to the stats history every HISTORY_INTERVAL seconds
+    """
+    from runners import locust_runner
+    while True:
+        gevent.sleep(HISTORY_INTERVAL)
+        global_stats.history.record(global_stats, locust_runner.user_count)
@@ -0,0 +1,155 @@
+import csv
+import json
+import os
+import time
+import logging
+from StringIO import StringIO
+
+import gevent
+
+from history import IntervalStats, HISTORY_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "timestamp",
+    "user_count",
+    "method",
+    "name",
+    "num_requests",
+    "num_failures",
+    "requests_per_sec",
+    "failures_per_sec",
+    "response_time_percentile_50",
+    "response_time_percentile_95",
+    "response_time_percentile_99",
+    "max_response_time",
+)
+
+BUFFER_SIZE = 64 * 1024
+""" Size of the write buffer of the stats file """
+
+
+class StatsWriter(object):
+    """
+    Appends a row with the stats of the last interval, for the total and for each stats entry,
+    to a CSV or JSON lines file.
+
+    The rows are written with a single (buffered) write per interval. When the file grows beyond
+    *max_bytes* it's rotated in the same way as logging.handlers.RotatingFileHandler does it, i.e.
+    stats.csv is renamed to stats.csv.1, stats.csv.1 to stats.csv.2, and so on, keeping at most
+    *backup_count* old files.
+
+    Each entry needs a copy of its response time distribution in order to calculate the stats
+    for the interval, so like the stats history, rows are only written for at most
+    *max_entries* entries (and the total).
+    """
+
+    def __init__(self, stats, path, format="csv", max_bytes=0, backup_count=5, max_entries=HISTORY_MAX_ENTRIES):
+        if format not in ("csv", "jsonl"):
+            raise ValueError("Unknown stats file format: %s" % format)
+        self.stats = stats
+        self.path = path
+        self.format = format
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_entries = max_entries
+        self._intervals = {}
+        self._total_interval = IntervalStats()
+        self._file = None
+
+    def write(self, user_count, now=None):
+        """
+        Write the stats for the interval since the last call
+        """
+        if now is None:
+            now = time.time()
+        entries = self.stats.entries
+        for key in [key for key in self._intervals if key not in entries]:
+            # the stats have been cleared since the last call
+            del self._intervals[key]
+        rows = []
+        for key in sorted(entries.iterkeys()):
+            interval = self._intervals.get(key)
+            if interval is None:
+                if len(self._intervals) >= self.max_entries:
+                    continue
+                interval = self._intervals[key] = IntervalStats()
+            rows.append(self._row(entries[key], interval, user_count, now))
+        rows.append(self._row(self.stats.total, self._total_interval, user_count, now))
+
+        if self._file is None:
+            self._open()
+        elif self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+        self._file.write(self._format(rows))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _row(self, entry, interval, user_count, now):
+        num_requests, num_failures, response_times, elapsed = interval.update(entry, now)
+        max_response_time = 0
+        for value, count in response_times:
+            max_response_time = value
+        # the histogram holds microseconds, while the stats file is in milliseconds
+        return (
+            now,
+            user_count,
+            entry.method or "",
+            entry.name,
+            num_requests,
+            num_failures,
+            num_requests / elapsed,
+            num_failures / elapsed,
+            (response_times.median() or 0) / 1000.0,
+            (response_times.percentile(0.95) or 0) / 1000.0,
+            (response_times.percentile(0.99) or 0) / 1000.0,
+            max_response_time / 1000.0,
+        )
+
+    def _format(self, rows):
+        if self.format == "jsonl":
+            return "".join(json.dumps(dict(zip(COLUMNS, row))) + "\n" for row in rows)
+        data = StringIO()
+        writer = csv.writer(data)
+        for row in rows:
+            writer.writerow([value.encode("utf-8") if isinstance(value, unicode) else value for value in row])
+        return data.getvalue()
+
+    def _open(self):
+        self._file = open(self.path, "ab", BUFFER_SIZE)
+        self._file.seek(0, os.SEEK_END)
+        if self.format == "csv" and not self._file.tell():
+            self._file.write(",".join(COLUMNS) + "\r\n")
+
+    def _rotate(self):
+        self.close()
+        if self.backup_count > 0:
+            for i in xrange(self.backup_count - 1, 0, -1):
+                source = "%s.%i" % (self.path, i)
+                if os.path.exists(source):
+                    os.rename(source, "%s.%i" % (self.path, i + 1))
+            os.rename(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+def stats_writer(writer, interval):
+    """
+    Greenlet that writes the stats of the runner to *writer* every *interval* seconds
+    """
+    from runners import locust_runner
+    try:
+        while True:
+            gevent.sleep(interval)
+            try:
+                writer.write(locust_runner.user_count)
+            except (IOError, OSError) as e:
+                logger.error("Failed to write stats to %s: %s" % (writer.path, e))
+    finally:
+        writer.close()
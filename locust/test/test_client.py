@@ -1,10 +1,37 @@
+import re
+import socket
+
+import mock
+
 from requests.exceptions import (RequestException, MissingSchema,
         InvalidSchema, InvalidURL)
 
 import gevent
-from locust.clients import HttpSession
+from locust import events
+from locust.clients import HttpSession, UrlNameNormalizer, allowed_gai_family
 from locust.stats import global_stats
-from testcases import WebserverTestCase
+from testcases import LocustTestCase, WebserverTestCase
+
+class TestUrlNameNormalizer(LocustTestCase):
+    def test_normalize(self):
+        normalizer = UrlNameNormalizer([
+            (r"/item/\d+", "/item/[id]"),
+            (re.compile(r"\?.*$"), ""),
+        ])
+        self.assertEqual("/item/[id]", normalizer.normalize("/item/123?x=1"))
+        self.assertEqual("/item/[id]/reviews", normalizer.normalize("/item/9/reviews"))
+        self.assertEqual("/", normalizer.normalize("/"))
+    
+    def test_cache_is_bounded(self):
+        normalizer = UrlNameNormalizer([(r"\d+", "[n]")], cache_size=10)
+        for i in xrange(25):
+            self.assertEqual("/[n]", normalizer.normalize("/%i" % i))
+            self.assertLessEqual(len(normalizer._cache), 10)
+    
+    def test_for_rules(self):
+        rules = [(r"/item/\d+", "/item/[id]")]
+        self.assertTrue(UrlNameNormalizer.for_rules(rules) is UrlNameNormalizer.for_rules(list(rules)))
+
 
 class TestHttpSession(WebserverTestCase):
     def test_get(self):
@@ -58,6 +85,56 @@ class TestHttpSession(WebserverTestCase):
         self.assertEqual(1, stats.num_requests)
         self.assertGreater(stats.avg_response_time, 500)
     
+    def test_request_timings(self):
+        timings = []
+        def on_request_timings(request_type, name, **kwargs):
+            timings.append(kwargs["timings"])
+        events.request_timings += on_request_timings
+        try:
+            s = HttpSession("http://localhost:%i" % self.port)
+            s.get("/ultra_fast")
+            s.get("/ultra_fast")
+            s.get("/streaming/1", stream=True).content
+        finally:
+            events.request_timings -= on_request_timings
+        
+        self.assertEqual(3, len(timings))
+        self.assertEqual(set(["dns", "connect", "ttfb", "body"]), set(timings[0]))
+        self.assertGreater(timings[0]["connect"], 0)
+        # the second request reuses the connection
+        self.assertEqual(0, timings[1]["connect"])
+        self.assertEqual(0, timings[1]["dns"])
+        self.assertGreater(timings[1]["ttfb"], 0)
+        self.assertFalse("body" in timings[2])
+        self.assertEqual(2, global_stats.get("/ultra_fast", "GET").timings["ttfb"].total_count)
+        self.assertEqual(3, global_stats.total.timings["ttfb"].total_count)
+    
+    def test_connect_to_next_address(self):
+        getaddrinfo = socket.getaddrinfo
+        families = []
+        def mocked_getaddrinfo(host, port, family=0, *args):
+            if host != "multiple.addresses.test":
+                return getaddrinfo(host, port, family, *args)
+            families.append(family)
+            # nothing listens on 127.0.0.2, so that connection is refused
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port)) for address in ("127.0.0.2", "127.0.0.1")]
+        
+        with mock.patch("socket.getaddrinfo", mocked_getaddrinfo):
+            r = HttpSession("http://multiple.addresses.test:%i" % self.port).get("/ultra_fast")
+        self.assertEqual(200, r.status_code)
+        self.assertEqual([allowed_gai_family()], families)
+    
+    def test_connection_error_has_no_timings(self):
+        timings = []
+        def on_request_timings(**kwargs):
+            timings.append(kwargs)
+        events.request_timings += on_request_timings
+        try:
+            HttpSession("http://127.0.0.1:1").get("/", timeout=0.1)
+        finally:
+            events.request_timings -= on_request_timings
+        self.assertEqual([], timings)
+    
     def test_post_redirect(self):
         s = HttpSession("http://127.0.0.1:%i" % self.port)
         url = "/redirect"
@@ -0,0 +1,24 @@
+import time
+
+from locust import clock
+from testcases import LocustTestCase
+
+
+class TestClock(LocustTestCase):
+    def test_monotonic(self):
+        values = [clock.monotonic() for i in xrange(1000)]
+        self.assertEqual(sorted(values), values)
+    
+    def test_resolution(self):
+        start = clock.monotonic()
+        time.sleep(0.0005)
+        elapsed = clock.monotonic() - start
+        self.assertGreaterEqual(elapsed, 0.0005)
+        self.assertLess(elapsed, 0.1)
+    
+    def test_clock_gettime(self):
+        monotonic = clock._clock_gettime_monotonic()
+        if monotonic is None:
+            return
+        first = monotonic()
+        self.assertLessEqual(first, monotonic())
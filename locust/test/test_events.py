@@ -0,0 +1,156 @@
+import gevent
+
+from locust import events
+from locust.events import EventHook, DeferredListener
+from testcases import LocustTestCase
+
+
+class TestEventHook(LocustTestCase):
+    def tearDown(self):
+        super(TestEventHook, self).tearDown()
+        events.set_listener_profiling(False)
+
+    def test_fire(self):
+        hook = EventHook()
+        self.assertFalse(hook)
+        hook.fire(a=1)
+
+        calls = []
+        def first(a):
+            calls.append(("first", a))
+        def second(a):
+            calls.append(("second", a))
+        hook += first
+        self.assertTrue(hook)
+        hook.fire(a=1)
+        hook += second
+        hook.fire(a=2)
+        hook -= first
+        hook.fire(a=3)
+        self.assertEqual([("first", 1), ("first", 2), ("second", 2), ("second", 3)], calls)
+
+    def test_set_handlers(self):
+        calls = []
+        hook = EventHook()
+        hook += lambda: calls.append(1)
+        handlers = list(hook._handlers)
+        hook += lambda: calls.append(2)
+        hook._handlers = handlers
+        hook.fire()
+        self.assertEqual([1], calls)
+
+    def test_listener_profiling(self):
+        hook = EventHook()
+        def on_event(a):
+            pass
+        hook += on_event
+        events.set_listener_profiling(True)
+        hook.fire(a=1)
+        hook.fire(a=2)
+        rows = [row for row in events.get_listener_profile() if row["listener"].endswith(".on_event")]
+        self.assertEqual(1, len(rows))
+        self.assertEqual(2, rows[0]["calls"])
+        self.assertGreater(rows[0]["total_time"], 0)
+
+        events.set_listener_profiling(False)
+        hook.fire(a=3)
+        events.reset_listener_profile()
+        rows = [row for row in events.get_listener_profile() if row["listener"].endswith(".on_event")]
+        self.assertEqual(0, rows[0]["calls"])
+
+    def test_profile_event_name(self):
+        events.set_listener_profiling(True)
+        def on_start_hatching():
+            pass
+        events.locust_start_hatching += on_start_hatching
+        try:
+            events.locust_start_hatching.fire()
+        finally:
+            events.locust_start_hatching -= on_start_hatching
+        rows = [row for row in events.get_listener_profile() if row["listener"] == __name__ + ".on_start_hatching"]
+        self.assertEqual(["locust_start_hatching"], [row["event"] for row in rows])
+
+    def test_fire_batch(self):
+        hook = EventHook(batch_fields=("name", "response_time"))
+        legacy_calls = []
+        batches = []
+        def on_event(name, response_time):
+            legacy_calls.append((name, response_time))
+        def on_event_batched(**kwargs):
+            self.fail("batch listeners shouldn't be called for each row")
+        on_event_batched.batch_handler = batches.append
+        hook += on_event
+        hook += on_event_batched
+        rows = [("/a", 1.0), ("/b", 2.0)]
+        hook.fire_batch(rows)
+        self.assertEqual(rows, legacy_calls)
+        self.assertEqual([rows], batches)
+        
+        events.set_listener_profiling(True)
+        hook.fire_batch(rows)
+        self.assertEqual(2, len(batches))
+        rows = [row for row in events.get_listener_profile() if row["listener"].endswith(".on_event_batched")]
+        self.assertEqual(1, rows[0]["calls"])
+    
+    def test_fire_batch_without_batch_fields(self):
+        hook = EventHook()
+        hook += lambda **kwargs: self.fail("the rows can't be turned into arguments")
+        self.assertRaises(TypeError, hook.fire_batch, [("/a", 1.0)])
+
+
+class TestDeferredListener(LocustTestCase):
+    def setUp(self):
+        super(TestDeferredListener, self).setUp()
+        self.listeners = []
+    
+    def tearDown(self):
+        for listener in self.listeners:
+            listener.stop()
+        super(TestDeferredListener, self).tearDown()
+    
+    def test_deferred(self):
+        calls = []
+        def on_event(a):
+            calls.append(a)
+        hook = EventHook()
+        listener = DeferredListener(on_event, batch_size=2)
+        self.listeners.append(listener)
+        hook += listener
+        for i in xrange(5):
+            hook.fire(a=i)
+        self.assertEqual([], calls)
+        gevent.sleep(0)
+        self.assertEqual([0, 1], calls)
+        gevent.sleep(0)
+        gevent.sleep(0)
+        self.assertEqual([0, 1, 2, 3, 4], calls)
+        
+        hook -= on_event
+        self.assertFalse(hook)
+    
+    def test_dropped_and_flush(self):
+        calls = []
+        def on_event(a):
+            if a == 1:
+                raise Exception("listener error")
+            calls.append(a)
+        listener = DeferredListener(on_event, queue_size=3)
+        self.listeners.append(listener)
+        for i in xrange(5):
+            listener(a=i)
+        self.assertEqual(2, listener.dropped)
+        listener.flush()
+        self.assertEqual([0, 2], calls)
+        self.assertTrue(listener.flush in events.quitting._handlers)
+    
+    def test_stop(self):
+        calls = []
+        def on_event(x):
+            calls.append(x)
+        listener = DeferredListener(on_event)
+        worker = listener._worker
+        listener(x=1)
+        listener.stop()
+        self.assertTrue(worker.dead)
+        self.assertFalse(listener.flush in events.quitting._handlers)
+        self.assertEqual([1], calls)
@@ -0,0 +1,218 @@
+import random
+
+from locust import histogram
+from locust.histogram import Histogram, DDSketch
+from testcases import LocustTestCase
+
+
+class TestHistogram(LocustTestCase):
+    def test_index_of_large_values(self):
+        h = Histogram(2)
+        # float(value) is rounded up to the next power of two for some of these
+        for value in (2**53 - 1, 2**53, 2**54 - 1, 2**60 + 5):
+            shift = len(bin(value)) - 2 - h._sub_bucket_bits
+            self.assertEqual(shift * h._sub_bucket_half + (value >> shift), h._index(value))
+
+    def test_small_values_are_exact(self):
+        h = Histogram(2)
+        for x in xrange(256):
+            h.record(x)
+        self.assertEqual(range(256), [value for value, count in h])
+        self.assertEqual(256, h.total_count)
+
+    def test_relative_error(self):
+        for digits in (1, 2, 3):
+            h = Histogram(digits)
+            for value in [1000, 12345, 98765, 123456, 10**7 + 13, 3600 * 1000]:
+                h.reset()
+                h.record(value)
+                self.assertLessEqual(abs(h.median() - value), value * 10**-digits)
+
+    def test_round_values_are_kept(self):
+        h = Histogram(2)
+        for value in [700, 800, 1000, 25000, 60000]:
+            h.reset()
+            h.record(value)
+            self.assertEqual(value, h.median())
+
+    def test_percentile(self):
+        h = Histogram()
+        for x in xrange(100):
+            h.record(x)
+        self.assertEqual(50, h.percentile(0.5))
+        self.assertEqual(95, h.percentile(0.95))
+        self.assertEqual(99, h.percentile(1.0))
+        self.assertEqual(49, h.median())
+
+    def test_empty(self):
+        h = Histogram()
+        self.assertFalse(h)
+        self.assertEqual(None, h.median())
+        self.assertEqual(None, h.percentile(0.95))
+
+    def test_merge(self):
+        values = [random.randint(0, 100000) for i in xrange(1000)]
+        h1 = Histogram()
+        h2 = Histogram()
+        total = Histogram()
+        for i, value in enumerate(values):
+            (h1 if i % 2 else h2).record(value)
+            total.record(value)
+        h1.merge(h2)
+        self.assertEqual(total.to_dict(), h1.to_dict())
+        self.assertEqual(1000, h1.total_count)
+
+    def test_dict_roundtrip(self):
+        h = Histogram(3)
+        for value in [1, 17, 2048, 99999, 1234567]:
+            h.record(value, 3)
+        rebuilt = Histogram.from_dict(h.to_dict(), 3)
+        self.assertEqual(list(h.counts), list(rebuilt.counts))
+        self.assertEqual(15, rebuilt.total_count)
+
+    def test_counts_are_widened(self):
+        h = Histogram()
+        h.record(10, 200)
+        h.record(10, 200)
+        h.record(5000, 70000)
+        self.assertEqual(400, h.to_dict()[10])
+        self.assertEqual(70000, h.to_dict()[5000])
+        h.record(10, 2**33)
+        self.assertEqual(2**33 + 400, h.to_dict()[10])
+        self.assertEqual(2**33 + 70400, h.total_count)
+
+    def test_counts_only_span_recorded_range(self):
+        h = Histogram()
+        h.record(100000)
+        self.assertEqual(1, len(h.counts))
+        h.record(90000)
+        h.record(110000)
+        self.assertEqual([90000, 100000, 110000], [value for value, count in h])
+        self.assertEqual(100000, h.median())
+
+    def test_record_sequence(self):
+        for value, step, low in [(60000000, 10000, 10000), (12345.6, 7.5, 7.5), (100, 1, 0), (5, 10, 10)]:
+            h = Histogram()
+            h.record_sequence(value, step, low)
+            expected = Histogram()
+            while value >= low:
+                expected.record(value)
+                value -= step
+            self.assertEqual(expected.to_dict(), h.to_dict())
+            self.assertEqual(expected.total_count, h.total_count)
+
+    def test_difference(self):
+        h = Histogram()
+        for value in [1, 10, 100, 1000]:
+            h.record(value)
+        earlier = h.copy()
+        for value in [5, 500, 50000]:
+            h.record(value)
+        diff = h.difference(earlier)
+        self.assertEqual({5: 1, 500: 1, 50000: 1}, diff.to_dict())
+        self.assertEqual(3, diff.total_count)
+        self.assertEqual(500, diff.median())
+        self.assertEqual(7, h.total_count)
+
+    def test_difference_not_earlier_copy(self):
+        earlier = Histogram()
+        for value in [1000] * 5:
+            earlier.record(value)
+        h = Histogram()
+        for value in [5] * 20:
+            h.record(value)
+        self.assertRaises(ValueError, h.difference, earlier)
+        h.record(1000)
+        self.assertRaises(ValueError, h.difference, earlier)
+
+    def test_bytes_roundtrip(self):
+        h = Histogram()
+        for value in [0, 3, 250, 99999]:
+            h.record(value, 300)
+        rebuilt = histogram.from_bytes(h.to_bytes())
+        self.assertTrue(isinstance(rebuilt, Histogram))
+        self.assertEqual(h.to_dict(), rebuilt.to_dict())
+        self.assertEqual(1200, rebuilt.total_count)
+
+
+class TestDDSketch(LocustTestCase):
+    def test_relative_error(self):
+        for accuracy in (0.05, 0.01, 0.001):
+            sketch = DDSketch(accuracy)
+            for value in [0.25, 1, 7.5, 1000, 12345, 98765, 3600 * 1000]:
+                sketch.reset()
+                sketch.record(value)
+                self.assertLessEqual(abs(sketch.median() - value), value * accuracy * (1 + 1e-9))
+
+    def test_percentile(self):
+        sketch = DDSketch()
+        for x in xrange(1, 101):
+            sketch.record(x)
+        self.assertAlmostEqual(50, sketch.median(), delta=0.5)
+        self.assertAlmostEqual(96, sketch.percentile(0.95), delta=0.96)
+        self.assertAlmostEqual(100, sketch.percentile(1.0), delta=1)
+
+    def test_zero(self):
+        sketch = DDSketch()
+        self.assertEqual(None, sketch.median())
+        sketch.record(0, 3)
+        sketch.record(10)
+        self.assertEqual(0, sketch.median())
+        self.assertAlmostEqual(10, sketch.percentile(0.9), delta=0.1)
+        self.assertEqual(3, dict(sketch)[0])
+        self.assertEqual(1, len(sketch.counts))
+
+    def test_merge(self):
+        values = [random.uniform(0, 100000) for i in xrange(1000)] + [0] * 10
+        s1 = DDSketch()
+        s2 = DDSketch()
+        total = DDSketch()
+        for i, value in enumerate(values):
+            (s1 if i % 2 else s2).record(value)
+            total.record(value)
+        s1.merge(s2)
+        self.assertEqual(total.to_dict(), s1.to_dict())
+        self.assertEqual(10, s1.zero_count)
+        self.assertEqual(1010, s1.total_count)
+
+    def test_merge_histogram(self):
+        sketch = DDSketch()
+        h = Histogram()
+        h.record(0)
+        h.record(500, 2)
+        sketch.merge(h)
+        self.assertEqual(3, sketch.total_count)
+        self.assertEqual(1, sketch.zero_count)
+        self.assertAlmostEqual(500, sketch.median(), delta=5)
+
+    def test_record_sequence(self):
+        sketch = DDSketch()
+        sketch.record_sequence(60000000, 10000, 10000)
+        self.assertEqual(6000, sketch.total_count)
+        for percent in (0.1, 0.5, 0.9, 0.99):
+            self.assertAlmostEqual(60000000 * percent, sketch.percentile(percent), delta=60000000 * percent * 0.02)
+
+    def test_difference(self):
+        sketch = DDSketch()
+        sketch.record(0)
+        sketch.record(10)
+        earlier = sketch.copy()
+        sketch.record(0)
+        sketch.record(1000)
+        diff = sketch.difference(earlier)
+        self.assertEqual(2, diff.total_count)
+        self.assertEqual(1, diff.zero_count)
+        self.assertAlmostEqual(1000, diff.percentile(0.99), delta=10)
+
+    def test_bytes_roundtrip(self):
+        sketch = DDSketch(0.02)
+        for value in [0, 0.5, 3, 250, 99999]:
+            sketch.record(value, 300)
+        data = sketch.to_bytes()
+        rebuilt = histogram.from_bytes(data)
+        self.assertTrue(isinstance(rebuilt, DDSketch))
+        self.assertEqual(0.02, rebuilt.relative_accuracy)
+        self.assertEqual(sketch.to_dict(), rebuilt.to_dict())
+        self.assertEqual(1500, rebuilt.total_count)
+        self.assertEqual(300, rebuilt.zero_count)
+        self.assertLess(len(data), 1000)
@@ -0,0 +1,79 @@
+from locust.history import StatsHistory, TimeSeries
+from locust.stats import RequestStats
+from testcases import LocustTestCase
+
+
+class TestStatsHistory(LocustTestCase):
+    def setUp(self):
+        super(TestStatsHistory, self).setUp()
+        self.stats = RequestStats()
+        self.stats.start_time = 1000.0
+        for entry in (self.stats.get("/", "GET"), self.stats.total):
+            entry.start_time = 1000.0
+
+    def log(self, response_times, failures=0):
+        entry = self.stats.get("/", "GET")
+        for response_time in response_times:
+            entry.log(response_time, 0)
+        for i in xrange(failures):
+            entry.log_error(Exception("error"))
+
+    def test_interval_stats(self):
+        history = StatsHistory()
+        self.log([10] * 20, failures=2)
+        history.record(self.stats, 5, now=1002.0)
+        self.log([500] * 10)
+        history.record(self.stats, 10, now=1004.0)
+
+        data = history.total.to_dict()
+        self.assertEqual([1002.0, 1004.0], data["time"])
+        self.assertEqual([10.0, 5.0], data["rps"])
+        self.assertEqual([1.0, 0.0], data["failures_per_sec"])
+        self.assertEqual([10, 500], data["response_time_percentile_50"])
+        self.assertEqual([10, 500], data["response_time_percentile_99"])
+        self.assertEqual([5, 10], data["user_count"])
+        self.assertEqual(data, history.entries[("/", "GET")].to_dict())
+
+    def test_reset(self):
+        history = StatsHistory()
+        self.log([10] * 20)
+        history.record(self.stats, 1, now=1002.0)
+        self.stats.reset_all()
+        self.log([20] * 4)
+        history.record(self.stats, 1, now=1004.0)
+        self.assertEqual([10, 20], history.total.to_dict()["response_time_percentile_50"])
+        self.assertEqual(4, history.total.interval.num_requests)
+    
+    def test_reset_then_more_requests(self):
+        history = StatsHistory()
+        self.log([1000] * 5)
+        history.record(self.stats, 1, now=1002.0)
+        self.stats.get("/", "GET").reset()
+        self.stats.total.reset()
+        self.log([5] * 20)
+        history.record(self.stats, 1, now=1004.0)
+        data = history.entries[("/", "GET")].to_dict()
+        self.assertEqual([1000, 5], data["response_time_percentile_99"])
+        self.assertEqual(20, history.total.interval.num_requests)
+
+    def test_since_and_max_points(self):
+        series = TimeSeries()
+        for i in xrange(10):
+            self.log([i + 1])
+            series.record(self.stats.total, i, now=1001.0 + i)
+        data = series.to_dict(since=1005.0, max_points=2)
+        self.assertEqual([1008.0, 1010.0], data["time"])
+        self.assertEqual([8, 10], data["response_time_percentile_95"])
+        self.assertEqual([7, 9], data["user_count"])
+        self.assertEqual([1.0, 1.0], data["rps"])
+
+    def test_bounded_size(self):
+        history = StatsHistory(capacity=10, max_entries=1)
+        self.log([1])
+        self.stats.get("/other", "GET").log(1, 0)
+        for i in xrange(30):
+            history.record(self.stats, 1, now=1001.0 + i)
+        self.assertEqual(1, len(history.entries))
+        self.assertEqual(4, history.stride)
+        self.assertLess(len(history.total), 10)
+        self.assertEqual(len(history.total), len(history.entries.values()[0]))
@@ -1,8 +1,10 @@
 import unittest
 
+import mock
+
 from locust.core import HttpLocust, Locust, TaskSet, task, events
 from locust import ResponseError, InterruptTaskSet
-from locust.exception import CatchResponseError, RescheduleTask, RescheduleTaskImmediately, LocustError
+from locust.exception import CatchResponseError, RescheduleTask, RescheduleTaskImmediately, LocustError, StopLocust
 
 from testcases import LocustTestCase, WebserverTestCase
 
@@ -21,12 +23,11 @@ class TestTaskSet(LocustTestCase):
             tasks = {t1:5, t2:2}
         
         l = MyTasks(self.locust)
+        weights = dict(zip(l.tasks, l.task_weights))
 
-        t1_count = len([t for t in l.tasks if t == t1])
-        t2_count = len([t for t in l.tasks if t == t2])
-
-        self.assertEqual(t1_count, 5)
-        self.assertEqual(t2_count, 2)
+        self.assertEqual(2, len(l.tasks))
+        self.assertEqual(weights[t1], 5)
+        self.assertEqual(weights[t2], 2)
     
     def test_task_decorator_ratio(self):
         t1 = lambda l: None
@@ -45,17 +46,94 @@ class TestTaskSet(LocustTestCase):
             
 
         l = MyTasks(self.locust)
+        weights = dict(zip(l.tasks, l.task_weights))
 
-        t1_count = len([t for t in l.tasks if t == t1])
-        t2_count = len([t for t in l.tasks if t == t2])
-        t3_count = len([t for t in l.tasks if t.__name__ == MyTasks.t3.__name__])
-        t4_count = len([t for t in l.tasks if t.__name__ == MyTasks.t4.__name__])
-
-        self.assertEqual(t1_count, 5)
-        self.assertEqual(t2_count, 2)
-        self.assertEqual(t3_count, 3)
-        self.assertEqual(t4_count, 13)
-
+        self.assertEqual(weights[t1], 5)
+        self.assertEqual(weights[t2], 2)
+        self.assertEqual(weights[MyTasks.t3.__func__], 3)
+        self.assertEqual(weights[MyTasks.t4.__func__], 13)
+    
+    def test_get_next_task_weights(self):
+        t1 = lambda l: None
+        t2 = lambda l: None
+        class MyTasks(TaskSet):
+            tasks = [(t1, 997), (t2, 3), (t1, 1000)]
+        
+        l = MyTasks(self.locust)
+        self.assertEqual([t1, t2], l.tasks)
+        self.assertEqual([1997, 3], l.task_weights)
+        
+        import random
+        original_random = random.random
+        try:
+            for value, expected in ((0.0, t1), (0.9984, t1), (0.9985, t2), (0.99999999, t2)):
+                random.random = lambda: value
+                self.assertEqual(expected, l.get_next_task())
+        finally:
+            random.random = original_random
+    
+    def test_changed_tasks(self):
+        t1 = lambda l: None
+        t2 = lambda l: None
+        t3 = lambda l: None
+        class MyTasks(TaskSet):
+            tasks = {t1: 3}
+        
+        l = MyTasks(self.locust)
+        # the instance shares the tasks list of the MyTasks class
+        l.tasks.append(t2)
+        self.assertEqual([t1, t2], l.tasks)
+        self.assertEqual([3, 1], l.task_weights)
+        self.assertEqual([3, 1], MyTasks.task_weights)
+        l.tasks[1:] = [(t2, 4), (t3, 0)]
+        self.assertEqual([t1, t2], l.tasks)
+        self.assertEqual([3, 4], MyTasks.task_weights)
+        
+        l.tasks = [(t3, 5), t1]
+        self.assertTrue(l.get_next_task() in (t1, t3))
+        self.assertEqual([t3, t1], l.tasks)
+        self.assertEqual([5, 3], l.task_weights)
+        # the class isn't affected by replacing the tasks of an instance
+        self.assertEqual([3, 4], MyTasks.task_weights)
+        
+        class MySubTasks(MyTasks):
+            tasks = [t2]
+        self.assertEqual([t1, t2], MySubTasks.tasks)
+        self.assertEqual([3, 5], MySubTasks.task_weights)
+        
+        MySubTasks.tasks = [t2, (t3, 2)]
+        self.assertEqual([t2, t3], MySubTasks.tasks)
+        self.assertEqual([5, 2], MySubTasks.task_weights)
+
+    def test_pacing(self):
+        class MyTasks(TaskSet):
+            pacing = 100
+        
+        taskset = MyTasks(self.locust)
+        sleeps = []
+        taskset._sleep = sleeps.append
+        with mock.patch("locust.core.monotonic") as monotonic:
+            with mock.patch("locust.core.global_stats") as stats:
+                # the task took 30 ms, so the locust waits for the remaining 70 ms
+                taskset._iteration_start = 1.0
+                monotonic.return_value = 1.03
+                taskset.wait()
+                # the task took 250 ms, so the next one is started right away
+                taskset._iteration_start = 2.0
+                monotonic.return_value = 2.25
+                taskset.wait()
+        self.assertEqual(1, len(sleeps))
+        self.assertAlmostEqual(0.07, sleeps[0])
+        self.assertEqual([mock.call(False), mock.call(True)], stats.log_pacing.call_args_list)
+    
+    def test_pacing_from_locust(self):
+        class User(Locust):
+            pacing = 500
+            class task_set(TaskSet):
+                pass
+        taskset = User.task_set(User())
+        self.assertEqual(500, taskset.pacing)
+    
     def test_on_start(self):
         class MyTasks(TaskSet):
             t1_executed = False
@@ -99,6 +177,56 @@ class TestTaskSet(LocustTestCase):
         taskset.execute_next_task()
         self.assertEqual("argument to t2", self.t2_arg)
     
+    def test_run_schedules_picked_tasks(self):
+        scheduled = []
+        class MyTasks(TaskSet):
+            @task
+            def t(self):
+                if len(scheduled) == 3:
+                    raise StopLocust()
+            
+            def schedule_task(self, task_callable, *args, **kwargs):
+                scheduled.append(task_callable)
+                super(MyTasks, self).schedule_task(task_callable, *args, **kwargs)
+            
+            def wait(self):
+                pass
+        
+        self.assertRaises(StopLocust, MyTasks(self.locust).run)
+        self.assertEqual([MyTasks.t.__func__] * 3, scheduled)
+    
+    def test_schedule_task_reuses_records(self):
+        t1 = lambda l: None
+        t2 = lambda l: None
+        class MyTasks(TaskSet):
+            tasks = [t1]
+        
+        taskset = MyTasks(self.locust)
+        taskset.schedule_task(t1)
+        taskset.schedule_task(t1)
+        taskset.schedule_task(t1, args=[1])
+        taskset.schedule_task(t2)
+        first, second, with_args, other = taskset._task_queue
+        self.assertTrue(first is second)
+        self.assertFalse(with_args is first)
+        self.assertEqual((t1, [1]), (with_args.callable, with_args.args))
+        self.assertEqual((t2, (), {}), (other.callable, other.args, other.kwargs))
+    
+    def test_schedule_task_first(self):
+        calls = []
+        class MyTasks(TaskSet):
+            def t(self, name):
+                calls.append(name)
+        
+        taskset = MyTasks(self.locust)
+        taskset.schedule_task(taskset.t, args=["second"])
+        taskset.schedule_task(taskset.t, args=["third"])
+        taskset.schedule_task(taskset.t, args=["first"], first=True)
+        for i in xrange(3):
+            taskset.execute_next_task()
+        self.assertEqual(["first", "second", "third"], calls)
+        self.assertFalse(taskset._task_queue)
+    
     def test_schedule_task_with_kwargs(self):
         class MyTasks(TaskSet):
             @task
@@ -173,7 +301,8 @@ class TestTaskSet(LocustTestCase):
             def t1(self):
                 pass
         taskset = MyTaskSet3(self.locust)
-        self.assertEqual(len(taskset.tasks), 3)
+        self.assertEqual(len(taskset.tasks), 1)
+        self.assertEqual([3], taskset.task_weights)
     
     def test_sub_taskset(self):
         class MySubTaskSet(TaskSet):
@@ -193,6 +322,23 @@ class TestTaskSet(LocustTestCase):
         self.assertRaises(RescheduleTaskImmediately, lambda: loc.execute_next_task())
         self.assertTrue(self.locust.sub_locust_task_executed)
     
+    def test_run_once_sub_taskset(self):
+        calls = []
+        class MySubTaskSet(TaskSet):
+            @task
+            def a_task(self):
+                calls.append("sub")
+        
+        class MyTaskSet(TaskSet):
+            tasks = [MySubTaskSet]
+            def on_start(self):
+                calls.append("start")
+        
+        loc = MyTaskSet(self.locust)
+        loc.wait = lambda: self.fail("run_once shouldn't wait")
+        loc.run_once()
+        self.assertEqual(["start", "sub"], calls)
+    
     def test_sub_taskset_tasks_decorator(self):
         class MyTaskSet(TaskSet):
             @task
@@ -1,3 +1,4 @@
+import sys
 import unittest
 
 import gevent
@@ -6,11 +7,11 @@ import mock
 from gevent.queue import Queue
 from gevent import sleep
 
-from locust.runners import LocalLocustRunner, MasterLocustRunner, SlaveLocustRunner
+from locust.runners import LocalLocustRunner, MasterLocustRunner, SlaveLocustRunner, OTHER_EXCEPTIONS_MSG
 from locust.core import Locust, task, TaskSet
-from locust.exception import LocustError
+from locust.exception import LocustError, StopLocust
 from locust.rpc import Message
-from locust.stats import RequestStats, global_stats
+from locust.stats import RequestStats, global_stats, MAX_ENTRIES
 from locust.main import parse_options
 from locust.test.testcases import LocustTestCase
 from locust import events
@@ -37,6 +38,22 @@ def mocked_rpc_server():
     
     return MockedRpcServer
 
+def mocked_rpc_client():
+    class MockedRpcClient(object):
+        queue = Queue()
+        outbox = []
+        
+        def __init__(self, host, port):
+            pass
+        
+        def recv(self):
+            return Message.unserialize(self.queue.get())
+        
+        def send(self, message):
+            self.outbox.append(message.serialize())
+    
+    return MockedRpcClient
+
 
 class TestMasterRunner(LocustTestCase):
     def setUp(self):
@@ -100,6 +117,110 @@ class TestMasterRunner(LocustTestCase):
             s = master.stats.get("/", "GET")
             self.assertEqual(700, s.median_response_time)
     
+    def test_slave_stats_report_total(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            server.mocked_send(Message("client_ready", None, "fake_client"))
+            sleep(0)
+            
+            master.stats.get("/", "GET").log(100, 23455)
+            master.stats.get("/other", "GET").log(800, 23455)
+            master.stats.get("/other", "GET").log(700, 23455)
+            
+            data = {"user_count":1}
+            events.report_to_master.fire(client_id="fake_client", data=data)
+            master.stats.clear_all()
+            
+            server.mocked_send(Message("stats", data, "fake_client"))
+            sleep(0)
+            self.assertEqual(3, master.stats.total.num_requests)
+            self.assertEqual(700, master.stats.total.median_response_time)
+    
+    def test_slave_stats_report_entry_names_sent_once(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            server.mocked_send(Message("client_ready", None, "fake_client"))
+            sleep(0)
+            
+            reports = []
+            for response_time in (100, 200):
+                master.stats.get("/", "GET").log(response_time, 23455)
+                data = {"user_count":1}
+                events.report_to_master.fire(client_id="fake_client", data=data)
+                reports.append(Message("stats", data, "fake_client").serialize())
+            master.stats.clear_all()
+            
+            self.assertEqual({0:["/", "GET"]}, Message.unserialize(reports[0]).data["entry_names"])
+            self.assertEqual({}, Message.unserialize(reports[1]).data["entry_names"])
+            for report in reports:
+                server.mocked_send(Message.unserialize(report))
+                sleep(0)
+            s = master.stats.get("/", "GET")
+            self.assertEqual(2, s.num_requests)
+            self.assertEqual(200, s.max_response_time)
+            self.assertEqual(2, master.stats.total.num_requests)
+            
+            server.mocked_send(Message("quit", None, "fake_client"))
+            sleep(0)
+            self.assertEqual({}, master.stats.slave_entry_names)
+    
+    def test_slave_totals(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            reports = []
+            for client_id, response_times, failures in (("slow_client", [900, 1100], 1), ("fast_client", [10, 20, 30], 0)):
+                server.mocked_send(Message("client_ready", None, client_id))
+                sleep(0)
+                for response_time in response_times:
+                    master.stats.get("/", "GET").log(response_time, 0)
+                for i in xrange(failures):
+                    master.stats.get("/", "GET").log_error(Exception("error"))
+                data = {"user_count": 5}
+                events.report_to_master.fire(client_id=client_id, data=data)
+                reports.append(Message("stats", data, client_id).serialize())
+                master.stats.clear_all()
+            for report in reports:
+                server.mocked_send(Message.unserialize(report))
+                sleep(0)
+            
+            self.assertEqual(5, master.stats.total.num_requests)
+            slow = master.stats.slave_totals["slow_client"]
+            self.assertEqual(2, slow.num_requests)
+            self.assertEqual(1, slow.num_failures)
+            self.assertEqual(1100, slow.get_response_time_percentile(0.95))
+            self.assertEqual(20, master.stats.slave_totals["fast_client"].median_response_time)
+            self.assertEqual(5, master.clients["fast_client"].user_count)
+            
+            server.mocked_send(Message("quit", None, "slow_client"))
+            sleep(0)
+            self.assertEqual(["fast_client"], master.stats.slave_totals.keys())
+    
+    def test_slave_stats_full_report(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            server.mocked_send(Message("client_ready", None, "fake_client"))
+            sleep(0)
+            
+            master.stats.get("/", "GET").log(100, 23455)
+            data = {"user_count":1, "errors":{}, "stats":[master.stats.get("/", "GET").get_stripped_report()]}
+            master.stats.clear_all()
+            
+            server.mocked_send(Message("stats", data, "fake_client"))
+            sleep(0)
+            self.assertEqual(1, master.stats.get("/", "GET").num_requests)
+    
     def test_spawn_zero_locusts(self):
         class MyTaskSet(TaskSet):
             @task
@@ -170,6 +291,155 @@ class TestMasterRunner(LocustTestCase):
             
             self.assertEqual(2, num_clients, "Total number of locusts that would have been spawned is not 2")
     
+    def test_response_times_sketch_is_sent_to_slaves(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        self.options.response_times_sketch = True
+        try:
+            with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+                master = MasterLocustRunner(MyTestLocust, self.options)
+                self.assertTrue(master.stats.response_times_sketch)
+                server.mocked_send(Message("client_ready", None, "fake_client"))
+                sleep(0)
+                
+                master.start_hatching(1, 1)
+                self.assertTrue(Message.unserialize(server.outbox[0]).data["response_times_sketch"])
+        finally:
+            global_stats.set_response_times_sketch(False)
+    
+    def test_arrival_rate_is_split_between_slaves(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        self.options.arrival_rate = 10
+        self.options.arrival_process = "constant"
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            for i in range(4):
+                server.mocked_send(Message("client_ready", None, "fake_client%i" % i))
+                sleep(0)
+            
+            master.start_hatching(8, 1)
+            for msg in server.outbox:
+                data = Message.unserialize(msg).data
+                self.assertEqual(2.5, data["arrival_rate"])
+                self.assertEqual("constant", data["arrival_process"])
+    
+    def test_seed_is_sent_to_slaves(self):
+        class MyTestLocust(Locust):
+            pass
+        
+        self.options.seed = 42
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyTestLocust, self.options)
+            for i in range(3):
+                server.mocked_send(Message("client_ready", None, "fake_client%i" % i))
+                sleep(0)
+            
+            master.start_hatching(3, 3)
+            messages = [Message.unserialize(msg).data for msg in server.outbox]
+            self.assertEqual([42, 42, 42], [data["seed"] for data in messages])
+            self.assertEqual([0, 1, 2], sorted(data["slave_index"] for data in messages))
+    
+    def test_seeded_locusts_repeat(self):
+        class MyLocust(Locust):
+            class task_set(TaskSet):
+                @task
+                def t(self):
+                    numbers.append(self.random.randint(0, 1000000))
+                    raise StopLocust()
+        
+        def run(seed):
+            self.options.seed = seed
+            runner = LocalLocustRunner([MyLocust], self.options)
+            runner.start_hatching(4, 1000, wait=True)
+            runner.greenlet.join()
+            return list(numbers)
+        
+        numbers = []
+        first = run(1)
+        self.assertEqual(4, len(first))
+        numbers = []
+        self.assertEqual(first, run(1))
+        numbers = []
+        self.assertNotEqual(first, run(2))
+    
+    def test_unseeded_locusts_use_random_module(self):
+        import random
+        runner = LocalLocustRunner([], self.options)
+        self.assertTrue(runner.new_random("locust", 1) is random)
+        runner.seed = 1
+        self.assertEqual(runner.new_random("locust", 1).random(), runner.new_random("locust", 1).random())
+        self.assertNotEqual(runner.new_random("locust", 1).random(), runner.new_random("locust", 2).random())
+    
+    def test_options_defaults(self):
+        # options objects made before the newer settings existed lack them
+        del self.options.response_times_sketch
+        del self.options.max_stats_entries
+        del self.options.arrival_rate
+        del self.options.arrival_process
+        del self.options.seed
+        runner = LocalLocustRunner([], self.options)
+        self.assertFalse(runner.stats.response_times_sketch)
+        self.assertEqual(MAX_ENTRIES, runner.stats.max_entries)
+        self.assertEqual(None, runner.arrival_rate)
+        self.assertEqual("poisson", runner.arrival_process)
+        self.assertEqual(None, runner.seed)
+    
+    def test_max_stats_entries(self):
+        runner = LocalLocustRunner([], self.options)
+        self.assertEqual(MAX_ENTRIES, runner.stats.max_entries)
+        self.options.max_stats_entries = 0
+        runner = LocalLocustRunner([], self.options)
+        self.assertEqual(None, runner.stats.max_entries)
+    
+    def test_arrival_rate(self):
+        executed = []
+        class MyLocust(Locust):
+            class task_set(TaskSet):
+                @task
+                def t(self):
+                    executed.append(1)
+        
+        self.options.arrival_rate = 200
+        self.options.arrival_process = "constant"
+        runner = LocalLocustRunner([MyLocust], self.options)
+        runner.start_hatching(10, 1)
+        try:
+            sleep(0.2)
+            self.assertTrue(len(executed) >= 10)
+            self.assertEqual(0, runner.stats.dropped_arrivals)
+            self.assertEqual(len(executed), runner.stats.arrivals)
+        finally:
+            runner.stop()
+        count = len(executed)
+        sleep(0.05)
+        self.assertEqual(count, len(executed))
+    
+    def test_arrival_rate_max_locusts(self):
+        class MyLocust(Locust):
+            class task_set(TaskSet):
+                @task
+                def t(self):
+                    sleep(10)
+        
+        self.options.arrival_rate = 200
+        self.options.arrival_process = "poisson"
+        user_counts = []
+        events.hatch_complete += lambda user_count: user_counts.append(user_count)
+        runner = LocalLocustRunner([MyLocust], self.options)
+        runner.start_hatching(2, 1)
+        try:
+            sleep(0.2)
+            self.assertEqual([2], user_counts)
+            self.assertEqual(2, runner.user_count)
+            self.assertTrue(runner.stats.dropped_arrivals > 0)
+            self.assertEqual(runner.stats.arrivals - 2, runner.stats.dropped_arrivals)
+        finally:
+            runner.stop()
+        self.assertEqual(0, runner.user_count)
+    
     def test_exception_in_task(self):
         class HeyAnException(Exception):
             pass
@@ -202,10 +472,8 @@ class TestMasterRunner(LocustTestCase):
         class MyTaskSet(TaskSet):
             def __init__(self, *a, **kw):
                 super(MyTaskSet, self).__init__(*a, **kw)
-                self._task_queue = [
-                    {"callable":self.will_error, "args":[], "kwargs":{}}, 
-                    {"callable":self.will_stop, "args":[], "kwargs":{}},
-                ]
+                self.schedule_task(self.will_error)
+                self.schedule_task(self.will_stop)
             
             @task(1)
             def will_error(self):
@@ -239,6 +507,69 @@ class TestMasterRunner(LocustTestCase):
         self.assertEqual(2, exception["count"])
 
 
+    def test_exceptions_are_bounded(self):
+        runner = LocalLocustRunner([], self.options)
+        with mock.patch("locust.runners.MAX_EXCEPTIONS", 3):
+            for i in xrange(4):
+                runner.log_exception("local", "error %i" % i, "traceback %i" % i)
+            runner.log_exception("local", "error", "traceback 1", count=5)
+            runner.log_exception("local", "error", "traceback 4")
+        self.assertEqual(set(["traceback 3", "traceback 1", "traceback 4"]), set(row["traceback"] for row in runner.exceptions.itervalues()))
+        self.assertEqual(6, runner.exceptions[hash("traceback 1")]["count"])
+        self.assertEqual("error 1", runner.exceptions[hash("traceback 1")]["msg"])
+    
+    def test_slave_sends_exceptions_in_report(self):
+        class MyLocust(Locust):
+            pass
+        
+        handlers = dict((name, list(getattr(events, name)._handlers)) for name in ("locust_error", "report_to_master", "hatch_complete", "quitting"))
+        try:
+            with mock.patch("locust.rpc.rpc.Client", mocked_rpc_client()) as client:
+                slave = SlaveLocustRunner([MyLocust], self.options)
+                for i in xrange(3):
+                    try:
+                        raise Exception("error %i" % i)
+                    except Exception as e:
+                        events.locust_error.fire(locust_instance=None, exception=e, tb=sys.exc_info()[2])
+                data = {}
+                events.report_to_master.fire(client_id=slave.client_id, data=data)
+                slave.greenlet.kill(block=True)
+                self.assertEqual(1, len(data["exceptions"]))
+                self.assertEqual(3, data["exceptions"][0]["count"])
+                self.assertEqual("error 0", data["exceptions"][0]["msg"])
+                self.assertEqual(["client_ready"], [Message.unserialize(m).type for m in client.outbox])
+                
+                # the exceptions above MAX_EXCEPTIONS are counted together
+                with mock.patch("locust.runners.MAX_EXCEPTIONS", 1):
+                    for i in xrange(3):
+                        try:
+                            raise Exception("error %i" % i)
+                        except Exception as e:
+                            events.locust_error.fire(locust_instance=None, exception=e, tb=sys.exc_info()[2])
+                    try:
+                        raise Exception("other error")
+                    except Exception as e:
+                        events.locust_error.fire(locust_instance=None, exception=e, tb=sys.exc_info()[2])
+                overflow_data = {}
+                events.report_to_master.fire(client_id=slave.client_id, data=overflow_data)
+                counts = dict((row["msg"], row["count"]) for row in overflow_data["exceptions"])
+                self.assertEqual({"error 0": 3, OTHER_EXCEPTIONS_MSG: 1}, counts)
+        finally:
+            for name, h in handlers.iteritems():
+                getattr(events, name)._handlers = h
+        
+        with mock.patch("locust.rpc.rpc.Server", mocked_rpc_server()) as server:
+            master = MasterLocustRunner(MyLocust, self.options)
+            server.mocked_send(Message("client_ready", None, "fake_client"))
+            server.mocked_send(Message("stats", {"user_count": 1, "entries": [], "entry_names": {}, "response_times_layout": None, "errors": {}, "exceptions": data["exceptions"]}, "fake_client"))
+            # older slaves send an exception message for each exception
+            server.mocked_send(Message("exception", {"msg": "error", "traceback": data["exceptions"][0]["traceback"]}, "fake_client"))
+            sleep(0)
+            self.assertEqual(1, len(master.exceptions))
+            self.assertEqual(4, master.exceptions.values()[0]["count"])
+            self.assertEqual(set(["fake_client"]), master.exceptions.values()[0]["nodes"])
+
+
 class TestMessageSerializing(unittest.TestCase):
     def test_message_serialize(self):
         msg = Message("client_ready", None, "my_id")
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+
+from locust import events, samplelog
+from locust.samplelog import SampleLog, read_sample_log, start_sample_log, STATUS_SUCCESS, STATUS_FAILURE
+from testcases import LocustTestCase
+
+
+class TestSampleLog(LocustTestCase):
+    def setUp(self):
+        super(TestSampleLog, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "samples.bin")
+        self._numpy = samplelog.numpy
+        samplelog.numpy = None
+
+    def tearDown(self):
+        super(TestSampleLog, self).tearDown()
+        samplelog.numpy = self._numpy
+        shutil.rmtree(self.dir)
+
+    def test_write_and_read(self):
+        log = SampleLog(self.path)
+        log.on_request_success("GET", "/", 12.5, 1024)
+        log.on_request_success("POST", "/login", 200, 10)
+        log.on_request_failure("GET", "/", 3, Exception("error"))
+        log.close()
+
+        self.assertEqual(32 + 3 * 32, os.path.getsize(self.path))
+        samples = read_sample_log(self.path)
+        self.assertEqual(["/", "/login", "/"], samples["name"])
+        self.assertEqual(["GET", "POST", "GET"], samples["method"])
+        self.assertEqual([12.5, 200.0, 3.0], samples["response_time"])
+        self.assertEqual([1024, 10, 0], samples["content_length"])
+        self.assertEqual([STATUS_SUCCESS, STATUS_SUCCESS, STATUS_FAILURE], samples["status"])
+
+    def test_read_while_writing(self):
+        log = SampleLog(self.path)
+        for i in xrange(samplelog.RECORDS_PER_CHUNK + 10):
+            log.log("GET", "/%i" % (i % 3), i, 0, STATUS_SUCCESS)
+        samples = read_sample_log(self.path)
+        self.assertEqual(samplelog.RECORDS_PER_CHUNK + 10, len(samples["timestamp"]))
+        self.assertEqual("/1", samples["name"][-1])
+        log.close()
+
+    def test_not_a_sample_log(self):
+        with open(self.path, "wb") as f:
+            f.write("\0" * 64)
+        self.assertRaises(ValueError, read_sample_log, self.path)
+
+    def test_start_sample_log(self):
+        log = start_sample_log(os.path.join(self.dir, "samples"))
+        try:
+            self.assertTrue(log.path.endswith(".%i.bin" % os.getpid()))
+            events.request_success.fire(request_type="GET", name="/", response_time=1, response_length=1)
+        finally:
+            events.request_success -= log.on_request_success
+            events.request_failure -= log.on_request_failure
+            events.quitting -= log.close
+            log.close()
+        self.assertEqual(["/"], read_sample_log(log.path)["name"])
@@ -1,16 +1,21 @@
 import unittest
 import time
+import hashlib
 
 from requests.exceptions import RequestException
 
-from testcases import WebserverTestCase
-from locust.stats import RequestStats, StatsEntry, global_stats
+from testcases import LocustTestCase, WebserverTestCase
+from locust import events, stats
+from locust.histogram import DDSketch, layout
+from locust.stats import RequestStats, StatsEntry, StatsError, PerSecondCounter, global_stats
 from locust.core import HttpLocust, Locust, TaskSet, task
 from locust.inspectlocust import get_task_ratio_dict
 from locust.rpc.protocol import Message
+from locust.exception import StopLocust
 
-class TestRequestStats(unittest.TestCase):
+class TestRequestStats(LocustTestCase):
     def setUp(self):
+        super(TestRequestStats, self).setUp()
         self.stats = RequestStats()
         self.stats.start_time = time.time()
         self.s = StatsEntry(self.stats, "test_entry", "GET")
@@ -71,6 +76,25 @@ class TestRequestStats(unittest.TestCase):
         self.s.log(756, 0)
         self.assertEqual(756, self.s.min_response_time)
 
+    def test_total(self):
+        s2 = self.stats.get("second_entry", "POST")
+        s2.log(20, 0)
+        s2.log_error(Exception("dummy fail"))
+        
+        total = self.stats.total
+        self.assertTrue(total is self.stats.aggregated_stats())
+        self.assertEqual(8, total.num_requests)
+        self.assertEqual(4, total.num_failures)
+        self.assertEqual(1334, total.total_response_time)
+        self.assertEqual(20, total.min_response_time)
+        self.assertEqual(601, total.max_response_time)
+        self.assertEqual(45, total.median_response_time)
+        
+        self.stats.reset_all()
+        self.assertEqual(0, total.num_requests)
+        self.stats.clear_all()
+        self.assertEqual(0, self.stats.total.num_requests)
+    
     def test_aggregation(self):
         s1 = StatsEntry(self.stats, "aggregate me!", "GET")
         s1.log(12, 0)
@@ -98,6 +122,34 @@ class TestRequestStats(unittest.TestCase):
         self.assertEqual(s.median_response_time, 38)
         self.assertEqual(s.avg_response_time, 43.2)
     
+    def test_sub_millisecond_response_times(self):
+        s = StatsEntry(self.stats, "fast", "GET")
+        for response_time in [0.25, 0.251, 0.3, 0.42, 1.5]:
+            s.log(response_time, 0)
+        self.assertEqual(0.3, s.median_response_time)
+        self.assertEqual(1.5, s.get_response_time_percentile(0.99))
+        self.assertEqual(0.25, s.min_response_time)
+        self.assertAlmostEqual(0.5442, s.avg_response_time)
+    
+    def test_unserialize_milliseconds(self):
+        data = self.s.serialize()
+        data["response_times"] = {45: 2, 600: 1}
+        del data["response_times_unit"]
+        u = StatsEntry.unserialize(data)
+        self.assertEqual(45, u.median_response_time)
+        self.assertEqual(600, u.get_response_time_percentile(0.99))
+    
+    def test_max_entries(self):
+        request_stats = RequestStats()
+        request_stats.max_entries = 2
+        for i in xrange(5):
+            request_stats.get("/item/%i" % i, "GET").log(10, 0)
+        request_stats.get("/item/0", "GET").log(10, 0)
+        self.assertEqual(3, len(request_stats.entries))
+        self.assertEqual(2, request_stats.get("/item/0", "GET").num_requests)
+        self.assertEqual(3, request_stats.get(stats.OTHER_ENTRY_NAME, "GET").num_requests)
+        self.assertTrue(request_stats.entries_overflowed)
+    
     def test_serialize_through_message(self):
         """
         Serialize a RequestStats instance, then serialize it through a Message, 
@@ -114,6 +166,216 @@ class TestRequestStats(unittest.TestCase):
         u1 = StatsEntry.unserialize(data)
         
         self.assertEqual(20, u1.median_response_time)
+    
+    def test_serialize_sketch_through_message(self):
+        self.stats.set_response_times_sketch(True)
+        self.assertEqual(0, len(self.stats.entries))
+        s1 = self.stats.get("test", "GET")
+        for response_time in [10, 20, 40]:
+            s1.log(response_time, 0)
+        self.assertTrue(isinstance(self.stats.total.response_times, DDSketch))
+        
+        data = Message.unserialize(Message("dummy", s1.serialize(), "none").serialize()).data
+        u1 = StatsEntry.unserialize(data)
+        self.assertTrue(isinstance(u1.response_times, DDSketch))
+        self.assertAlmostEqual(20, u1.median_response_time, delta=0.2)
+        
+        self.stats.total.extend(u1, full_request_history=True)
+        self.assertEqual(6, self.stats.total.response_times.total_count)
+        self.assertAlmostEqual(40, self.stats.total.get_response_time_percentile(0.99), delta=0.4)
+    
+    def test_compact_report(self):
+        s1 = StatsEntry(self.stats, "test", "GET")
+        for response_time in [10, 20, 40, 4000]:
+            s1.log(response_time, 100)
+        s1.log_error(Exception("error"))
+        data = Message.unserialize(Message("dummy", s1.compact_report(7), "none").serialize()).data
+        self.assertEqual(7, data[0])
+        
+        u1 = StatsEntry.from_compact_report(data, "test", "GET", layout(s1.response_times))
+        for attr in ("num_requests", "num_failures", "total_response_time", "min_response_time", "max_response_time", "total_content_length"):
+            self.assertEqual(getattr(s1, attr), getattr(u1, attr))
+        self.assertEqual(s1.response_times.to_dict(), u1.response_times.to_dict())
+        self.assertEqual(list(s1.num_reqs_per_sec), list(u1.num_reqs_per_sec))
+        self.assertLess(len(Message("dummy", data, "none").serialize()), len(Message("dummy", s1.serialize(), "none").serialize()))
+    
+    def test_coordinated_omission_correction(self):
+        s1 = StatsEntry(self.stats, "test", "GET")
+        s1.log(10, 0)
+        self.assertFalse(s1.has_corrected_response_times)
+        stats.request_context.expected_interval = 100
+        try:
+            for i in xrange(9):
+                s1.log(10, 0)
+            # a stall of one second hides 9 requests, which would have taken 900, 800, ... 100 ms
+            s1.log(1000, 0)
+        finally:
+            stats.request_context.expected_interval = None
+        s1.log(10, 0)
+        
+        self.assertEqual(12, s1.response_times.total_count)
+        self.assertEqual(21, s1.corrected_response_times.total_count)
+        self.assertEqual(10, s1.get_response_time_percentile(0.9))
+        self.assertEqual(800, s1.get_response_time_percentile(0.9, corrected=True))
+        self.assertEqual(1000, s1.get_response_time_percentile(1.0, corrected=True))
+        self.assertEqual(7 + 21, self.stats.total.corrected_response_times.total_count)
+        
+        u1 = StatsEntry.unserialize(Message.unserialize(Message("dummy", s1.serialize(), "none").serialize()).data)
+        self.assertEqual(s1.corrected_response_times.to_dict(), u1.corrected_response_times.to_dict())
+        data = Message.unserialize(Message("dummy", s1.compact_report(0), "none").serialize()).data
+        u1 = StatsEntry.from_compact_report(data, "test", "GET", layout(s1.response_times))
+        self.assertEqual(s1.corrected_response_times.to_dict(), u1.corrected_response_times.to_dict())
+        
+        # an entry without corrected response times starts out with its raw ones when extended
+        s2 = StatsEntry(self.stats, "test", "GET")
+        s2.log(10, 0)
+        s2.extend(u1, full_request_history=True)
+        self.assertEqual(22, s2.corrected_response_times.total_count)
+        s2.reset()
+        self.assertFalse(s2.has_corrected_response_times)
+    
+    def test_timings(self):
+        s1 = StatsEntry(self.stats, "test", "GET")
+        s1.log_timings({"dns": 1.5, "connect": 2, "ttfb": 40, "body": 5})
+        s1.log_timings({"dns": 0, "connect": 0, "ttfb": 60, "body": 5})
+        self.assertEqual(60, s1.get_timing_percentile("ttfb", 1.0))
+        self.assertEqual(1.5, s1.get_timing_percentile("dns", 1.0))
+        self.assertEqual(None, s1.get_timing_percentile("tls", 0.5))
+        self.assertEqual(2, self.stats.total.timings["body"].total_count)
+        self.assertEqual(None, self.s.get_timing_percentile("ttfb", 0.5))
+        
+        u1 = StatsEntry.unserialize(Message.unserialize(Message("dummy", s1.serialize(), "none").serialize()).data)
+        self.assertEqual(s1.timings["ttfb"].to_dict(), u1.timings["ttfb"].to_dict())
+        data = Message.unserialize(Message("dummy", s1.compact_report(0), "none").serialize()).data
+        u1 = StatsEntry.from_compact_report(data, "test", "GET", layout(s1.response_times))
+        self.assertEqual(None, u1.corrected_response_times)
+        self.assertEqual(sorted(s1.timings), sorted(u1.timings))
+        self.assertEqual(s1.timings["dns"].to_dict(), u1.timings["dns"].to_dict())
+        
+        self.s.extend(u1, full_request_history=True)
+        self.s.extend(u1, full_request_history=True)
+        self.assertEqual(4, self.s.timings["ttfb"].total_count)
+        self.assertEqual(2, u1.timings["ttfb"].total_count)
+    
+    def test_request_batch(self):
+        global_stats.clear_all()
+        try:
+            legacy_calls = []
+            def on_request_success(request_type, name, response_time, response_length):
+                legacy_calls.append(name)
+            events.request_success += on_request_success
+            try:
+                events.request_success.fire_batch([("GET", "/a", 10, 100), ("GET", "/b", 20, 100), ("GET", "/a", 30, 100)])
+                events.request_failure.fire_batch([("GET", "/a", 5, Exception("error"))])
+            finally:
+                events.request_success -= on_request_success
+            self.assertEqual(["/a", "/b", "/a"], legacy_calls)
+            self.assertEqual(3, global_stats.num_requests)
+            self.assertEqual(1, global_stats.num_failures)
+            self.assertEqual(2, global_stats.get("/a", "GET").num_requests)
+            self.assertEqual(1, global_stats.get("/a", "GET").num_failures)
+            self.assertEqual(30, global_stats.get("/a", "GET").max_response_time)
+            self.assertEqual(3, global_stats.total.num_requests)
+            self.assertEqual(300, global_stats.total.total_content_length)
+        finally:
+            global_stats.clear_all()
+    
+    def test_locust_expected_interval(self):
+        intervals = []
+        class MyLocust(Locust):
+            expected_interval = 100
+            class task_set(TaskSet):
+                @task
+                def t(self):
+                    intervals.append(stats.request_context.expected_interval)
+                    raise StopLocust()
+        MyLocust().run()
+        self.assertEqual([100], intervals)
+        self.assertEqual(None, stats.request_context.expected_interval)
+    
+    def test_pacing_misses_in_report(self):
+        global_stats.clear_all()
+        try:
+            global_stats.log_pacing(False)
+            global_stats.log_pacing(True)
+            global_stats.log_pacing(False)
+            self.assertAlmostEqual(1/3.0, global_stats.pacing_miss_ratio)
+            data = {}
+            stats.on_report_to_master("fake_client", data)
+            self.assertEqual([3, 1], data["pacing"])
+            self.assertEqual(0, global_stats.pacing_iterations)
+            
+            stats.on_slave_report("fake_client", data)
+            stats.on_slave_report("fake_client", data)
+            self.assertEqual(6, global_stats.pacing_iterations)
+            self.assertEqual(2, global_stats.pacing_misses)
+            global_stats.reset_all()
+            self.assertEqual(0, global_stats.pacing_misses)
+        finally:
+            global_stats.clear_all()
+
+
+class TestStatsError(LocustTestCase):
+    def test_create_key(self):
+        key = StatsError.create_key("GET", "/", Exception("dummy fail"))
+        self.assertEqual(key, StatsError.create_key("GET", "/", Exception("dummy fail")))
+        self.assertNotEqual(key, StatsError.create_key("POST", "/", Exception("dummy fail")))
+        self.assertNotEqual(key, StatsError.create_key("GET", "/", Exception("other fail")))
+        self.assertNotEqual(key, StatsError.create_key("GET", "/", ValueError("dummy fail")))
+    
+    def test_create_key_uses_repr(self):
+        class MyError(Exception):
+            def __str__(self):
+                return "same message"
+        key = StatsError.create_key("GET", "/", MyError(1))
+        self.assertNotEqual(key, StatsError.create_key("GET", "/", MyError(2)))
+        self.assertEqual(hashlib.md5("GET./.%r" % MyError(1)).hexdigest(), key)
+    
+    def test_key_cache_is_bounded(self):
+        for i in xrange(stats.ERROR_KEY_CACHE_SIZE * 2 + 1):
+            StatsError.create_key("GET", "/", Exception("fail %i" % i))
+        self.assertLessEqual(len(StatsError._key_cache), stats.ERROR_KEY_CACHE_SIZE)
+    
+    def test_errors_are_grouped(self):
+        request_stats = RequestStats()
+        entry = request_stats.get("/", "GET")
+        for i in xrange(5):
+            entry.log_error(Exception("dummy fail"))
+        entry.log_error(Exception("other fail"))
+        self.assertEqual(2, len(request_stats.errors))
+        self.assertEqual([1, 5], sorted(e.occurences for e in request_stats.errors.itervalues()))
+
+
+class TestPerSecondCounter(LocustTestCase):
+    def test_add_and_get(self):
+        c = PerSecondCounter(10)
+        c.add(1000)
+        c.add(1000)
+        c.add(1003, 5)
+        self.assertEqual(2, c.get(1000))
+        self.assertEqual(0, c.get(1001))
+        self.assertEqual(5, c.get(1003))
+    
+    def test_old_seconds_are_overwritten(self):
+        c = PerSecondCounter(10)
+        for t in xrange(1000, 2000):
+            c.add(t)
+        self.assertEqual(10, len(c.to_dict()))
+        self.assertEqual(0, c.get(1989))
+        self.assertEqual(1, c.get(1990))
+        # a second that is older than the window should be dropped
+        c.add(1500)
+        self.assertEqual(0, c.get(1500))
+        self.assertEqual(1, c.get(1990))
+    
+    def test_merge(self):
+        c1 = PerSecondCounter(10)
+        c2 = PerSecondCounter(10)
+        c1.add(1000, 3)
+        c2.add(1000, 2)
+        c2.add(1001, 1)
+        c1.merge(c2)
+        self.assertEqual({1000: 5, 1001: 1}, c1.to_dict())
 
 
 class TestRequestStatsWithWebserver(WebserverTestCase):
@@ -159,6 +421,19 @@ class TestRequestStatsWithWebserver(WebserverTestCase):
         locust.client.get("/ultra_fast?query=1")
         self.assertEqual(1, global_stats.get("/ultra_fast?query=1", "GET").num_requests)
     
+    def test_request_stats_url_name_rules(self):
+        class MyLocust(HttpLocust):
+            host = "http://127.0.0.1:%i" % self.port
+            url_name_rules = [(r"\?.*$", ""), (r"_fast$", "_[speed]")]
+    
+        locust = MyLocust()
+        locust.client.get("/ultra_fast?query=1")
+        locust.client.get("/ultra_fast?query=2")
+        locust.client.get("/ultra_fast", name="/named")
+        self.assertEqual(2, global_stats.get("/ultra_[speed]", "GET").num_requests)
+        self.assertEqual(1, global_stats.get("/named", "GET").num_requests)
+        self.assertTrue(locust.client.name_normalizer is MyLocust().client.name_normalizer)
+    
     def test_request_stats_put(self):
         class MyLocust(HttpLocust):
             host = "http://127.0.0.1:%i" % self.port
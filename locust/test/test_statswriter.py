@@ -0,0 +1,108 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+
+from locust.stats import RequestStats
+from locust.statswriter import StatsWriter, COLUMNS
+from testcases import LocustTestCase
+
+
+class TestStatsWriter(LocustTestCase):
+    def setUp(self):
+        super(TestStatsWriter, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.stats = RequestStats()
+        for entry in (self.stats.get("/", "GET"), self.stats.total):
+            entry.start_time = 1000.0
+
+    def tearDown(self):
+        super(TestStatsWriter, self).tearDown()
+        shutil.rmtree(self.dir)
+
+    def log(self, response_times, failures=0):
+        entry = self.stats.get("/", "GET")
+        for response_time in response_times:
+            entry.log(response_time, 0)
+        for i in xrange(failures):
+            entry.log_error(Exception("error"))
+
+    def test_csv(self):
+        path = os.path.join(self.dir, "stats.csv")
+        writer = StatsWriter(self.stats, path)
+        self.log([10] * 8, failures=2)
+        writer.write(3, now=1002.0)
+        self.log([100, 200])
+        writer.write(3, now=1004.0)
+        writer.close()
+
+        with open(path) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(list(COLUMNS), rows[0])
+        self.assertEqual(5, len(rows))
+        row = dict(zip(COLUMNS, rows[1]))
+        self.assertEqual("/", row["name"])
+        self.assertEqual("GET", row["method"])
+        self.assertEqual("8", row["num_requests"])
+        self.assertEqual(4.0, float(row["requests_per_sec"]))
+        self.assertEqual(1.0, float(row["failures_per_sec"]))
+        row = dict(zip(COLUMNS, rows[4]))
+        self.assertEqual("Total", row["name"])
+        self.assertEqual("2", row["num_requests"])
+        self.assertEqual(200.0, float(row["response_time_percentile_99"]))
+        self.assertEqual(200.0, float(row["max_response_time"]))
+
+        # appending to an existing file doesn't repeat the header
+        writer.write(3, now=1006.0)
+        writer.close()
+        with open(path) as f:
+            self.assertEqual(1, f.read().count("timestamp"))
+
+    def test_jsonl(self):
+        path = os.path.join(self.dir, "stats.jsonl")
+        writer = StatsWriter(self.stats, path, format="jsonl")
+        self.log([10, 20, 30])
+        writer.write(1, now=1001.0)
+        writer.close()
+        with open(path) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(["/", "Total"], [row["name"] for row in rows])
+        self.assertEqual(20, rows[1]["response_time_percentile_50"])
+        self.assertEqual(3.0, rows[1]["requests_per_sec"])
+
+    def test_rotation(self):
+        path = os.path.join(self.dir, "stats.csv")
+        writer = StatsWriter(self.stats, path, max_bytes=1, backup_count=2)
+        for i in xrange(5):
+            self.log([10])
+            writer.write(1, now=1001.0 + i)
+        writer.close()
+        self.assertEqual(["stats.csv", "stats.csv.1", "stats.csv.2"], sorted(os.listdir(self.dir)))
+        with open(path + ".1") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(list(COLUMNS), rows[0])
+        self.assertEqual("1004.0", rows[1][0])
+
+    def test_reset_and_clear(self):
+        path = os.path.join(self.dir, "stats.csv")
+        writer = StatsWriter(self.stats, path, max_entries=1)
+        self.log([1000] * 5)
+        writer.write(1, now=1001.0)
+        self.stats.reset_all()
+        self.log([5] * 20)
+        self.stats.get("/other", "GET").log(10, 0)
+        writer.write(1, now=1002.0)
+        self.assertEqual([("/", "GET")], writer._intervals.keys())
+        self.stats.clear_all()
+        writer.write(1, now=1003.0)
+        writer.close()
+        self.assertEqual({}, writer._intervals)
+        with open(path) as f:
+            rows = [dict(zip(COLUMNS, row)) for row in list(csv.reader(f))[1:]]
+        self.assertEqual(["/", "Total", "/", "Total", "Total"], [row["name"] for row in rows])
+        self.assertEqual("20", rows[2]["num_requests"])
+        self.assertEqual(5.0, float(rows[2]["max_response_time"]))
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, StatsWriter, self.stats, "stats.xml", format="xml")
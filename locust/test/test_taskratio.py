@@ -63,3 +63,16 @@ class TestTaskRatio(unittest.TestCase):
         unlikely = ratio_dict['UnlikelyLocust']['tasks']
         likely = ratio_dict['MoreLikelyLocust']['tasks']
         assert unlikely['task1']['ratio'] + unlikely['task3']['ratio'] + likely['task1']['ratio'] + likely['task3']['ratio'] == 1
+    
+    def test_task_ratio_command_with_task_weights(self):
+        class Tasks(TaskSet):
+            @task(1)
+            def task1(self):
+                pass
+            
+            @task(3)
+            def task3(self):
+                pass
+        
+        ratio_dict = get_task_ratio_dict(Tasks.tasks, weights=Tasks.task_weights)
+        self.assertEqual({'task1': {'ratio': 0.25}, 'task3': {'ratio': 0.75}}, ratio_dict)
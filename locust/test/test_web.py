@@ -3,6 +3,7 @@ import json
 import sys
 import traceback
 from StringIO import StringIO
+from time import time
 
 import requests
 import mock
@@ -49,6 +50,41 @@ class TestWebUI(LocustTestCase):
         self.assertEqual("GET", data["stats"][0]["method"])
         self.assertEqual(120, data["stats"][0]["avg_response_time"])
         
+    def test_stats_total_percentiles(self):
+        for response_time in [100, 200, 300]:
+            stats.global_stats.get("/slow", "GET").log(response_time, 0)
+        for response_time in [1, 2, 3, 4]:
+            stats.global_stats.get("/fast", "GET").log(response_time, 0)
+        web.request_stats.clear_cache()
+        
+        data = json.loads(requests.get("http://127.0.0.1:%i/stats/requests" % self.web_port).content)
+        total = data["stats"][-1]
+        self.assertEqual("Total", total["name"])
+        self.assertEqual(7, total["num_requests"])
+        self.assertEqual(4, total["median_response_time"])
+        self.assertEqual(300, total["response_time_percentile_95"])
+        self.assertEqual(300, total["response_time_percentile_99"])
+        self.assertEqual(200, data["stats"][1]["median_response_time"])
+    
+    def test_stats_history(self):
+        history = stats.global_stats.history
+        stats.global_stats.get("/test", "GET").log(120, 5612)
+        history.record(stats.global_stats, 1, now=time() + 1)
+        stats.global_stats.get("/test", "GET").log(80, 5612)
+        history.record(stats.global_stats, 2, now=time() + 2)
+        
+        data = json.loads(requests.get("http://127.0.0.1:%i/stats/history" % self.web_port).content)
+        self.assertEqual("Total", data["name"])
+        self.assertEqual([1, 2], data["user_count"])
+        self.assertEqual([120, 80], data["response_time_percentile_50"])
+        
+        response = requests.get("http://127.0.0.1:%i/stats/history" % self.web_port, params={"name":"/test", "method":"GET", "max_points":1})
+        data = json.loads(response.content)
+        self.assertEqual([2], data["user_count"])
+        self.assertEqual([120], data["response_time_percentile_99"])
+        
+        self.assertEqual(404, requests.get("http://127.0.0.1:%i/stats/history?name=/nope" % self.web_port).status_code)
+    
     def test_stats_cache(self):
         stats.global_stats.get("/test", "GET").log(120, 5612)
         response = requests.get("http://127.0.0.1:%i/stats/requests" % self.web_port)
@@ -76,6 +112,22 @@ class TestWebUI(LocustTestCase):
         response = requests.get("http://127.0.0.1:%i/stats/distribution/csv" % self.web_port)
         self.assertEqual(200, response.status_code)
     
+    def test_timings_stats_csv(self):
+        stats.global_stats.get("/test", "GET").log_timings({"dns": 1, "connect": 2, "ttfb": 100, "body": 3})
+        response = requests.get("http://127.0.0.1:%i/stats/timings/csv" % self.web_port)
+        self.assertEqual(200, response.status_code)
+        rows = list(csv.reader(StringIO(response.content)))
+        self.assertEqual(9, len(rows))
+        self.assertEqual(["GET", "/test", "ttfb", "1", "100.000", "100.000", "100.000", "100.000"], rows[3])
+        
+        web.request_stats.clear_cache()
+        data = json.loads(requests.get("http://127.0.0.1:%i/stats/requests" % self.web_port).content)
+        self.assertEqual(100, data["stats"][0]["timings"]["ttfb"]["percentile_95"])
+    
+    def test_slave_stats_not_distributed(self):
+        data = json.loads(requests.get("http://127.0.0.1:%i/stats/slaves" % self.web_port).content)
+        self.assertEqual([], data["slaves"])
+    
     def test_exceptions_csv(self):
         try:
             raise Exception("Test exception")
@@ -156,6 +156,17 @@ class LocustTestCase(unittest.TestCase):
         if not a >= b:
             standardMsg = '%s not greater than or equal to %s' % (safe_repr(a), safe_repr(b))
             self.fail(self._formatMessage(msg, standardMsg))
+    
+    def assertAlmostEqual(self, first, second, places=None, msg=None, delta=None):
+        """
+        Just like unittest's assertAlmostEqual, but with the *delta* argument.
+        Implemented here to work with Python 2.6
+        """
+        if delta is None:
+            return super(LocustTestCase, self).assertAlmostEqual(first, second, places or 7, msg)
+        if abs(first - second) > delta:
+            standardMsg = '%s != %s within %s delta' % (safe_repr(first), safe_repr(second), safe_repr(delta))
+            self.fail(self._formatMessage(msg, standardMsg))
 
             
 class WebserverTestCase(LocustTestCase):
@@ -5,16 +5,15 @@ import json
 import os.path
 from time import time
 from itertools import chain
-from collections import defaultdict
 from StringIO import StringIO
 
 from gevent import wsgi
 from flask import Flask, make_response, request, render_template
 
-from . import runners
+from . import runners, events
 from .cache import memoize
 from .runners import MasterLocustRunner
-from locust.stats import median_from_dict
+from .stats import TIMING_PHASES
 from locust import version
 
 import logging
@@ -40,6 +39,7 @@ def index():
         is_distributed=is_distributed,
         slave_count=slave_count,
         user_count=runners.locust_runner.user_count,
+        listener_profiling=events.EventHook.profiling,
         version=version
     )
 
@@ -83,8 +83,8 @@ def request_stats_csv():
         ])
     ]
     
-    for s in chain(_sort_stats(runners.locust_runner.request_stats), [runners.locust_runner.stats.aggregated_stats("Total", full_request_history=True)]):
-        rows.append('"%s","%s",%i,%i,%i,%i,%i,%i,%i,%.2f' % (
+    for s in chain(_sort_stats(runners.locust_runner.request_stats), [runners.locust_runner.stats.total]):
+        rows.append('"%s","%s",%i,%i,%.3f,%.3f,%.3f,%.3f,%i,%.2f' % (
             s.method,
             s.name,
             s.num_requests,
@@ -119,9 +119,9 @@ def distribution_stats_csv():
         '"99%"',
         '"100%"',
     ))]
-    for s in chain(_sort_stats(runners.locust_runner.request_stats), [runners.locust_runner.stats.aggregated_stats("Total", full_request_history=True)]):
+    for s in chain(_sort_stats(runners.locust_runner.request_stats), [runners.locust_runner.stats.total]):
         if s.num_requests:
-            rows.append(s.percentile(tpl='"%s",%i,%i,%i,%i,%i,%i,%i,%i,%i,%i'))
+            rows.append(s.percentile(tpl='"%s",%i,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f,%.3f'))
         else:
             rows.append('"%s",0,"N/A","N/A","N/A","N/A","N/A","N/A","N/A","N/A","N/A"' % s.name)
 
@@ -132,11 +132,45 @@ def distribution_stats_csv():
     response.headers["Content-disposition"] = disposition
     return response
 
+@app.route("/stats/timings/csv")
+def timings_stats_csv():
+    rows = [",".join((
+        '"Method"',
+        '"Name"',
+        '"Phase"',
+        '"# requests"',
+        '"50%"',
+        '"95%"',
+        '"99%"',
+        '"100%"',
+    ))]
+    for s in chain(_sort_stats(runners.locust_runner.request_stats), [runners.locust_runner.stats.total]):
+        for phase in TIMING_PHASES:
+            if not s.timings or phase not in s.timings:
+                continue
+            rows.append('"%s","%s","%s",%i,%.3f,%.3f,%.3f,%.3f' % (
+                s.method,
+                s.name,
+                phase,
+                s.timings[phase].total_count,
+                s.get_timing_percentile(phase, 0.5),
+                s.get_timing_percentile(phase, 0.95),
+                s.get_timing_percentile(phase, 0.99),
+                s.get_timing_percentile(phase, 1.0),
+            ))
+
+    response = make_response("\n".join(rows))
+    file_name = "timings_{0}.csv".format(time())
+    disposition = "attachment;filename={0}".format(file_name)
+    response.headers["Content-type"] = "text/csv"
+    response.headers["Content-disposition"] = disposition
+    return response
+
 @app.route('/stats/requests')
 @memoize(timeout=DEFAULT_CACHE_TIME, dynamic_timeout=True)
 def request_stats():
     stats = []
-    for s in chain(_sort_stats(runners.locust_runner.request_stats), [runners.locust_runner.stats.aggregated_stats("Total")]):
+    for s in chain(_sort_stats(runners.locust_runner.request_stats), [runners.locust_runner.stats.total]):
         stats.append({
             "method": s.method,
             "name": s.name,
@@ -147,24 +181,23 @@ def request_stats():
             "max_response_time": s.max_response_time,
             "current_rps": s.current_rps,
             "median_response_time": s.median_response_time,
+            "response_time_percentile_95": s.get_response_time_percentile(0.95) or 0,
+            "response_time_percentile_99": s.get_response_time_percentile(0.99) or 0,
+            "corrected_response_time_percentile_95": (s.get_response_time_percentile(0.95, corrected=True) or 0) if s.has_corrected_response_times else None,
+            "corrected_response_time_percentile_99": (s.get_response_time_percentile(0.99, corrected=True) or 0) if s.has_corrected_response_times else None,
             "avg_content_length": s.avg_content_length,
+            "timings": _timing_percentiles(s),
         })
     
     report = {"stats":stats, "errors":[e.to_dict() for e in runners.locust_runner.errors.itervalues()]}
     if stats:
         report["total_rps"] = stats[len(stats)-1]["current_rps"]
-        report["fail_ratio"] = runners.locust_runner.stats.aggregated_stats("Total").fail_ratio
-        
-        # since generating a total response times dict with all response times from all
-        # urls is slow, we make a new total response time dict which will consist of one
-        # entry per url with the median response time as key and the number of requests as
-        # value
-        response_times = defaultdict(int) # used for calculating total median
-        for i in xrange(len(stats)-1):
-            response_times[stats[i]["median_response_time"]] += stats[i]["num_requests"]
-        
-        # calculate total median
-        stats[len(stats)-1]["median_response_time"] = median_from_dict(stats[len(stats)-1]["num_requests"], response_times)
+        report["fail_ratio"] = runners.locust_runner.stats.total.fail_ratio
+    report["pacing_iterations"] = runners.locust_runner.stats.pacing_iterations
+    report["pacing_misses"] = runners.locust_runner.stats.pacing_misses
+    report["arrivals"] = runners.locust_runner.stats.arrivals
+    report["late_arrivals"] = runners.locust_runner.stats.late_arrivals
+    report["dropped_arrivals"] = runners.locust_runner.stats.dropped_arrivals
     
     is_distributed = isinstance(runners.locust_runner, MasterLocustRunner)
     if is_distributed:
@@ -174,6 +207,82 @@ def request_stats():
     report["user_count"] = runners.locust_runner.user_count
     return json.dumps(report)
 
+@app.route("/stats/slaves")
+def slave_stats():
+    """
+    Return the state, user count and stats total of each connected slave, so that slaves 
+    with e.g. a much higher response time than the others can be spotted
+    """
+    slaves = []
+    if isinstance(runners.locust_runner, MasterLocustRunner):
+        for client_id in sorted(runners.locust_runner.clients.iterkeys()):
+            client = runners.locust_runner.clients[client_id]
+            s = runners.locust_runner.stats.slave_totals.get(client_id)
+            data = {
+                "id": client_id,
+                "state": client.state,
+                "user_count": client.user_count,
+                "num_requests": 0,
+                "num_failures": 0,
+                "fail_ratio": 0,
+                "current_rps": 0,
+                "avg_response_time": 0,
+                "median_response_time": 0,
+                "response_time_percentile_95": 0,
+            }
+            if s is not None:
+                data.update({
+                    "num_requests": s.num_requests,
+                    "num_failures": s.num_failures,
+                    "fail_ratio": s.fail_ratio,
+                    "current_rps": s.current_rps,
+                    "avg_response_time": s.avg_response_time,
+                    "median_response_time": s.median_response_time,
+                    "response_time_percentile_95": s.get_response_time_percentile(0.95) or 0,
+                })
+            slaves.append(data)
+    response = make_response(json.dumps({"slaves": slaves}))
+    response.headers["Content-type"] = "application/json"
+    return response
+
+@app.route("/stats/history")
+def stats_history():
+    """
+    Return the stats history of the total, or of the entry given by the *name* and *method*
+    query parameters. The *since* parameter can be used to only get the points after a
+    certain time, and *max_points* to limit the number of returned points.
+    """
+    history = runners.locust_runner.stats.history
+    name = request.args.get("name")
+    if name is None:
+        series = history.total
+    else:
+        series = history.entries.get((name, request.args.get("method")))
+        if series is None:
+            return make_response("No history for %s" % name, 404)
+
+    data = series.to_dict(since=request.args.get("since", type=float), max_points=request.args.get("max_points", type=int))
+    data["name"] = name or "Total"
+    data["method"] = request.args.get("method")
+    response = make_response(json.dumps(data))
+    response.headers["Content-type"] = "application/json"
+    return response
+
+@app.route("/events/profile")
+def listener_profile():
+    """
+    Return the number of calls and time spent in each event listener, if locust runs with 
+    --profile-listeners
+    """
+    rows = []
+    for row in events.get_listener_profile():
+        row = dict(row, total_time=row["total_time"] * 1000)
+        row["avg_time"] = row["total_time"] / max(row["calls"], 1)
+        rows.append(row)
+    response = make_response(json.dumps({"enabled": events.EventHook.profiling, "listeners": rows}))
+    response.headers["Content-type"] = "application/json"
+    return response
+
 @app.route("/exceptions")
 def exceptions():
     response = make_response(json.dumps({'exceptions': [{"count": row["count"], "msg": row["msg"], "traceback": row["traceback"], "nodes" : ", ".join(row["nodes"])} for row in runners.locust_runner.exceptions.itervalues()]}))
@@ -200,5 +309,13 @@ def exceptions_csv():
 def start(locust, options):
     wsgi.WSGIServer((options.web_host, options.port), app, log=None).serve_forever()
 
+def _timing_percentiles(s):
+    if not s.timings:
+        return None
+    return dict((phase, {
+        "median": s.get_timing_percentile(phase, 0.5),
+        "percentile_95": s.get_timing_percentile(phase, 0.95),
+    }) for phase in s.timings)
+
 def _sort_stats(stats):
     return [stats[key] for key in sorted(stats.iterkeys())]